@@ -9,6 +9,7 @@ from langchain_openai import OpenAIEmbeddings
 
 
 from dotenv import load_dotenv
+from semantic_cache import write_kb_version
 
 MODEL = "gpt-4.1-nano"
 
@@ -63,4 +64,5 @@ if __name__ == "__main__":
     documents = fetch_documents()
     chunks = create_chunks(documents)
     create_embeddings(chunks)
+    write_kb_version([chunk.page_content for chunk in chunks])
     print("Ingestion complete")
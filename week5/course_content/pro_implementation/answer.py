@@ -5,6 +5,7 @@ from litellm import completion
 from pydantic import BaseModel, Field
 from pathlib import Path
 from tenacity import retry, wait_exponential
+from pro_implementation.rerankers import CrossEncoderReranker, LLMReranker
 import os
 
 
@@ -27,6 +28,8 @@ collection = chroma.get_or_create_collection(collection_name)
 
 RETRIEVAL_K = 20
 FINAL_K = 10
+RERANKER = os.getenv("RERANKER", "cross-encoder")  # "cross-encoder" (local, CPU) or "llm"
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "40"))
 
 SYSTEM_PROMPT = """
 You are a knowledgeable, friendly assistant representing the company Insurellm.
@@ -126,12 +129,30 @@ def fetch_context_unranked(question):
     return chunks
 
 
-def fetch_context(original_question):
+RERANKERS = {
+    "llm": lambda: LLMReranker(rerank, max_candidates=RERANK_MAX_CANDIDATES),
+    "cross-encoder": lambda: CrossEncoderReranker(max_candidates=RERANK_MAX_CANDIDATES),
+}
+_rerankers = {}
+
+
+def get_reranker(name=None):
+    name = name or RERANKER
+    if name not in _rerankers:
+        _rerankers[name] = RERANKERS[name]()
+    return _rerankers[name]
+
+
+def fetch_candidates(original_question):
     rewritten_question = rewrite_query(original_question)
     chunks1 = fetch_context_unranked(original_question)
     chunks2 = fetch_context_unranked(rewritten_question)
-    chunks = merge_chunks(chunks1, chunks2)
-    reranked = rerank(original_question, chunks)
+    return merge_chunks(chunks1, chunks2)
+
+
+def fetch_context(original_question):
+    chunks = fetch_candidates(original_question)
+    reranked = get_reranker().rerank(original_question, chunks)
     return reranked[:FINAL_K]
 
 
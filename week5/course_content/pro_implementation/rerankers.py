@@ -0,0 +1,82 @@
+# Pluggable rerankers: the LLM permutation reranker and a local cross-encoder
+import time
+from typing import Callable
+
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class Reranker:
+    """
+    Orders candidate chunks by relevance to a question, most relevant first.
+
+    Only the first `max_candidates` chunks (in retrieval order) are scored;
+    the rest keep their order after them. `last_seconds` holds the latency
+    of the last call.
+    """
+
+    name = "base"
+
+    def __init__(self, max_candidates: int = 40):
+        self.max_candidates = max_candidates
+        self.last_seconds = 0.0
+
+    def _rerank(self, question: str, chunks: list) -> list:
+        raise NotImplementedError
+
+    def rerank(self, question: str, chunks: list) -> list:
+        start = time.perf_counter()
+        head, tail = chunks[: self.max_candidates], chunks[self.max_candidates :]
+        reranked = self._rerank(question, head) + tail if head else tail
+        self.last_seconds = time.perf_counter() - start
+        return reranked
+
+
+class LLMReranker(Reranker):
+    """Wraps a function that asks an LLM for a permutation of the chunks"""
+
+    name = "llm"
+
+    def __init__(self, rerank_fn: Callable[[str, list], list], max_candidates: int = 40):
+        super().__init__(max_candidates)
+        self.rerank_fn = rerank_fn
+
+    def _rerank(self, question, chunks):
+        return self.rerank_fn(question, chunks)
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Scores (question, chunk) pairs with a small cross-encoder on CPU, in batches.
+    The model is loaded on first use.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(
+        self,
+        model_name: str = CROSS_ENCODER_MODEL,
+        max_candidates: int = 40,
+        batch_size: int = 32,
+        max_length: int = 512,
+        device: str = "cpu",
+    ):
+        super().__init__(max_candidates)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.device = device
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            self._model = CrossEncoder(self.model_name, max_length=self.max_length, device=self.device)
+        return self._model
+
+    def _rerank(self, question, chunks):
+        pairs = [(question, chunk.page_content) for chunk in chunks]
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        order = sorted(range(len(chunks)), key=lambda i: -float(scores[i]))
+        return [chunks[i] for i in order]
@@ -5,6 +5,7 @@ from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.messages import SystemMessage, HumanMessage, convert_to_messages
 from langchain_core.documents import Document
+from implementation.semantic_cache import SemanticCache
 
 from dotenv import load_dotenv
 
@@ -17,6 +18,8 @@ DB_NAME = str(Path(__file__).parent.parent / "vector_db")
 # embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 embeddings = OpenAIEmbeddings(base_url="https://openrouter.ai/api/v1", model="text-embedding-3-large", api_key=os.getenv("OPENROUTER_API_KEY"))
 RETRIEVAL_K = 10
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0") == "1"  # Opt-in; evaluation always bypasses it
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
 
 SYSTEM_PROMPT = """
 You are a knowledgeable, friendly assistant representing the company Insurellm.
@@ -30,6 +33,15 @@ Context:
 vectorstore = Chroma(persist_directory=DB_NAME, embedding_function=embeddings)
 retriever = vectorstore.as_retriever()
 llm = ChatOpenAI(base_url="https://openrouter.ai/api/v1", temperature=0, model=MODEL, api_key=os.getenv("OPENROUTER_API_KEY"))
+# Everything that changes the answer to a question; changing any of it empties the cache
+CACHE_SALT = repr((
+    MODEL, SYSTEM_PROMPT, getattr(embeddings, "model", getattr(embeddings, "model_name", "")), RETRIEVAL_K
+))
+answer_cache = (
+    SemanticCache(embeddings.embed_query, threshold=SEMANTIC_CACHE_THRESHOLD, salt=CACHE_SALT)
+    if SEMANTIC_CACHE
+    else None
+)
 
 
 def fetch_context(question: str) -> list[Document]:
@@ -47,10 +59,20 @@ def combined_question(question: str, history: list[dict] = []) -> str:
     return prior + "\n" + question
 
 
-def answer_question(question: str, history: list[dict] = []) -> tuple[str, list[Document]]:
+def answer_question(
+    question: str, history: list[dict] = [], use_cache: bool = True
+) -> tuple[str, list[Document]]:
     """
     Answer the given question with RAG; return the answer and the context documents.
+    Near-identical questions with the same history are answered from the semantic cache
+    when it is enabled, unless use_cache is False.
     """
+    cache = answer_cache if use_cache else None
+    if cache:
+        vector, cached = cache.get(question, history)
+        if cached:
+            answer, context = cached
+            return answer, [Document(**doc) for doc in context]
     combined = combined_question(question, history)
     docs = fetch_context(combined)
     context = "\n\n".join(doc.page_content for doc in docs)
@@ -59,4 +81,7 @@ def answer_question(question: str, history: list[dict] = []) -> tuple[str, list[
     messages.extend(convert_to_messages(history))
     messages.append(HumanMessage(content=question))
     response = llm.invoke(messages)
+    if cache:
+        context = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+        cache.put(question, history, vector, response.content, context)
     return response.content, docs
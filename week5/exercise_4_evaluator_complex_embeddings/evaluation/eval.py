@@ -141,7 +141,7 @@ def evaluate_answer(test: TestQuestion) -> tuple[AnswerEval, str, list]:
         Tuple of (AnswerEval object, generated_answer string, retrieved_docs list)
     """
     # Get RAG response using shared answer module
-    generated_answer, retrieved_docs = answer_question(test.question)
+    generated_answer, retrieved_docs = answer_question(test.question, use_cache=False)
 
     # LLM judge prompt
     judge_messages = [
@@ -5,6 +5,7 @@ from pydantic import BaseModel, Field
 from pathlib import Path
 from tenacity import retry, wait_exponential
 from concurrent.futures import ThreadPoolExecutor
+from implementation.semantic_cache import SemanticCache
 import os
 import re
 
@@ -28,6 +29,8 @@ collection = chroma.get_or_create_collection(collection_name)
 
 RETRIEVAL_K = 30
 FINAL_K = 15
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0") == "1"  # Opt-in; evaluation always bypasses it
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
 
 SYSTEM_PROMPT = """
 You are a knowledgeable, friendly assistant representing the company Insurellm.
@@ -42,6 +45,21 @@ With this context, please answer the user's question. Be accurate, relevant and
 """
 
 
+def embed(text):
+    return openai.embeddings.create(model=embedding_model, input=[text]).data[0].embedding
+
+
+# Everything that changes the answer to a question; changing any of it empties the cache
+CACHE_SALT = repr((
+    MODEL, SYSTEM_PROMPT, embedding_model, RETRIEVAL_K, FINAL_K
+))
+answer_cache = (
+    SemanticCache(embed, threshold=SEMANTIC_CACHE_THRESHOLD, salt=CACHE_SALT)
+    if SEMANTIC_CACHE
+    else None
+)
+
+
 class Result(BaseModel):
     page_content: str
     metadata: dict
@@ -165,15 +183,28 @@ def fetch_context(original_question):
 
 
 @retry(wait=wait)
-def answer_question(question: str, history: list[dict] | None = None) -> tuple[str, list]:
+def answer_question(
+    question: str, history: list[dict] | None = None, use_cache: bool = True
+) -> tuple[str, list]:
     """
-    Answer a question using RAG and return the answer and the retrieved context
+    Answer a question using RAG and return the answer and the retrieved context.
+    Near-identical questions with the same history are answered from the semantic cache
+    when it is enabled, unless use_cache is False.
     """
     history = history or []
+    cache = answer_cache if use_cache else None
+    if cache:
+        vector, cached = cache.get(question, history)
+        if cached:
+            answer, context = cached
+            return answer, [Result(**chunk) for chunk in context]
     chunks = fetch_context(question)
     messages = make_rag_messages(question, history, chunks)
     response = openai.chat.completions.create(
         model=MODEL,
         messages=messages
     )
-    return response.choices[0].message.content, chunks
+    answer = response.choices[0].message.content
+    if cache:
+        cache.put(question, history, vector, answer, [chunk.model_dump() for chunk in chunks])
+    return answer, chunks
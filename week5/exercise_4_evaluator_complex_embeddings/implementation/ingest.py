@@ -6,6 +6,7 @@ from chromadb import PersistentClient
 from tqdm import tqdm
 from multiprocessing import Pool
 from tenacity import retry, wait_exponential
+from semantic_cache import write_kb_version
 import os
 import re
 
@@ -161,4 +162,5 @@ if __name__ == "__main__":
     documents = fetch_documents()
     chunks = create_chunks(documents)
     create_embeddings(chunks)
+    write_kb_version([chunk.page_content for chunk in chunks])
     print("Ingestion complete")
@@ -0,0 +1,55 @@
+"""
+Compare rerankers on tests.jsonl: MRR, nDCG, keyword coverage and rerank latency
+
+Candidates are retrieved once per question and handed to every reranker, so
+the numbers only differ by the reranking step.
+
+Usage (from exercise_5_insurance_claims_rag/):
+    uv run python -m evaluation.compare_rerankers --limit 50
+"""
+import argparse
+import statistics
+
+from evaluation.eval import calculate_mrr, calculate_ndcg
+from evaluation.test import load_tests
+from implementation.answer import FINAL_K, RERANKERS, fetch_candidates, get_reranker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rerankers on the retrieval tests.")
+    parser.add_argument("--rerankers", nargs="+", default=list(RERANKERS), choices=list(RERANKERS))
+    parser.add_argument("--limit", type=int, default=0, help="Only use the first N tests (0 for all).")
+    parser.add_argument("--k", type=int, default=FINAL_K, help="Chunks kept after reranking.")
+    args = parser.parse_args()
+
+    tests = load_tests()
+    if args.limit:
+        tests = tests[: args.limit]
+
+    results = {name: {"mrr": [], "ndcg": [], "coverage": [], "seconds": []} for name in args.rerankers}
+    for index, test in enumerate(tests):
+        candidates, _ = fetch_candidates(test.question)
+        for name in args.rerankers:
+            reranker = get_reranker(name)
+            retrieved = reranker.rerank(test.question, candidates)[: args.k]
+            mrr = [calculate_mrr(keyword, retrieved) for keyword in test.keywords]
+            ndcg = [calculate_ndcg(keyword, retrieved, args.k) for keyword in test.keywords]
+            results[name]["mrr"].append(statistics.mean(mrr) if mrr else 0.0)
+            results[name]["ndcg"].append(statistics.mean(ndcg) if ndcg else 0.0)
+            results[name]["coverage"].append(sum(1 for score in mrr if score > 0) / max(len(mrr), 1))
+            results[name]["seconds"].append(reranker.last_seconds)
+        print(f"[{index + 1}/{len(tests)}] {test.question[:70]}")
+
+    print(f"\n{'Reranker':<16}{'MRR':>8}{'nDCG':>8}{'Coverage':>10}{'Mean s':>9}{'p95 s':>9}")
+    for name, metrics in results.items():
+        seconds = sorted(metrics["seconds"])
+        p95 = seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))]
+        print(
+            f"{name:<16}{statistics.mean(metrics['mrr']):>8.4f}{statistics.mean(metrics['ndcg']):>8.4f}"
+            f"{100 * statistics.mean(metrics['coverage']):>9.1f}%"
+            f"{statistics.mean(seconds):>9.3f}{p95:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
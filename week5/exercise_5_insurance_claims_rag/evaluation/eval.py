@@ -196,7 +196,7 @@ def evaluate_answer(test: TestQuestion) -> tuple[AnswerEval, str, list]:
     """
     # Get RAG response using shared answer module
     try:
-        generated_answer, retrieved_docs = answer_question(test.question)
+        generated_answer, retrieved_docs = answer_question(test.question, use_cache=False)
     except Exception as exc:
         return _safe_answer_eval(test, exc), "Error generating answer.", []
 
@@ -4,10 +4,15 @@ from dotenv import load_dotenv
 from chromadb import PersistentClient
 from pydantic import BaseModel, Field
 from pathlib import Path
-from tenacity import retry, wait_exponential
-from concurrent.futures import ThreadPoolExecutor
+from tenacity import retry, stop_after_attempt, wait_exponential
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as wait_futures
+from implementation.lexical_index import BM25Index
+from implementation.rerankers import CrossEncoderReranker, LLMReranker
+from implementation.semantic_cache import SemanticCache
 import os
 import re
+import threading
+import time
 
 
 load_dotenv(override=True)
@@ -16,21 +21,36 @@ load_dotenv(override=True)
 MODEL = "google/gemini-2.5-flash"
 DB_NAME = str(Path(__file__).parent.parent / "preprocessed_db")
 KNOWLEDGE_BASE_PATH = Path(__file__).parent.parent / "knowledge-base"
-FETCH_CONTEXT_WORKERS = int(os.getenv("FETCH_CONTEXT_WORKERS", "4"))
+LEXICAL_INDEX_PATH = str(Path(__file__).parent.parent / "lexical_index.json")
+FETCH_CONTEXT_WORKERS = int(os.getenv("FETCH_CONTEXT_WORKERS", "16"))
+# Retrievers needed before reranking (of 4); the slowest is dropped rather than waited for.
+# The pool is merged in a fixed retriever order, so which ones finish first doesn't bias it.
+RETRIEVAL_QUORUM = int(os.getenv("RETRIEVAL_QUORUM", "3"))
+RETRIEVAL_BUDGET_SECONDS = float(os.getenv("RETRIEVAL_BUDGET_SECONDS", "8"))
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))  # Attempts per LLM call before giving up
 
 collection_name = "docs"
 embedding_model = "text-embedding-3-large"
 wait = wait_exponential(multiplier=1, min=10, max=240)
+stop = stop_after_attempt(MAX_RETRIES)
 
 openai = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=os.getenv("OPENROUTER_API_KEY"))
 
+# Shared, never shut down: retrievers abandoned past the budget finish in the background,
+# bounded by MAX_RETRIES
+executor = ThreadPoolExecutor(max_workers=FETCH_CONTEXT_WORKERS)
+
 chroma = PersistentClient(path=DB_NAME)
 collection = chroma.get_or_create_collection(collection_name)
 
 RETRIEVAL_K = 60
 FINAL_K = 20
-LEXICAL_MAX_SCAN = int(os.getenv("LEXICAL_MAX_SCAN", "5000"))
+RERANKER = os.getenv("RERANKER", "cross-encoder")  # "cross-encoder" (local, CPU) or "llm"
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "80"))
+LEXICAL_PAGE_SIZE = 5000
 LEXICAL_TOP_N = int(os.getenv("LEXICAL_TOP_N", "20"))
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0") == "1"  # Opt-in; evaluation always bypasses it
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
 
 SYSTEM_PROMPT = """
 You are an experienced claims adjuster for Insurellm providing clear, authoritative claim decisions.
@@ -55,6 +75,22 @@ If the context doesn't contain enough information to make a confident decision,
 """
 
 
+def embed(text):
+    return openai.embeddings.create(model=embedding_model, input=[text]).data[0].embedding
+
+
+# Everything that changes the answer to a question; changing any of it empties the cache
+CACHE_SALT = repr((
+    MODEL, SYSTEM_PROMPT, embedding_model, RETRIEVAL_K, FINAL_K, RERANKER,
+    RERANK_MAX_CANDIDATES, LEXICAL_TOP_N, RETRIEVAL_QUORUM, RETRIEVAL_BUDGET_SECONDS,
+))
+answer_cache = (
+    SemanticCache(embed, threshold=SEMANTIC_CACHE_THRESHOLD, salt=CACHE_SALT)
+    if SEMANTIC_CACHE
+    else None
+)
+
+
 class Result(BaseModel):
     page_content: str
     metadata: dict
@@ -79,7 +115,7 @@ def _extract_json(text: str) -> str:
     raise ValueError("No JSON found in response")
 
 
-@retry(wait=wait)
+@retry(wait=wait, stop=stop)
 def rerank(question, chunks):
     system_prompt = """
 You are a document re-ranker.
@@ -118,7 +154,7 @@ def make_rag_messages(question, history, chunks):
     )
 
 
-@retry(wait=wait)
+@retry(wait=wait, stop=stop)
 def rewrite_query(question, history=None):
     """Rewrite the user's question to be a more specific question that is more likely to surface relevant content in the Knowledge Base."""
     history = history or []
@@ -150,7 +186,7 @@ class SearchTerms(BaseModel):
     )
 
 
-@retry(wait=wait)
+@retry(wait=wait, stop=stop)
 def extract_search_terms(question: str) -> list[str]:
     system_prompt = """
 You extract key search terms for retrieval.
@@ -171,12 +207,18 @@ Keep terms short (1-4 words) and avoid generic filler.
     return parsed.terms[:8]
 
 
-def merge_chunks(chunks, reranked):
-    merged = chunks[:]
-    existing = [chunk.page_content for chunk in chunks]
-    for chunk in reranked:
-        if chunk.page_content not in existing:
-            merged.append(chunk)
+def interleave_chunks(results):
+    """
+    Merge ranked chunk lists round-robin (first of each, then second of each, ...),
+    skipping duplicates, so a cap on the merged pool keeps the best of every list
+    """
+    merged = []
+    existing = set()
+    for rank in range(max((len(chunks) for chunks in results), default=0)):
+        for chunks in results:
+            if rank < len(chunks) and chunks[rank].page_content not in existing:
+                existing.add(chunks[rank].page_content)
+                merged.append(chunks[rank])
     return merged
 
 
@@ -189,67 +231,168 @@ def fetch_context_unranked(question):
     return chunks
 
 
-def _score_chunk_by_terms(text: str, terms: list[str]) -> int:
-    lowered = text.lower()
-    return sum(1 for term in terms if term.lower() in lowered)
+_lexical_index = None
+_lexical_lock = threading.Lock()
+
+
+def _build_lexical_index() -> BM25Index:
+    """Build the BM25 index from the collection, for databases ingested without one"""
+    ids, documents, metadatas = [], [], []
+    for offset in range(0, collection.count(), LEXICAL_PAGE_SIZE):
+        page = collection.get(limit=LEXICAL_PAGE_SIZE, offset=offset)
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+    index = BM25Index.build(ids, documents, metadatas)
+    index.save(LEXICAL_INDEX_PATH)
+    return index
+
+
+def get_lexical_index() -> BM25Index:
+    """Load the BM25 index written by ingest once, rebuilding it if it is missing or stale"""
+    global _lexical_index
+    with _lexical_lock:
+        if _lexical_index is None:
+            if os.path.exists(LEXICAL_INDEX_PATH):
+                _lexical_index = BM25Index.load(LEXICAL_INDEX_PATH)
+            if _lexical_index is None or len(_lexical_index) != collection.count():
+                _lexical_index = _build_lexical_index()
+        return _lexical_index
 
 
 def fetch_context_lexical(terms: list[str]) -> list[Result]:
     if not terms:
         return []
-    total = collection.count()
-    if total == 0 or total > LEXICAL_MAX_SCAN:
-        return []
-    fetched = collection.get(limit=total)
-    scored: list[tuple[int, Result]] = []
-    for doc_text, metadata in zip(fetched.get("documents", []), fetched.get("metadatas", [])):
-        if not doc_text:
-            continue
-        score = _score_chunk_by_terms(doc_text, terms)
-        if score <= 0:
-            continue
-        scored.append((score, Result(page_content=doc_text, metadata=metadata or {})))
-    scored.sort(key=lambda item: item[0], reverse=True)
-    return [item[1] for item in scored[:LEXICAL_TOP_N]]
+    index = get_lexical_index()
+    return [
+        Result(page_content=index.documents[row], metadata=index.metadatas[row])
+        for row, _ in index.search(" ".join(terms), LEXICAL_TOP_N)
+    ]
 
 
-def fetch_context(original_question):
-    with ThreadPoolExecutor(max_workers=FETCH_CONTEXT_WORKERS) as executor:
-        rewrite_future = executor.submit(rewrite_query, original_question)
-        terms_future = executor.submit(extract_search_terms, original_question)
-        original_future = executor.submit(fetch_context_unranked, original_question)
-
-        rewritten_question = rewrite_future.result()
-        terms = terms_future.result()
-        keyword_query = (
-            f"{original_question}\nKey terms: {', '.join(terms)}" if terms else original_question
+RERANKERS = {
+    "llm": lambda: LLMReranker(rerank, max_candidates=RERANK_MAX_CANDIDATES),
+    "cross-encoder": lambda: CrossEncoderReranker(max_candidates=RERANK_MAX_CANDIDATES),
+}
+_rerankers = {}
+
+
+def get_reranker(name=None):
+    name = name or RERANKER
+    if name not in _rerankers:
+        _rerankers[name] = RERANKERS[name]()
+    return _rerankers[name]
+
+
+RETRIEVERS = ("original", "rewritten", "keyword", "lexical")
+
+
+def fetch_candidates(original_question):
+    """
+    Run the retrievers concurrently and pool their chunks.
+
+    The original-question search starts at once; the rewritten-question search
+    starts when rewrite_query returns, and the keyword and lexical searches when
+    extract_search_terms does. The pool is returned as soon as RETRIEVAL_QUORUM
+    retrievers are in, or once RETRIEVAL_BUDGET_SECONDS have passed. Stages not
+    started by then are cancelled; running ones finish in the background and
+    their results are discarded. The pool interleaves the retrievers' rankings
+    in RETRIEVERS order, so the reranker's candidate cap covers all of them.
+
+    Returns (chunks, timings), where timings maps each stage to the seconds
+    from the start until it finished, or None if it was abandoned.
+    """
+    start = time.perf_counter()
+    deadline = start + RETRIEVAL_BUDGET_SECONDS
+    pending = {}
+    timings = {}
+    results = {}
+    retrieved = 0
+
+    def submit(stage, fn, *args):
+        pending[executor.submit(fn, *args)] = stage
+
+    submit("rewrite", rewrite_query, original_question)
+    submit("terms", extract_search_terms, original_question)
+    submit("original", fetch_context_unranked, original_question)
+
+    while pending and retrieved < RETRIEVAL_QUORUM:
+        done, _ = wait_futures(
+            pending, timeout=max(0.0, deadline - time.perf_counter()), return_when=FIRST_COMPLETED
         )
-        rewritten_future = executor.submit(fetch_context_unranked, rewritten_question)
-        keyword_future = executor.submit(fetch_context_unranked, keyword_query)
-        lexical_future = executor.submit(fetch_context_lexical, terms)
+        if not done:
+            break
+        for future in done:
+            stage = pending.pop(future)
+            timings[stage] = round(time.perf_counter() - start, 3)
+            try:
+                result = future.result()
+            except Exception as exc:
+                print(f"Retrieval stage '{stage}' failed: {exc}")
+                retrieved += stage in RETRIEVERS
+                continue
+            if stage == "rewrite":
+                submit("rewritten", fetch_context_unranked, result)
+            elif stage == "terms":
+                keyword_query = (
+                    f"{original_question}\nKey terms: {', '.join(result)}" if result else original_question
+                )
+                submit("keyword", fetch_context_unranked, keyword_query)
+                submit("lexical", fetch_context_lexical, result)
+            else:
+                results[stage] = result
+                retrieved += 1
+
+    for future, stage in pending.items():
+        future.cancel()
+        timings[stage] = None
+    chunks = interleave_chunks([results[stage] for stage in RETRIEVERS if stage in results])
+    return chunks, timings
+
+
+def fetch_context_timed(original_question):
+    """
+    Retrieve and rerank context for a question
+
+    Returns (chunks, timings): the top FINAL_K chunks, and the seconds each
+    retrieval stage finished at (None if abandoned) plus "rerank" and "total".
+    """
+    start = time.perf_counter()
+    chunks, timings = fetch_candidates(original_question)
+    reranker = get_reranker()
+    reranked = reranker.rerank(original_question, chunks)
+    timings["rerank"] = round(reranker.last_seconds, 3)
+    timings["total"] = round(time.perf_counter() - start, 3)
+    return reranked[:FINAL_K], timings
 
-        chunks1 = original_future.result()
-        chunks2 = rewritten_future.result()
-        chunks3 = keyword_future.result()
-        chunks4 = lexical_future.result()
 
-    chunks = merge_chunks(chunks1, chunks2)
-    chunks = merge_chunks(chunks, chunks3)
-    chunks = merge_chunks(chunks, chunks4)
-    reranked = rerank(original_question, chunks)
-    return reranked[:FINAL_K]
+def fetch_context(original_question):
+    return fetch_context_timed(original_question)[0]
 
 
-@retry(wait=wait)
-def answer_question(question: str, history: list[dict] | None = None) -> tuple[str, list]:
+@retry(wait=wait, stop=stop)
+def answer_question(
+    question: str, history: list[dict] | None = None, use_cache: bool = True
+) -> tuple[str, list]:
     """
-    Answer a question using RAG and return the answer and the retrieved context
+    Answer a question using RAG and return the answer and the retrieved context.
+    Near-identical questions with the same history are answered from the semantic cache
+    when it is enabled, unless use_cache is False.
     """
     history = history or []
+    cache = answer_cache if use_cache else None
+    if cache:
+        vector, cached = cache.get(question, history)
+        if cached:
+            answer, context = cached
+            return answer, [Result(**chunk) for chunk in context]
     chunks = fetch_context(question)
     messages = make_rag_messages(question, history, chunks)
     response = openai.chat.completions.create(
         model=MODEL,
         messages=messages
     )
-    return response.choices[0].message.content, chunks
+    answer = response.choices[0].message.content
+    if cache:
+        cache.put(question, history, vector, answer, [chunk.model_dump() for chunk in chunks])
+    return answer, chunks
@@ -7,6 +7,10 @@ from chromadb import PersistentClient
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tenacity import retry, wait_exponential, stop_after_attempt
+from lexical_index import BM25Index
+from semantic_cache import write_kb_version
+import hashlib
+import json
 import traceback
 import os
 import re
@@ -19,6 +23,8 @@ DB_NAME = str(Path(__file__).parent.parent / "preprocessed_db")
 collection_name = "docs"
 embedding_model = "text-embedding-3-large"
 KNOWLEDGE_BASE_PATH = Path(__file__).parent.parent / "knowledge-base"
+LEXICAL_INDEX_PATH = str(Path(__file__).parent.parent / "lexical_index.json")
+MANIFEST_PATH = str(Path(DB_NAME) / "ingest_manifest.json")  # Inside the DB, so it goes with it
 AVERAGE_CHUNK_SIZE = 100
 wait = wait_exponential(multiplier=1, min=10, max=240)
 
@@ -172,36 +178,71 @@ def create_chunks(documents):
     """
     Create chunks using a number of workers in parallel.
     If you get a rate limit error, set the WORKERS to 1.
+    Returns the chunks of each processed document by source; documents that failed are left out.
     """
-    chunks = []
+    chunks_by_source = {}
     failures = 0
     print(f"Submitting {len(documents)} documents with {WORKERS} workers...")
     with ThreadPoolExecutor(max_workers=WORKERS) as executor:
-        futures = [executor.submit(process_document, doc) for doc in documents]
+        futures = {executor.submit(process_document, doc): doc["source"] for doc in documents}
         for future in tqdm(as_completed(futures), total=len(futures)):
             try:
-                chunks.extend(future.result())
+                chunks_by_source[futures[future]] = future.result()
             except Exception as exc:
                 failures += 1
                 print(f"Failed to process document: {exc}")
     if failures:
         print(f"Failed documents: {failures}/{len(documents)}")
-    return chunks
+    return chunks_by_source
 
 
-def create_embeddings(chunks):
-    chroma = PersistentClient(path=DB_NAME)
-    if collection_name in [c.name for c in chroma.list_collections()]:
-        chroma.delete_collection(collection_name)
+def document_key(document):
+    return Path(document["source"]).relative_to(KNOWLEDGE_BASE_PATH).as_posix()
+
+
+def content_hash(document):
+    return hashlib.sha256(document["text"].encode("utf-8")).hexdigest()
+
+
+def load_manifest():
+    """The manifest maps each document (path relative to the knowledge base) to its content hash and chunk IDs"""
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
 
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def manifest_matches(collection, manifest):
+    """Whether the collection holds as many chunks as the manifest lists"""
+    return collection.count() == sum(len(entry["chunk_ids"]) for entry in manifest.values())
+
+
+def plan_ingest(documents, manifest):
+    """Return the documents that are new or changed since the manifest, and the keys of removed ones"""
+    current = {document_key(document): document for document in documents}
+    changed = [
+        document
+        for key, document in current.items()
+        if manifest.get(key, {}).get("hash") != content_hash(document)
+    ]
+    removed = [key for key in manifest if key not in current]
+    return changed, removed
+
+
+def embed_chunks(collection, ids, chunks):
     texts = [chunk.page_content for chunk in chunks]
-    collection = chroma.get_or_create_collection(collection_name)
     total_added = 0
     for start in range(0, len(texts), EMBED_BATCH_SIZE):
         end = min(start + EMBED_BATCH_SIZE, len(texts))
         batch_texts = texts[start:end]
         batch_metas = [chunk.metadata for chunk in chunks[start:end]]
-        batch_ids = [str(i) for i in range(start, end)]
 
         emb = openai.embeddings.create(model=embedding_model, input=batch_texts).data
         if not emb:
@@ -210,15 +251,82 @@ def create_embeddings(chunks):
                 f"or rate limits for model '{embedding_model}'."
             )
         vectors = [e.embedding for e in emb]
-        collection.add(
-            ids=batch_ids,
+        collection.upsert(
+            ids=ids[start:end],
             embeddings=vectors,
             documents=batch_texts,
             metadatas=batch_metas,
         )
         total_added += len(batch_texts)
         print(f"Embedded {total_added}/{len(texts)} chunks")
-    print(f"Vectorstore created with {collection.count()} documents")
+
+
+def ingest(documents):
+    """
+    Bring the collection up to date with the documents.
+    Only new or changed documents are chunked and embedded; chunks of changed
+    and removed documents are deleted. The collection is rebuilt when there is no
+    manifest, no collection, or the two disagree on the number of chunks.
+    """
+    chroma = PersistentClient(path=DB_NAME)
+    manifest = load_manifest()
+    exists = collection_name in [c.name for c in chroma.list_collections()]
+    if manifest is None or not exists or not manifest_matches(chroma.get_collection(collection_name), manifest):
+        print("No manifest matching the collection, rebuilding it")
+        if exists:
+            chroma.delete_collection(collection_name)
+        manifest = {}
+    collection = chroma.get_or_create_collection(collection_name)
+
+    changed, removed = plan_ingest(documents, manifest)
+    print(f"{len(changed)} new or changed, {len(removed)} removed, "
+          f"{len(documents) - len(changed)} unchanged documents")
+
+    chunks_by_source = create_chunks(changed)
+
+    stale_ids = [chunk_id for key in removed for chunk_id in manifest[key]["chunk_ids"]]
+    new_ids, new_chunks, entries = [], [], {}
+    for document in changed:
+        chunks = chunks_by_source.get(document["source"])
+        if chunks is None:
+            continue  # Failed to chunk; left as it was and retried on the next run
+        key = document_key(document)
+        prefix = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        ids = [f"{prefix}-{i}" for i in range(len(chunks))]
+        stale_ids.extend(manifest.get(key, {}).get("chunk_ids", []))
+        new_ids.extend(ids)
+        new_chunks.extend(chunks)
+        entries[key] = {"hash": content_hash(document), "chunk_ids": ids}
+
+    stale_ids = sorted(set(stale_ids) - set(new_ids))
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+    if new_chunks:
+        embed_chunks(collection, new_ids, new_chunks)
+
+    for key in removed:
+        del manifest[key]
+    manifest.update(entries)
+    save_manifest(manifest)
+    print(f"Vectorstore has {collection.count()} documents "
+          f"({len(new_chunks)} chunks added, {len(stale_ids)} deleted)")
+    return collection
+
+
+def read_collection(collection, page_size=5000):
+    ids, documents, metadatas = [], [], []
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(limit=page_size, offset=offset)
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+    return ids, documents, metadatas
+
+
+def create_lexical_index(ids, documents, metadatas):
+    index = BM25Index.build(ids, documents, metadatas)
+    index.save(LEXICAL_INDEX_PATH)
+    print(f"Lexical index created with {len(index)} documents and {len(index.postings)} terms")
 
 
 if __name__ == "__main__":
@@ -226,6 +334,8 @@ if __name__ == "__main__":
     if INGEST_DOC_LIMIT > 0:
         documents = documents[:INGEST_DOC_LIMIT]
         print(f"Limiting ingestion to {len(documents)} documents")
-    chunks = create_chunks(documents)
-    create_embeddings(chunks)
+    collection = ingest(documents)
+    ids, texts, metadatas = read_collection(collection)
+    create_lexical_index(ids, texts, metadatas)
+    write_kb_version([text for _, text in sorted(zip(ids, texts))])
     print("Ingestion complete")
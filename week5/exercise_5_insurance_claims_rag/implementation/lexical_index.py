@@ -0,0 +1,125 @@
+# BM25 inverted index over the knowledge base chunks, built at ingest time
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Keep IDs, codes and amounts such as "clm-2024-0183", "6.2.d" or "4,250" as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,/\-][a-z0-9]+)*")
+NUMBER_PATTERN = re.compile(r"[0-9]+(?:[.,][0-9]+)*")
+SEPARATOR_PATTERN = re.compile(r"[.,/\-]")
+# Stored with the index; an index written by another tokenizer is rebuilt
+TOKENIZER_VERSION = 2
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Joined tokens are kept whole and also split into their parts, so
+    "water-damage" matches a query for "water damage"; numbers such as
+    "4,250" or "12.5" are never split
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if not NUMBER_PATTERN.fullmatch(token):
+            parts = SEPARATOR_PATTERN.split(token)
+            if len(parts) > 1:
+                tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    Tokenized inverted index with Okapi BM25 scoring.
+
+    Postings are stored as numpy arrays of (chunk position, term frequency),
+    so a query only touches the chunks that contain one of its tokens.
+    """
+
+    def __init__(self, ids, documents, metadatas, postings, lengths):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.postings = postings
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+        # Length normalization of the BM25 denominator, fixed per chunk
+        self.norm = K1 * (1 - B + B * self.lengths / max(average_length, 1e-9))
+        self.idf = {
+            term: math.log(1 + (len(ids) - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, (rows, _) in postings.items()
+        }
+
+    @classmethod
+    def build(cls, ids: list[str], documents: list[str], metadatas: list[dict]) -> "BM25Index":
+        rows_by_term = defaultdict(list)
+        counts_by_term = defaultdict(list)
+        lengths = []
+        for row, text in enumerate(documents):
+            tokens = tokenize(text or "")
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                rows_by_term[term].append(row)
+                counts_by_term[term].append(count)
+        postings = {
+            term: (np.array(rows, dtype=np.int32), np.array(counts_by_term[term], dtype=np.float32))
+            for term, rows in rows_by_term.items()
+        }
+        return cls(list(ids), list(documents), [dict(m or {}) for m in metadatas], postings, lengths)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def save(self, path: str):
+        data = {
+            "tokenizer": TOKENIZER_VERSION,
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas,
+            "lengths": self.lengths.astype(int).tolist(),
+            "postings": {
+                term: [rows.tolist(), counts.astype(int).tolist()]
+                for term, (rows, counts) in self.postings.items()
+            },
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index | None":
+        """
+        Load a saved index, or return None if it was built with another tokenizer
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("tokenizer") != TOKENIZER_VERSION:
+            return None
+        postings = {
+            term: (np.array(rows, dtype=np.int32), np.array(counts, dtype=np.float32))
+            for term, (rows, counts) in data["postings"].items()
+        }
+        return cls(data["ids"], data["documents"], data["metadatas"], postings, data["lengths"])
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """
+        Return (chunk position, score) for the k best-scoring chunks, best first
+        """
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, counts = posting
+            scores[rows] += self.idf[term] * counts * (K1 + 1) / (counts + self.norm[rows])
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(int(row), float(scores[row])) for row in matched]
@@ -0,0 +1,189 @@
+# Semantic cache of answers, invalidated when the knowledge base is re-ingested
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+KB_VERSION_PATH = str(Path(__file__).parent.parent / "kb_version.txt")
+CACHE_PATH = str(Path(__file__).parent.parent / "answer_cache.sqlite")
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def write_kb_version(texts: list[str], path: str = KB_VERSION_PATH) -> str:
+    """
+    Stamp the knowledge base with a hash of its chunk texts; called at the end of ingest
+    """
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+    version = digest.hexdigest()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(version)
+    return version
+
+
+def read_kb_version(path: str = KB_VERSION_PATH) -> str:
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def history_digest(history: list[dict]) -> str:
+    """
+    Hash of the conversation so far; cached answers are only reused within the same history
+    """
+    turns = [(m.get("role", ""), " ".join(str(m.get("content", "")).split())) for m in history or []]
+    return hashlib.sha256(json.dumps(turns).encode("utf-8")).hexdigest()
+
+
+def question_numbers(question: str) -> str:
+    """
+    The numbers in a question, as a canonical string ("$4,250" and "4250" are equal)
+    """
+    return " ".join(sorted({number.replace(",", "") for number in NUMBER_PATTERN.findall(question)}))
+
+
+class SemanticCache:
+    """
+    Cache of (answer, context) keyed by question embedding and history digest.
+
+    A lookup returns the entry whose question is most similar to the new one,
+    if the cosine similarity reaches `threshold`, the conversation history is
+    the same and both questions contain the same numbers: questions that only
+    differ in an amount ($4,250 vs $24,250) embed almost identically. Entries
+    live in SQLite and in an in-memory matrix; all of them are dropped when
+    the knowledge base version stamp or the salt changes.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], list[float]],
+        path: str = CACHE_PATH,
+        version_path: str = KB_VERSION_PATH,
+        threshold: float = 0.95,
+        max_entries: int = 5000,
+        salt: str = "",
+    ):
+        """
+        embed: Function returning the embedding of a question
+        threshold: Minimum cosine similarity for a hit
+        max_entries: Entries kept; the oldest are evicted beyond this
+        salt: Identifies the answering setup (model, prompt, retrieval settings); appended to the version stamp
+        """
+        self.embed = embed
+        self.salt = salt
+        self.version_path = version_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_mtime = None
+        self._ids: list[int] = []
+        self._histories: list[str] = []
+        self._numbers: list[str] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kb_version TEXT NOT NULL, history TEXT NOT NULL, "
+            "question TEXT NOT NULL, embedding BLOB NOT NULL, answer TEXT NOT NULL, "
+            "context TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _sync_version(self):
+        """
+        Reload entries if the version stamp changed since the last call, dropping stale ones
+        """
+        mtime = os.path.getmtime(self.version_path) if os.path.exists(self.version_path) else None
+        if self._version is not None and mtime == self._version_mtime:
+            return
+        self._version_mtime = mtime
+        salt = hashlib.sha256(self.salt.encode("utf-8")).hexdigest()[:16]
+        self._version = f"{read_kb_version(self.version_path)}:{salt}"
+        self._conn.execute("DELETE FROM answers WHERE kb_version != ?", (self._version,))
+        self._conn.commit()
+        rows = self._conn.execute("SELECT id, history, question, embedding FROM answers ORDER BY id").fetchall()
+        self._ids = [row[0] for row in rows]
+        self._histories = [row[1] for row in rows]
+        self._numbers = [question_numbers(row[2]) for row in rows]
+        vectors = [np.frombuffer(row[3], dtype=np.float32) for row in rows]
+        self._matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def _vector(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embed(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, question: str, history: list[dict]) -> tuple[np.ndarray, tuple[str, list[dict]] | None]:
+        """
+        Look up a question
+
+        Returns (embedding, hit): hit is (answer, context as dicts) or None; pass
+        the embedding to put() to avoid embedding the question twice
+        """
+        vector = self._vector(question)
+        digest = history_digest(history)
+        numbers = question_numbers(question)
+        with self._lock:
+            self._sync_version()
+            best = None
+            if len(self._ids):
+                scores = self._matrix @ vector
+                eligible = np.array([
+                    h == digest and n == numbers for h, n in zip(self._histories, self._numbers)
+                ])
+                scores[~eligible] = -1.0
+                row = int(np.argmax(scores))
+                if scores[row] >= self.threshold:
+                    best = self._ids[row]
+            if best is None:
+                self.misses += 1
+                return vector, None
+            answer, context = self._conn.execute(
+                "SELECT answer, context FROM answers WHERE id = ?", (best,)
+            ).fetchone()
+            self.hits += 1
+        return vector, (answer, json.loads(context))
+
+    def put(self, question: str, history: list[dict], vector: np.ndarray, answer: str, context: list[dict]):
+        digest = history_digest(history)
+        with self._lock:
+            self._sync_version()
+            cursor = self._conn.execute(
+                "INSERT INTO answers (kb_version, history, question, embedding, answer, context, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._version, digest, question, vector.astype(np.float32).tobytes(), answer,
+                 json.dumps(context), time.time()),
+            )
+            self._ids.append(cursor.lastrowid)
+            self._histories.append(digest)
+            self._numbers.append(question_numbers(question))
+            self._matrix = np.vstack([self._matrix, vector[None, :]]) if len(self._matrix) else vector[None, :]
+            excess = len(self._ids) - self.max_entries
+            if excess > 0:
+                self._conn.execute("DELETE FROM answers WHERE id <= ?", (self._ids[excess - 1],))
+                self._ids = self._ids[excess:]
+                self._histories = self._histories[excess:]
+                self._numbers = self._numbers[excess:]
+                self._matrix = self._matrix[excess:]
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._ids),
+        }
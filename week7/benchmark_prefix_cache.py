@@ -0,0 +1,78 @@
+"""
+Check the prompt-prefix KV cache on CPU with a small causal LM
+
+Runs create_prediction_function with the prefix cache on and off over the same
+prompts, checks that the completions are identical and reports the time per
+prediction. --decoding compares the free, constrained and expected modes.
+
+Usage:
+    python benchmark_prefix_cache.py --model HuggingFaceTB/SmolLM2-135M --n 50
+"""
+
+import argparse
+import time
+
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from exercise_2_evaluating_base_model import PROMPT_PREFIX, create_prediction_function
+from inference import DECODING_MODES
+from pricer.items import PREFIX
+
+
+def make_items(n: int):
+    """
+    Prompts in the dataset format with synthetic product descriptions
+    """
+    products = [
+        "Stainless steel 12-cup programmable coffee maker with thermal carafe",
+        "Wireless noise cancelling over-ear headphones, 30 hour battery",
+        "Cordless drill driver kit, 20V lithium-ion, two batteries and charger",
+        "Replacement water filter cartridge for side-by-side refrigerators",
+        "4K UHD smart television, 55 inch, HDR10 and built-in streaming apps",
+    ]
+    return [
+        {"prompt": f"{PROMPT_PREFIX}{products[i % len(products)]} (variant {i})\n\n{PREFIX}"}
+        for i in range(n)
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare predictions with the prefix cache on and off.")
+    parser.add_argument("--model", default="HuggingFaceTB/SmolLM2-135M", help="Small causal LM to load on CPU.")
+    parser.add_argument("--n", type=int, default=50, help="Number of prompts.")
+    parser.add_argument("--max-new-tokens", type=int, default=8, help="Tokens generated per prompt.")
+    parser.add_argument("--decoding", default="free", choices=DECODING_MODES, help="Decoding mode.")
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_pretrained(args.model).to("cpu").eval()
+    model.generation_config.pad_token_id = tokenizer.pad_token_id
+
+    items = make_items(args.n)
+    results = {}
+    for use_prefix_cache in (False, True):
+        predict = create_prediction_function(
+            tokenizer,
+            model,
+            device="cpu",
+            max_new_tokens=args.max_new_tokens,
+            use_prefix_cache=use_prefix_cache,
+            decoding=args.decoding,
+        )
+        predict(items[0])  # Warm up
+        start = time.perf_counter()
+        outputs = [predict(item) for item in items]
+        elapsed = time.perf_counter() - start
+        results[use_prefix_cache] = outputs
+        label = "cache on " if use_prefix_cache else "cache off"
+        print(f"{label}: {elapsed / len(items) * 1000:.1f} ms/prediction")
+
+    mismatches = sum(a != b for a, b in zip(results[False], results[True]))
+    print(f"Identical completions: {len(items) - mismatches}/{len(items)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
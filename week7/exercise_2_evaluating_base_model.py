@@ -29,6 +29,8 @@ if str(script_dir) not in sys.path:
     sys.path.insert(0, str(script_dir))
 
 from util import evaluate
+from inference import PricePredictor
+from pricer.items import QUESTION
 
 # Import MLX for Mac (Apple Silicon) support
 try:
@@ -43,6 +45,8 @@ LITE_MODE = True  # Set to True for lite dataset, False for full dataset
 QUANT_4_BIT = True  # Set to True for 4-bit quantization, False for 8-bit
 DATA_USER = "Anthonygdg123"  # Hugging Face username for dataset
 EVAL_SIZE = 200  # Number of test examples to evaluate (default: 200)
+PROMPT_PREFIX = f"{QUESTION}\n\n"  # Shared start of every prompt, encoded once and cached
+DECODING = "free"  # "free", or opt in to "constrained" (numeric tokens only) or "expected" (one forward step)
 
 def get_device():
     """
@@ -252,6 +256,8 @@ def create_prediction_function(
     device: str = "cuda",
     use_mlx: bool = False,
     max_new_tokens: int = 8,
+    use_prefix_cache: bool = True,
+    decoding: str = DECODING,
 ):
     """
     Create a prediction function that takes a dataset item and returns a price prediction.
@@ -262,16 +268,35 @@ def create_prediction_function(
     3. Extracts only the newly generated tokens (completion)
     4. Returns the decoded completion
     
+    With use_prefix_cache, the key/value state of the shared question prefix is
+    computed once and reused, so each call only encodes the product text.
+    The decoding mode restricts generation to a well-formed number
+    ("constrained") or reads an expected price from a single forward step
+    ("expected"); both are transformers only.
+    
     Args:
         tokenizer: Tokenizer instance
         model: Loaded model instance (MLX or transformers)
         device: Device to use for inference ("cuda", "mps", or "cpu")
         use_mlx: Whether model is MLX (True) or transformers (False)
         max_new_tokens: Maximum number of new tokens to generate (default: 8 for price)
+        use_prefix_cache: Reuse the cached prompt prefix (transformers only)
+        decoding: "free", "constrained" or "expected"
         
     Returns:
         Function that takes an item dict and returns a string prediction
     """
+    predictor = None
+    if not use_mlx:
+        predictor = PricePredictor(
+            model,
+            tokenizer,
+            device,
+            decoding=decoding,
+            prefix=PROMPT_PREFIX if use_prefix_cache else None,
+            max_new_tokens=max_new_tokens,
+        )
+    
     def model_predict(item):
         """
         Predict price for a given item.
@@ -291,18 +316,7 @@ def create_prediction_function(
             return response.strip()
 
         # Use transformers for generation (CUDA/MPS/CPU)
-        inputs = tokenizer(item["prompt"], return_tensors="pt").to(device)
-        
-        # Generate prediction (disable gradient computation for inference)
-        with torch.no_grad():
-            output_ids = model.generate(**inputs, max_new_tokens=max_new_tokens)
-        
-        # Extract only the newly generated tokens (exclude the prompt)
-        prompt_len = inputs["input_ids"].shape[1]
-        generated_ids = output_ids[0, prompt_len:]
-        
-        # Decode the generated tokens to get the prediction string
-        return tokenizer.decode(generated_ids)
+        return predictor(item["prompt"])
     
     return model_predict
 
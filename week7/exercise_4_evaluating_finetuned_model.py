@@ -32,6 +32,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 from util import evaluate
+from inference import PricePredictor
+from pricer.items import QUESTION
 
 
 # Constants (mirrors the notebook)
@@ -49,6 +51,9 @@ DATASET_NAME = f"{DATA_USER}/items_prompts_lite" if LITE_MODE else f"{DATA_USER}
 RUN_NAME = "2026-01-28_06.12.23-lite"
 REVISION = None
 
+# "free" generation, or opt in to "constrained" (numeric tokens only, early stop) or "expected" (one forward step)
+DECODING = "free"
+
 PROJECT_RUN_NAME = f"{PROJECT_NAME}-{RUN_NAME}"
 HUB_MODEL_NAME = f"{HF_USER}/{PROJECT_RUN_NAME}"
 
@@ -125,13 +130,17 @@ def main():
     print(f"Memory footprint: {fine_tuned_model.get_memory_footprint() / 1e6:.1f} MB")
 
     # Use the model in inference mode
+    predictor = PricePredictor(
+        fine_tuned_model,
+        tokenizer,
+        device,
+        decoding=DECODING,
+        prefix=f"{QUESTION}\n\n",
+        max_new_tokens=8,
+    )
+
     def model_predict(item):
-        inputs = tokenizer(item["prompt"], return_tensors="pt").to(device)
-        with torch.no_grad():
-            output_ids = fine_tuned_model.generate(**inputs, max_new_tokens=8)
-        prompt_len = inputs["input_ids"].shape[1]
-        generated_ids = output_ids[0, prompt_len:]
-        return tokenizer.decode(generated_ids)
+        return predictor(item["prompt"])
 
     set_seed(42)
     evaluate(model_predict, test)
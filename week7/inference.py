@@ -0,0 +1,382 @@
+"""
+Inference helpers shared by the evaluation scripts
+
+- PromptPrefixCache keeps the attention key/value state of the constant prompt
+  prefix ("What does this cost to the nearest dollar?\n\n") so that each
+  prediction only encodes the product text and the generated price tokens.
+- NumericVocabulary constrains generation to digit, dot and end-of-text tokens,
+  or reads an expected price from the next-token distribution, falling back
+  to constrained generation for prices of 1000 and above.
+"""
+
+import copy
+import re
+from typing import Callable, List, Optional, Tuple
+
+import torch
+from transformers import DynamicCache, LogitsProcessor, LogitsProcessorList
+
+DECODING_MODES = ("free", "constrained", "expected")
+
+
+class PromptPrefixCache:
+    """
+    Key/value cache for a prompt prefix shared by every request.
+
+    The prefix is run through the model once. Each generate() call starts from
+    a copy of that state, so only the tokens after the prefix are encoded.
+    Batched prompts are laid out as [prefix | padding | rest] with the padding
+    masked out, which keeps the cached positions identical for every row.
+    """
+
+    def __init__(self, model, tokenizer, prefix: str, device: str):
+        """
+        Args:
+            model: Causal LM (plain transformers or PEFT-wrapped)
+            tokenizer: Tokenizer matching the model
+            prefix: Text every prompt starts with
+            device: Device the model runs on
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.prefix_ids = tokenizer(prefix).input_ids
+
+        self.cache = DynamicCache()
+        with torch.no_grad():
+            model(
+                input_ids=torch.tensor([self.prefix_ids], device=device),
+                past_key_values=self.cache,
+                use_cache=True,
+            )
+
+    def _layout(self, prompts: List[str]) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Tokenize prompts as [prefix | padding | rest] rows
+
+        Returns:
+            Tuple of (input_ids, attention_mask), or None if a prompt does not
+            tokenize to the cached prefix (the cache can't be used for it)
+        """
+        n = len(self.prefix_ids)
+        rows = [self.tokenizer(prompt).input_ids for prompt in prompts]
+        if any(row[:n] != self.prefix_ids or len(row) == n for row in rows):
+            return None
+
+        width = max(len(row) for row in rows)
+        pad = self.tokenizer.pad_token_id
+        input_ids, attention_mask = [], []
+        for row in rows:
+            gap = width - len(row)
+            input_ids.append(row[:n] + [pad] * gap + row[n:])
+            attention_mask.append([1] * n + [0] * gap + [1] * (len(row) - n))
+        return (
+            torch.tensor(input_ids, device=self.device),
+            torch.tensor(attention_mask, device=self.device),
+        )
+
+    def next_token_logits(self, prompts: List[str]) -> torch.Tensor:
+        """
+        Logits for the token following each prompt, in one forward pass
+
+        Returns:
+            (len(prompts), vocab) logits
+        """
+        layout = self._layout(prompts)
+        with torch.no_grad():
+            if layout is None:
+                inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+                logits = self.model(**inputs).logits
+                last = inputs["attention_mask"].sum(dim=1) - 1
+                if self.tokenizer.padding_side == "left":
+                    last = torch.full_like(last, inputs["input_ids"].shape[1] - 1)
+                return logits[torch.arange(len(prompts)), last]
+
+            input_ids, attention_mask = layout
+            n = len(self.prefix_ids)
+            past_key_values = copy.deepcopy(self.cache)
+            if len(prompts) > 1:
+                past_key_values.batch_repeat_interleave(len(prompts))
+            position_ids = (attention_mask.cumsum(dim=1) - 1).clamp(min=0)
+            logits = self.model(
+                input_ids=input_ids[:, n:],
+                attention_mask=attention_mask,
+                position_ids=position_ids[:, n:],
+                past_key_values=past_key_values,
+                use_cache=True,
+            ).logits
+            return logits[:, -1]
+
+    def generate(self, prompts: List[str], **generate_kwargs) -> torch.Tensor:
+        """
+        Generate completions for prompts starting with the cached prefix
+
+        Args:
+            prompts: Full prompts, prefix included
+            generate_kwargs: Passed through to model.generate
+
+        Returns:
+            Generated token ids only (prompt removed), one row per prompt
+        """
+        layout = self._layout(prompts)
+        if layout is None:
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+            input_ids, attention_mask = inputs["input_ids"], inputs["attention_mask"]
+        else:
+            input_ids, attention_mask = layout
+            past_key_values = copy.deepcopy(self.cache)
+            if len(prompts) > 1:
+                past_key_values.batch_repeat_interleave(len(prompts))
+            generate_kwargs["past_key_values"] = past_key_values
+
+        with torch.no_grad():
+            output_ids = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                **generate_kwargs,
+            )
+        return output_ids[:, input_ids.shape[1]:]
+
+
+class NumericVocabulary:
+    """
+    Token classes needed to decode prices: pure-digit tokens, tokens with a
+    single decimal point, and the end-of-text terminator.
+
+    Llama 3 encodes every number from 0 to 999 as one token and splits longer
+    numbers into groups of three digits from the left ("1234" is "123", "4").
+    A price below 1000 is therefore decided by its first token, while a first
+    token of three digits may be followed by more digits.
+    """
+
+    def __init__(self, tokenizer, decimals: int = 2):
+        """
+        Args:
+            tokenizer: Tokenizer whose vocabulary is scanned once
+            decimals: Digits allowed after the decimal point before stopping
+        """
+        self.tokenizer = tokenizer
+        self.decimals = decimals
+
+        digit_ids, value_ids, values, dot_ids = [], [], [], []
+        for token_id in range(len(tokenizer)):
+            text = tokenizer.decode([token_id])
+            if re.fullmatch(r"[0-9]+", text):
+                digit_ids.append(token_id)
+                # "00" or "007" can only continue a number, never start one
+                if text == "0" or not text.startswith("0"):
+                    value_ids.append(token_id)
+                    values.append(float(text))
+            elif re.fullmatch(r"[0-9]*\.[0-9]*", text):
+                dot_ids.append(token_id)
+
+        eos = tokenizer.eos_token_id
+        self.eos_ids = list(eos) if isinstance(eos, (list, tuple)) else [eos]
+        self.digit_ids = torch.tensor(digit_ids)
+        self.value_ids = torch.tensor(value_ids)
+        self.values = torch.tensor(values)
+        self.dot_ids = torch.tensor(dot_ids)
+
+    def processor(self) -> LogitsProcessorList:
+        """
+        Fresh logits processor list for one constrained generate call
+        """
+        return LogitsProcessorList([NumericLogitsProcessor(self)])
+
+    def parse(self, token_ids) -> float:
+        """
+        Price from constrained output (always digits with at most one dot)
+        """
+        text = self.tokenizer.decode(token_ids, skip_special_tokens=True).rstrip(".")
+        return float(text) if text else 0.0
+
+    def expected_price(self, logits: torch.Tensor) -> torch.Tensor:
+        """
+        Probability-weighted value of the first token of the price
+
+        Only numbers from 0 to 999 are single tokens, so the result never
+        exceeds 999; expected_prices() handles longer prices.
+
+        Args:
+            logits: (batch, vocab) logits for the token after the prompt
+
+        Returns:
+            (batch,) expected prices
+        """
+        value_logits = logits[:, self.value_ids.to(logits.device)].float()
+        probs = torch.softmax(value_logits, dim=-1)
+        return probs @ self.values.to(logits.device)
+
+    def expected_prices(
+        self,
+        next_token_logits: Callable[[List[str]], torch.Tensor],
+        constrained: Callable[[List[str]], List[float]],
+        prompts: List[str],
+    ) -> List[float]:
+        """
+        Expected prices, with constrained decoding for prices of 1000 and above
+
+        When the most likely first token has three digits, one more forward
+        step checks whether the model continues the number. Prompts where it
+        most likely does are priced with `constrained` instead.
+
+        Args:
+            next_token_logits: Returns (len(prompts), vocab) logits for a list of prompts
+            constrained: Prices a list of prompts with constrained generation
+            prompts: Prompts ending right before the price
+
+        Returns:
+            Prices, in prompt order
+        """
+        logits = next_token_logits(prompts)
+        prices = self.expected_price(logits).tolist()
+
+        value_ids = self.value_ids.to(logits.device)
+        first_ids = value_ids[logits[:, value_ids].argmax(dim=-1)].tolist()
+        first_texts = [self.tokenizer.decode([token_id]) for token_id in first_ids]
+        open_rows = [row for row, text in enumerate(first_texts) if len(text) == 3]
+        if not open_rows:
+            return prices
+
+        follow = next_token_logits([prompts[row] + first_texts[row] for row in open_rows]).float()
+        probs = torch.softmax(follow, dim=-1)
+        continues = probs[:, self.digit_ids.to(follow.device)].sum(dim=-1).tolist()
+        long_rows = [row for row, p in zip(open_rows, continues) if p > 0.5]
+        if long_rows:
+            for row, price in zip(long_rows, constrained([prompts[row] for row in long_rows])):
+                prices[row] = price
+        return prices
+
+
+class NumericLogitsProcessor(LogitsProcessor):
+    """
+    Masks every token except those that keep the completion a valid price.
+
+    The first token must be digits. A decimal point is allowed once, and after
+    `decimals` fractional digits only the terminator remains, so generation
+    stops as soon as the number is complete.
+    """
+
+    def __init__(self, vocabulary: NumericVocabulary):
+        self.vocabulary = vocabulary
+        self.prompt_length = None
+        self.masks = None
+
+    def _build_masks(self, vocab_size: int, device) -> dict:
+        def mask(*groups):
+            allowed = torch.zeros(vocab_size, dtype=torch.bool, device=device)
+            for ids in groups:
+                allowed[torch.as_tensor(ids, dtype=torch.long, device=device)] = True
+            return allowed
+
+        vocab = self.vocabulary
+        return {
+            "start": mask(vocab.value_ids),
+            "integer": mask(vocab.digit_ids, vocab.dot_ids, vocab.eos_ids),
+            "fraction": mask(vocab.digit_ids, vocab.eos_ids),
+            "done": mask(vocab.eos_ids),
+        }
+
+    def _state(self, text: str) -> str:
+        if not text:
+            return "start"
+        if "." not in text:
+            return "integer"
+        return "done" if len(text.split(".", 1)[1]) >= self.vocabulary.decimals else "fraction"
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1]
+            self.masks = self._build_masks(scores.shape[-1], scores.device)
+
+        tokenizer = self.vocabulary.tokenizer
+        for row in range(input_ids.shape[0]):
+            text = tokenizer.decode(input_ids[row, self.prompt_length:], skip_special_tokens=True)
+            allowed = self.masks[self._state(text)]
+            scores[row] = scores[row].masked_fill(~allowed, float("-inf"))
+        return scores
+
+
+class PricePredictor:
+    """
+    Price completion for a single prompt with the transformers backend.
+
+    Decoding modes:
+    - "free": plain generation, the completion is parsed afterwards
+    - "constrained": generation restricted to a well-formed number, stopping
+      as soon as it is complete
+    - "expected": one forward step, price = probability-weighted first token;
+      prices of 1000 and above fall back to "constrained"
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device: str,
+        decoding: str = "free",
+        prefix: Optional[str] = None,
+        max_new_tokens: int = 8,
+    ):
+        """
+        Args:
+            model: Causal LM (plain transformers or PEFT-wrapped)
+            tokenizer: Tokenizer matching the model
+            device: Device the model runs on
+            decoding: One of DECODING_MODES
+            prefix: Shared prompt prefix to encode once and cache, or None
+            max_new_tokens: Generation budget for "free" and "constrained"
+        """
+        if decoding not in DECODING_MODES:
+            raise ValueError(f"Unknown decoding mode {decoding!r}, expected one of {DECODING_MODES}")
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.decoding = decoding
+        self.max_new_tokens = max_new_tokens
+        self.prefix_cache = PromptPrefixCache(model, tokenizer, prefix, device) if prefix else None
+        self.vocabulary = NumericVocabulary(tokenizer) if decoding != "free" else None
+
+    def _next_token_logits(self, prompts: List[str]) -> torch.Tensor:
+        if self.prefix_cache is not None:
+            return self.prefix_cache.next_token_logits(prompts)
+        rows = []
+        for prompt in prompts:
+            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
+            with torch.no_grad():
+                rows.append(self.model(**inputs).logits[:, -1])
+        return torch.cat(rows)
+
+    def _generate(self, prompt: str, **generate_kwargs) -> torch.Tensor:
+        if self.prefix_cache is not None:
+            return self.prefix_cache.generate([prompt], **generate_kwargs)[0]
+        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            output_ids = self.model.generate(**inputs, **generate_kwargs)
+        return output_ids[0, inputs["input_ids"].shape[1]:]
+
+    def _constrained(self, prompts: List[str]) -> List[float]:
+        return [
+            self.vocabulary.parse(
+                self._generate(
+                    prompt,
+                    max_new_tokens=self.max_new_tokens,
+                    logits_processor=self.vocabulary.processor(),
+                )
+            )
+            for prompt in prompts
+        ]
+
+    def __call__(self, prompt: str) -> str:
+        """
+        Returns:
+            The completion text; always a plain number unless decoding is "free"
+        """
+        if self.decoding == "expected":
+            price = self.vocabulary.expected_prices(self._next_token_logits, self._constrained, [prompt])[0]
+            return f"{price:.2f}"
+
+        if self.decoding == "constrained":
+            return f"{self._constrained([prompt])[0]:.2f}"
+
+        return self.tokenizer.decode(self._generate(prompt, max_new_tokens=self.max_new_tokens))
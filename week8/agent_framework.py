@@ -2,16 +2,16 @@
 Agent Framework - Main orchestration with memory and logging
 """
 import os
+import asyncio
 import json
 import logging
-from typing import List, Optional
+import threading
+from typing import AsyncIterator, List, Optional
 from dotenv import load_dotenv
 from models import Opportunity
+from memory_store import MemoryStore
 from vector_store import VectorStore
-from agents.scanner_agent import ScannerAgent
-from agents.rag_pricer_agent import RAGPricerAgent, HuggingFacePricerAgent, EnsemblePricerAgent
-from agents.messaging_agent import MessagingAgent
-from agents.planning_agent import PlanningAgent
+from price_cache import PriceCache
 from utils import init_logging, BG_BLUE, WHITE, RESET
 
 load_dotenv(override=True)
@@ -21,7 +21,11 @@ class AgentFramework:
     """
     Main Agent Framework for coordinating all agents with memory and logging
     """
-    MEMORY_FILE = "agent_memory.json"
+    MEMORY_FILE = "agent_memory.json"  # Legacy format, imported once into MEMORY_DB
+    MEMORY_DB = "agent_memory.sqlite"
+    MEMORY_WINDOW = 100  # Most recent opportunities kept in memory
+    SPANS_FILE = "planning_spans.json"
+    PRICE_CACHE_DB = "price_cache.sqlite"
     
     def __init__(
         self,
@@ -50,47 +54,68 @@ class AgentFramework:
         self.use_modal = use_modal
         
         # Load memory
+        self.memory_store = MemoryStore(self.MEMORY_DB, legacy_json=self.MEMORY_FILE)
         self.memory = self._load_memory()
-        self.log(f"Loaded {len(self.memory)} items from memory")
+        self.log(f"Loaded {len(self.memory)} of {self.memory_store.count()} items from memory")
         
-        # Initialize vector store
+        # Initialize vector store (backend and embedding model load on first use)
         self.vector_store = VectorStore()
         
-        # Initialize agents (lazy loading)
+        # Estimates shared by all pricers, so repeated deals are priced once
+        self.price_cache = PriceCache(self.PRICE_CACHE_DB)
+        
+        # Initialize agents (lazy loading; their LangChain / LangGraph imports too)
         self.scanner = None
         self.rag_pricer = None
         self.hf_pricer = None
         self.ensemble_pricer = None
         self.messenger = None
         self.planner = None
+        self.last_spans: List[dict] = []
+        self._init_lock = threading.RLock()
         
         self.log("Agent Framework initialized")
     
     def _init_agents(self):
         """
-        Initialize all agents (called on first run)
+        Load the full dataset and initialize all agents (called on every run,
+        before any pricing; cheap once done)
+        """
+        with self._init_lock:
+            self.vector_store.ensure_full_dataset_loaded()
+            if self.planner is None:
+                self._create_agents()
+    
+    def _create_agents(self):
         """
-        if self.planner is not None:
-            return  # Already initialized
+        Import and construct the agents
+        """
+        from agents.scanner_agent import ScannerAgent
+        from agents.rag_pricer_agent import RAGPricerAgent, HuggingFacePricerAgent, EnsemblePricerAgent
+        from agents.messaging_agent import MessagingAgent
+        from agents.planning_agent import PlanningAgent
+        from deal_deduplicator import DealDeduplicator
         
         self.log("Initializing all agents")
         
         # Scanner Agent
-        self.scanner = ScannerAgent(api_key=self.api_key)
+        self.scanner = ScannerAgent(api_key=self.api_key, known_urls=self.memory_store)
         
         # RAG Pricer Agent
         self.rag_pricer = RAGPricerAgent(
             vector_store=self.vector_store,
-            api_key=self.api_key
+            api_key=self.api_key,
+            cache=self.price_cache
         )
         
         # Hugging Face Pricer Agent
-        self.hf_pricer = HuggingFacePricerAgent(use_modal=self.use_modal)
+        self.hf_pricer = HuggingFacePricerAgent(use_modal=self.use_modal, cache=self.price_cache)
         
         # Ensemble Pricer Agent
         self.ensemble_pricer = EnsemblePricerAgent(
             rag_pricer=self.rag_pricer,
-            hf_pricer=self.hf_pricer
+            hf_pricer=self.hf_pricer,
+            cache=self.price_cache
         )
         
         # Messaging Agent
@@ -100,46 +125,46 @@ class AgentFramework:
         self.planner = PlanningAgent(
             scanner=self.scanner,
             pricer=self.ensemble_pricer,
-            messenger=self.messenger
+            messenger=self.messenger,
+            deduplicator=DealDeduplicator(self.vector_store)
         )
         
         self.log("All agents initialized successfully")
     
+    def warm_up(self):
+        """
+        Load everything a run needs (vector store data, embedding model, agents)
+        ahead of time, so the first run does not pay for it
+        """
+        with self._init_lock:
+            self._init_agents()
+            self.vector_store.warm_up()
+        self.log("Warm-up complete")
+    
     def _load_memory(self) -> List[Opportunity]:
         """
-        Load memory from file
+        Load the most recent opportunities from the memory store
         
         Returns:
             List of Opportunity objects
         """
-        if os.path.exists(self.MEMORY_FILE):
-            try:
-                with open(self.MEMORY_FILE, "r") as f:
-                    data = json.load(f)
-                return [Opportunity(**item) for item in data]
-            except Exception as e:
-                logging.error(f"Error loading memory: {e}")
-                return []
-        return []
+        return self.memory_store.recent(self.MEMORY_WINDOW)
     
-    def _save_memory(self):
+    def _save_memory(self, opportunity: Opportunity):
         """
-        Save memory to file
+        Append a new opportunity to memory and the memory store
         """
-        try:
-            data = [opp.model_dump() for opp in self.memory]
-            with open(self.MEMORY_FILE, "w") as f:
-                json.dump(data, f, indent=2)
-            self.log(f"Saved {len(self.memory)} items to memory")
-        except Exception as e:
-            logging.error(f"Error saving memory: {e}")
+        self.memory_store.append(opportunity)
+        self.memory.append(opportunity)
+        self.memory = self.memory[-self.MEMORY_WINDOW:]
+        self.log(f"Saved opportunity to memory ({self.memory_store.count()} items)")
     
     def reset_memory(self):
         """
-        Reset memory (keep only last 2 items for testing)
+        Reset memory (keep only first 2 items for testing)
         """
-        self.memory = self.memory[:2] if len(self.memory) > 2 else self.memory
-        self._save_memory()
+        self.memory_store.reset(keep=2)
+        self.memory = self._load_memory()
         self.log("Memory reset")
     
     def log(self, message: str):
@@ -149,32 +174,68 @@ class AgentFramework:
         text = BG_BLUE + WHITE + "[Agent Framework] " + message + RESET
         logging.info(text)
     
-    def run(self) -> List[Opportunity]:
+    async def arun_events(self) -> AsyncIterator[dict]:
         """
-        Run the agent framework workflow
+        Run the agent framework workflow, yielding planning events as they happen
         
-        Returns:
-            Updated list of opportunities
+        Yields:
+            Planning agent events ("span", "result"), then
+            {"type": "done", "memory": List[Opportunity]}
         """
-        self._init_agents()
+        await asyncio.to_thread(self._init_agents)
         
         self.log("Starting agent workflow")
         
         # Run planning agent
-        result = self.planner.plan(memory=self.memory)
+        result = None
+        async for event in self.planner.astream(memory=self.memory):
+            if event["type"] == "result":
+                result = event["opportunity"]
+                self.last_spans = event["spans"]
+            yield event
         
         # Update memory if new opportunity found
         if result:
-            self.memory.append(result)
-            self._save_memory()
-            self.log(f"New opportunity added to memory - Total: {len(self.memory)}")
+            self._save_memory(result)
+            self.log(f"New opportunity added to memory - Total: {self.memory_store.count()}")
         else:
             self.log("No new opportunities above threshold")
         
         self.log("Agent workflow completed")
         
+        yield {"type": "done", "memory": self.memory}
+    
+    async def arun(self) -> List[Opportunity]:
+        """
+        Run the agent framework workflow asynchronously
+        
+        Returns:
+            Updated list of opportunities
+        """
+        async for _ in self.arun_events():
+            pass
         return self.memory
     
+    def run(self) -> List[Opportunity]:
+        """
+        Run the agent framework workflow
+        
+        Returns:
+            Updated list of opportunities
+        """
+        return asyncio.run(self.arun())
+    
+    def export_spans(self, path: str = SPANS_FILE) -> str:
+        """
+        Write the per-node timings of the last run to a JSON file
+        
+        Returns:
+            Path written
+        """
+        with open(path, "w") as f:
+            json.dump(self.last_spans, f, indent=2)
+        return path
+    
     def load_sample_data(self, num_samples: int = 100):
         """
         Load sample product data into vector store
@@ -229,18 +290,24 @@ class AgentFramework:
         
         self.log(f"Successfully loaded {num_samples} products into vector store")
     
-    def get_stats(self) -> dict:
+    def get_stats(self, include_vector_store: bool = True) -> dict:
         """
         Get framework statistics
         
+        Args:
+            include_vector_store: Count the vector store items (opens the backend);
+                when False, vector_store_items is None
+        
         Returns:
             Dictionary with stats
         """
+        memory_stats = self.memory_store.stats()
         return {
-            "memory_items": len(self.memory),
-            "vector_store_items": self.vector_store.count(),
-            "best_discount": max([opp.discount for opp in self.memory], default=0.0),
-            "total_savings": sum([opp.discount for opp in self.memory if opp.discount > 0]),
+            "memory_items": memory_stats["count"],
+            "vector_store_items": self.vector_store.count() if include_vector_store else None,
+            "best_discount": memory_stats["best_discount"],
+            "total_savings": memory_stats["total_savings"],
+            "price_cache": self.price_cache.stats(),
         }
 
 
@@ -1,7 +1,10 @@
 """
 Planning Agent - Coordinates activities across all agents using LangGraph
 """
-from typing import List, Optional, TypedDict, Annotated
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, TypedDict, Annotated
 from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
@@ -21,6 +24,7 @@ class PlanningState(TypedDict):
     best_opportunity: Optional[Opportunity]
     messages: Annotated[List, operator.add]
     error: Optional[str]
+    spans: List[dict]
 
 
 class PlanningAgent(BaseAgent):
@@ -35,7 +39,8 @@ class PlanningAgent(BaseAgent):
         self,
         scanner: ScannerAgent,
         pricer: EnsemblePricerAgent,
-        messenger: MessagingAgent
+        messenger: MessagingAgent,
+        deduplicator=None
     ):
         """
         Initialize the Planning Agent with sub-agents
@@ -44,12 +49,15 @@ class PlanningAgent(BaseAgent):
             scanner: Scanner agent for finding deals
             pricer: Ensemble pricer agent for estimating prices
             messenger: Messaging agent for notifications
+            deduplicator: Optional DealDeduplicator run between scanning and pricing
         """
         self.log("Planning Agent is initializing")
         
         self.scanner = scanner
         self.pricer = pricer
         self.messenger = messenger
+        self.deduplicator = deduplicator
+        self.last_spans: List[dict] = []
         
         # Build the workflow graph
         self._build_graph()
@@ -63,11 +71,13 @@ class PlanningAgent(BaseAgent):
         # Create workflow graph
         workflow = StateGraph(PlanningState)
         
-        # Add nodes
-        workflow.add_node("scan", self._scan_node)
-        workflow.add_node("price", self._price_node)
-        workflow.add_node("evaluate", self._evaluate_node)
-        workflow.add_node("notify", self._notify_node)
+        # Add nodes (coroutines, each timed into a span)
+        workflow.add_node("scan", self._timed("scan", self._scan_node))
+        workflow.add_node("price", self._timed("price", self._price_node))
+        if self.deduplicator:
+            workflow.add_node("dedup", self._timed("dedup", self._dedup_node))
+        workflow.add_node("evaluate", self._timed("evaluate", self._evaluate_node))
+        workflow.add_node("notify", self._timed("notify", self._notify_node))
         
         # Set entry point
         workflow.set_entry_point("scan")
@@ -77,11 +87,13 @@ class PlanningAgent(BaseAgent):
             "scan",
             self._should_continue_after_scan,
             {
-                "price": "price",
+                "price": "dedup" if self.deduplicator else "price",
                 "end": END
             }
         )
         
+        if self.deduplicator:
+            workflow.add_edge("dedup", "price")
         workflow.add_edge("price", "evaluate")
         
         workflow.add_conditional_edges(
@@ -100,14 +112,34 @@ class PlanningAgent(BaseAgent):
         
         self.log("Workflow graph compiled successfully")
     
-    def _scan_node(self, state: PlanningState) -> PlanningState:
+    def _timed(
+        self,
+        name: str,
+        node: Callable[[PlanningState], Awaitable[PlanningState]],
+    ) -> Callable[[PlanningState], Awaitable[PlanningState]]:
+        """
+        Wrap a node so its wall time is appended to state["spans"]
+        """
+        async def run(state: PlanningState) -> PlanningState:
+            started = time.time()
+            start = time.perf_counter()
+            state = await node(state)
+            state["spans"].append({
+                "node": name,
+                "start": round(started, 3),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            })
+            return state
+        return run
+    
+    async def _scan_node(self, state: PlanningState) -> PlanningState:
         """
         Scan for new deals
         """
         self.log("Scanning for new deals")
         
         try:
-            scanned_deals = self.scanner.scan(memory=state["memory"])
+            scanned_deals = await asyncio.to_thread(self.scanner.scan, memory=state["memory"])
             state["scanned_deals"] = scanned_deals
             state["messages"].append(HumanMessage(content="Scanning completed"))
             
@@ -123,9 +155,30 @@ class PlanningAgent(BaseAgent):
         
         return state
     
-    def _price_node(self, state: PlanningState) -> PlanningState:
+    async def _dedup_node(self, state: PlanningState) -> PlanningState:
         """
-        Price all scanned deals
+        Drop near-duplicate deals before any of them is priced
+        """
+        self.log("De-duplicating scanned deals")
+        
+        scanned_deals = state["scanned_deals"]
+        try:
+            kept = await asyncio.to_thread(
+                self.deduplicator.deduplicate, scanned_deals.deals, state["memory"]
+            )
+            state["scanned_deals"] = DealSelection(deals=kept)
+            state["messages"].append(
+                HumanMessage(content=f"Kept {len(kept)} of {len(scanned_deals.deals)} deals")
+            )
+        except Exception as e:
+            # Pricing a duplicate is wasteful but harmless, so carry on
+            self.log(f"Error during de-duplication: {e}")
+        
+        return state
+    
+    async def _price_node(self, state: PlanningState) -> PlanningState:
+        """
+        Price all scanned deals concurrently
         """
         self.log("Pricing scanned deals")
         
@@ -133,34 +186,37 @@ class PlanningAgent(BaseAgent):
         scanned_deals = state["scanned_deals"]
         
         if scanned_deals:
-            for deal in scanned_deals.deals[:5]:  # Process top 5
-                try:
-                    self.log(f"Pricing: {deal.product_description[:50]}...")
-                    
-                    # Get price estimate
-                    estimate = self.pricer.price(deal.product_description)
-                    discount = estimate - deal.price
-                    
-                    opportunity = Opportunity(
-                        deal=deal,
-                        estimate=estimate,
-                        discount=discount
-                    )
-                    
-                    opportunities.append(opportunity)
-                    
-                    self.log(f"Price: ${deal.price:.2f}, Estimate: ${estimate:.2f}, Discount: ${discount:.2f}")
-                    
-                except Exception as e:
-                    self.log(f"Error pricing deal: {e}")
-                    continue
+            deals = scanned_deals.deals[:5]  # Process top 5
+            try:
+                # Price the whole selection with one retrieval round trip; the
+                # deals' LLM and HF calls run concurrently inside price_batch
+                estimates = await asyncio.to_thread(
+                    self.pricer.price_batch,
+                    [deal.product_description for deal in deals],
+                )
+            except Exception as e:
+                self.log(f"Error pricing deals: {e}")
+                estimates = []
+            
+            for deal, estimate in zip(deals, estimates):
+                discount = estimate - deal.price
+                
+                opportunity = Opportunity(
+                    deal=deal,
+                    estimate=estimate,
+                    discount=discount
+                )
+                
+                opportunities.append(opportunity)
+                
+                self.log(f"{deal.product_description[:50]}... Price: ${deal.price:.2f}, Estimate: ${estimate:.2f}, Discount: ${discount:.2f}")
         
         state["opportunities"] = opportunities
         state["messages"].append(HumanMessage(content=f"Priced {len(opportunities)} deals"))
         
         return state
     
-    def _evaluate_node(self, state: PlanningState) -> PlanningState:
+    async def _evaluate_node(self, state: PlanningState) -> PlanningState:
         """
         Evaluate opportunities and select the best one
         """
@@ -185,7 +241,7 @@ class PlanningAgent(BaseAgent):
         
         return state
     
-    def _notify_node(self, state: PlanningState) -> PlanningState:
+    async def _notify_node(self, state: PlanningState) -> PlanningState:
         """
         Send notification for the best opportunity
         """
@@ -195,7 +251,7 @@ class PlanningAgent(BaseAgent):
         
         if best:
             try:
-                self.messenger.alert(best)
+                await asyncio.to_thread(self.messenger.alert, best)
                 state["messages"].append(
                     AIMessage(content=f"Notification sent for ${best.discount:.2f} deal")
                 )
@@ -227,15 +283,17 @@ class PlanningAgent(BaseAgent):
         
         return "end"
     
-    def plan(self, memory: List[Opportunity] = []) -> Optional[Opportunity]:
+    async def astream(self, memory: List[Opportunity] = []) -> AsyncIterator[dict]:
         """
-        Execute the full planning workflow
+        Execute the planning workflow, yielding events as it progresses
         
         Args:
             memory: List of previously processed opportunities
             
-        Returns:
-            Best opportunity if found, otherwise None
+        Yields:
+            {"type": "span", "span": {...}} after each node, then
+            {"type": "result", "opportunity": Opportunity or None, "spans": [...],
+             "deals_scanned": int, "deals_priced": int}
         """
         self.log("Starting planning workflow")
         
@@ -246,25 +304,84 @@ class PlanningAgent(BaseAgent):
             "opportunities": [],
             "best_opportunity": None,
             "messages": [],
-            "error": None
+            "error": None,
+            "spans": [],
         }
         
+        started = time.time()
+        start = time.perf_counter()
+        final_state = initial_state
+        reported = 0
+        best = None
+        
         # Run the workflow
         try:
-            final_state = self.graph.invoke(initial_state)
+            async for final_state in self.graph.astream(initial_state, stream_mode="values"):
+                for span in final_state["spans"][reported:]:
+                    yield {"type": "span", "span": span}
+                reported = len(final_state["spans"])
             
             best = final_state.get("best_opportunity")
             
             if best and best.discount > self.DEAL_THRESHOLD:
                 self.log(f"Planning completed successfully - best deal: ${best.discount:.2f}")
-                return best
             else:
                 self.log("Planning completed - no deals above threshold")
-                return None
+                best = None
                 
         except Exception as e:
             self.log(f"Error in planning workflow: {e}")
-            return None
+            best = None
+        
+        total = {
+            "node": "plan",
+            "start": round(started, 3),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        self.last_spans = list(final_state["spans"]) + [total]
+        scanned = final_state.get("scanned_deals")
+        yield {"type": "span", "span": total}
+        yield {
+            "type": "result",
+            "opportunity": best,
+            "spans": self.last_spans,
+            "deals_scanned": len(scanned.deals) if scanned else 0,
+            "deals_priced": len(final_state.get("opportunities") or []),
+        }
+    
+    async def aplan(self, memory: List[Opportunity] = []) -> Optional[Opportunity]:
+        """
+        Execute the full planning workflow asynchronously
+        
+        Args:
+            memory: List of previously processed opportunities
+            
+        Returns:
+            Best opportunity if found, otherwise None
+        """
+        best = None
+        async for event in self.astream(memory):
+            if event["type"] == "result":
+                best = event["opportunity"]
+        return best
+    
+    def plan(self, memory: List[Opportunity] = []) -> Optional[Opportunity]:
+        """
+        Execute the full planning workflow (blocking wrapper around aplan)
+        
+        Args:
+            memory: List of previously processed opportunities
+            
+        Returns:
+            Best opportunity if found, otherwise None
+        """
+        return asyncio.run(self.aplan(memory))
+    
+    def spans_json(self) -> str:
+        """
+        Node timings of the last run as JSON
+        """
+        return json.dumps(self.last_spans, indent=2)
     
     def run_single_deal(self, deal: Deal) -> Opportunity:
         """
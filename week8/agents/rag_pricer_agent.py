@@ -1,21 +1,29 @@
 """
 RAG-Prices Agent - Uses RAG with frontier model to estimate prices
 """
+import hashlib
 import re
-from typing import List, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from vector_store import VectorStore
+from price_cache import PriceCache
 from utils import BaseAgent, BLUE
 
 
 class RAGPricerAgent(BaseAgent):
     """
     RAG-based Pricer Agent that uses vector search and frontier model
+
+    The vector store is expected to be loaded already (the agent framework
+    loads it before any pricing), so no pricing call waits on ingestion.
     """
     name = "RAG Pricer Agent"
     color = BLUE
     MODEL = "google/gemini-2.5-flash"  # Frontier model via OpenRouter
+    REQUEST_TIMEOUT = 60.0  # Seconds per LLM request, so abandoned calls still end
     
     SYSTEM_PROMPT = """You are a pricing expert that estimates product prices based on similar items.
     You will be provided with a product description and examples of similar products with their prices.
@@ -35,7 +43,13 @@ Here are similar products to help you estimate:
 
 What is the estimated price? Respond with ONLY the numeric value."""
     
-    def __init__(self, vector_store: VectorStore, api_key: str, base_url: str = "https://openrouter.ai/api/v1"):
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        api_key: str,
+        base_url: str = "https://openrouter.ai/api/v1",
+        cache: Optional[PriceCache] = None
+    ):
         """
         Initialize the RAG Pricer Agent
         
@@ -43,17 +57,23 @@ What is the estimated price? Respond with ONLY the numeric value."""
             vector_store: VectorStore instance for similarity search
             api_key: OpenRouter API key
             base_url: OpenRouter base URL
+            cache: Optional cache of previous estimates
         """
         self.log("Initializing RAG Pricer Agent")
         
         self.vector_store = vector_store
+        self.cache = cache
+        # Model and prompts identify the estimates in the cache
+        prompts = hashlib.sha256((self.SYSTEM_PROMPT + self.USER_PROMPT_TEMPLATE).encode()).hexdigest()
+        self.version = f"rag:{self.MODEL}:{prompts[:12]}"
         
         # Initialize LangChain LLM with OpenRouter
         self.llm = ChatOpenAI(
             model=self.MODEL,
             api_key=api_key,
             base_url=base_url,
-            temperature=0.1
+            temperature=0.1,
+            timeout=self.REQUEST_TIMEOUT
         )
         
         # Create prompt template
@@ -104,6 +124,22 @@ What is the estimated price? Respond with ONLY the numeric value."""
         
         return 0.0
     
+    def _fallback_price(self, similar_prices: List[float]) -> float:
+        """
+        Average of the similar prices, used when the LLM call fails
+        
+        Args:
+            similar_prices: Prices of the retrieved similar products
+            
+        Returns:
+            Fallback price estimate
+        """
+        if similar_prices:
+            avg_price = sum(similar_prices) / len(similar_prices)
+            self.log(f"Using fallback average price: ${avg_price:.2f}")
+            return avg_price
+        return 0.0
+    
     def price(self, description: str, n_similar: int = 5) -> float:
         """
         Estimate the price of a product using RAG
@@ -115,8 +151,13 @@ What is the estimated price? Respond with ONLY the numeric value."""
         Returns:
             Estimated price
         """
-        # Ensure the full dataset is loaded before querying
-        self.vector_store.ensure_full_dataset_loaded()
+        version = f"{self.version}:{n_similar}"
+        if self.cache:
+            cached = self.cache.get(version, description)
+            if cached is not None:
+                self.log(f"RAG Pricer cache hit - predicting ${cached:.2f}")
+                return cached
+        
         self.log(f"RAG Pricer is searching for {n_similar} similar products")
         
         # Find similar products using vector search
@@ -144,6 +185,8 @@ What is the estimated price? Respond with ONLY the numeric value."""
             
             # Extract price from response
             price = self._extract_price(response.content)
+            if self.cache and price > 0:
+                self.cache.put(version, description, price)
             
             self.log(f"RAG Pricer completed - predicting ${price:.2f}")
             return price
@@ -151,11 +194,75 @@ What is the estimated price? Respond with ONLY the numeric value."""
         except Exception as e:
             self.log(f"Error in pricing: {e}")
             # Fallback to average of similar prices
-            if similar_prices:
-                avg_price = sum(similar_prices) / len(similar_prices)
-                self.log(f"Using fallback average price: ${avg_price:.2f}")
-                return avg_price
-            return 0.0
+            return self._fallback_price(similar_prices)
+    
+    def price_batch(self, descriptions: List[str], n_similar: int = 5) -> List[float]:
+        """
+        Estimate the prices of several products with one retrieval round trip
+        
+        Descriptions found in the cache are answered from it. Similar products
+        for the rest are fetched with a single batched vector search, then the
+        LLM calls run concurrently.
+        
+        Args:
+            descriptions: Product descriptions
+            n_similar: Number of similar products to retrieve per description
+            
+        Returns:
+            Estimated prices, in the same order as the descriptions
+        """
+        if not descriptions:
+            return []
+        
+        version = f"{self.version}:{n_similar}"
+        cached = self.cache.get_many(version, descriptions) if self.cache else {}
+        prices = [cached.get(i, 0.0) for i in range(len(descriptions))]
+        if cached:
+            self.log(f"RAG Pricer cache hit for {len(cached)} of {len(descriptions)} deals")
+        uncached = [i for i in range(len(descriptions)) if i not in cached]
+        if not uncached:
+            return prices
+        
+        self.log(f"RAG Pricer is searching for {n_similar} similar products for {len(uncached)} deals")
+        
+        found = self.vector_store.search_similar_batch(
+            [descriptions[i] for i in uncached], n_results=n_similar
+        )
+        matches = dict(zip(uncached, found))
+        
+        pending = [i for i in uncached if matches[i][0]]
+        if len(pending) < len(uncached):
+            self.log(f"No similar products found for {len(uncached) - len(pending)} deals, using default price")
+        if not pending:
+            return prices
+        
+        self.log(f"RAG Pricer is calling {self.MODEL} for {len(pending)} deals")
+        
+        inputs = [
+            {
+                "product_description": descriptions[i],
+                "similar_products": self._format_similar_products(*matches[i]),
+            }
+            for i in pending
+        ]
+        responses = self.chain.batch(inputs, return_exceptions=True)
+        
+        priced = []
+        for i, response in zip(pending, responses):
+            if isinstance(response, Exception):
+                self.log(f"Error in pricing: {response}")
+                prices[i] = self._fallback_price(matches[i][1])
+            else:
+                prices[i] = self._extract_price(response.content)
+                if prices[i] > 0:
+                    priced.append(i)
+        
+        # Fallback averages are not cached, so a failed call is retried next time
+        if self.cache and priced:
+            self.cache.put_many(version, [descriptions[i] for i in priced], [prices[i] for i in priced])
+        
+        self.log(f"RAG Pricer completed batch - predicting {', '.join(f'${p:.2f}' for p in prices)}")
+        return prices
 
 
 class HuggingFacePricerAgent(BaseAgent):
@@ -165,22 +272,27 @@ class HuggingFacePricerAgent(BaseAgent):
     name = "HF Pricer Agent"
     color = BLUE
     
-    def __init__(self, use_modal: bool = True):
+    def __init__(self, use_modal: bool = True, cache: Optional[PriceCache] = None):
         """
         Initialize the Hugging Face Pricer Agent
         
         Args:
             use_modal: Whether to use Modal service (True) or mock (False)
+            cache: Optional cache of previous estimates
         """
         self.log(f"Initializing HF Pricer Agent (use_modal={use_modal})")
         
         self.use_modal = use_modal
         self.using_mock = False
+        self.cache = cache
+        self.version = "hf:mock"
         
         if use_modal:
             try:
-                from modal_pricer_service import PricerClient
-                self.client = PricerClient()
+                from modal_pricer_service import PricerClient, CoalescingPricer, MODEL_VERSION
+                # Concurrent price() calls are coalesced into batched Modal calls
+                self.client = CoalescingPricer(PricerClient())
+                self.version = f"hf:{MODEL_VERSION}"
                 self.log("✅ Successfully connected to Modal service!")
             except Exception as e:
                 self.log(f"❌ Failed to connect to Modal: {e}")
@@ -207,6 +319,12 @@ class HuggingFacePricerAgent(BaseAgent):
         Returns:
             Estimated price
         """
+        if self.cache:
+            cached = self.cache.get(self.version, description)
+            if cached is not None:
+                self.log(f"✅ HF Pricer cache hit - predicting ${cached:.2f}")
+                return cached
+        
         if self.using_mock:
             self.log("🔧 HF Pricer is using MOCK (not calling Modal)")
         else:
@@ -214,6 +332,8 @@ class HuggingFacePricerAgent(BaseAgent):
         
         try:
             price = self.client.price(description)
+            if self.cache and price > 0:
+                self.cache.put(self.version, description, price)
             source = "MOCK" if self.using_mock else "MODAL"
             self.log(f"✅ HF Pricer completed ({source}) - predicting ${price:.2f}")
             return price
@@ -225,23 +345,81 @@ class HuggingFacePricerAgent(BaseAgent):
 class EnsemblePricerAgent(BaseAgent):
     """
     Ensemble Pricer that combines RAG and HuggingFace models
+    
+    Every sub-pricer runs concurrently for every deal, each with its own
+    timeout. A branch that fails, times out or returns no price is left out
+    and the remaining weights are renormalized.
+    
+    Running threads cannot be cancelled, so each batch gets its own thread
+    pool: a branch that times out keeps running in the background until its
+    client gives up, and its result is discarded without holding up the
+    threads of later batches.
     """
     name = "Ensemble Pricer Agent"
     color = BLUE
+    WEIGHTS = {"rag": 0.8, "hf": 0.2}
+    TIMEOUTS = {"rag": 60.0, "hf": 30.0}  # Seconds, per branch
     
-    def __init__(self, rag_pricer: RAGPricerAgent, hf_pricer: HuggingFacePricerAgent):
+    def __init__(
+        self,
+        rag_pricer: RAGPricerAgent,
+        hf_pricer: HuggingFacePricerAgent,
+        max_workers: int = 8,
+        cache: Optional[PriceCache] = None
+    ):
         """
         Initialize the Ensemble Pricer
         
         Args:
             rag_pricer: RAG pricer agent
             hf_pricer: Hugging Face pricer agent
+            max_workers: Maximum threads running sub-pricers for one batch
+            cache: Optional cache of previous estimates
         """
         self.log("Initializing Ensemble Pricer Agent")
         self.rag_pricer = rag_pricer
         self.hf_pricer = hf_pricer
+        self.cache = cache
+        weights = ",".join(f"{branch}={weight}" for branch, weight in sorted(self.WEIGHTS.items()))
+        self.version = f"ensemble:{weights}|{rag_pricer.version}|{hf_pricer.version}"
+        self.max_workers = max_workers
+        self.last_latencies: Dict[str, Optional[float]] = {}
         self.log("Ensemble Pricer Agent is ready")
     
+    @staticmethod
+    def _timed(fn: Callable, *args) -> Tuple[object, float]:
+        """
+        Run fn and return its result with the elapsed wall time
+        """
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - start
+    
+    def _wait(self, branch: str, future, deadline: float) -> Optional[Tuple[object, float]]:
+        """
+        Wait for a branch until its deadline
+        
+        Returns:
+            Tuple of (result, latency), or None if the branch failed or timed out
+        """
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            self.log(f"{branch.upper()} branch timed out after {self.TIMEOUTS[branch]:.0f}s, ignoring its result")
+        except Exception as e:
+            self.log(f"{branch.upper()} branch failed: {e}")
+        return None
+    
+    def _combine(self, estimates: Dict[str, Optional[float]]) -> float:
+        """
+        Weighted combination of the branches that produced a price
+        """
+        valid = {branch: price for branch, price in estimates.items() if price and price > 0}
+        if not valid:
+            return 0.0
+        total_weight = sum(self.WEIGHTS[branch] for branch in valid)
+        return sum(self.WEIGHTS[branch] * price for branch, price in valid.items()) / total_weight
+    
     def price(self, description: str) -> float:
         """
         Estimate price using ensemble of models
@@ -253,14 +431,87 @@ class EnsemblePricerAgent(BaseAgent):
             Weighted ensemble price estimate
         """
         self.log("Running Ensemble Pricer - getting estimates from both models")
+        return self.price_batch([description])[0]
+    
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Estimate prices for several products using the ensemble
         
-        # Get estimates from both models
-        rag_price = self.rag_pricer.price(description)
-        hf_price = self.hf_pricer.price(description)
+        Descriptions found in the cache are answered from it. For the rest,
+        the RAG pricer prices the whole batch in one branch (one retrieval
+        round trip), while the HF pricer gets one branch per deal; all of them
+        run at the same time.
         
-        # Weighted combination (80% RAG, 20% HF)
-        ensemble_price = rag_price * 0.8 + hf_price * 0.2
+        Args:
+            descriptions: Product descriptions
+            
+        Returns:
+            Weighted ensemble price estimates, in input order
+        """
+        if not descriptions:
+            return []
+        
+        cached = self.cache.get_many(self.version, descriptions) if self.cache else {}
+        if cached:
+            self.log(f"Ensemble cache hit for {len(cached)} of {len(descriptions)} deals")
+        uncached = [description for i, description in enumerate(descriptions) if i not in cached]
+        computed = iter(self._price_uncached(uncached) if uncached else [])
+        return [cached[i] if i in cached else next(computed) for i in range(len(descriptions))]
+    
+    def _price_uncached(self, descriptions: List[str]) -> List[float]:
+        """
+        Run both branches over the descriptions and combine their estimates
+        """
+        self.log(f"Running Ensemble Pricer on a batch of {len(descriptions)} deals")
         
-        self.log(f"Ensemble complete - RAG: ${rag_price:.2f}, HF: ${hf_price:.2f}, Final: ${ensemble_price:.2f}")
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(descriptions) + 1))
+        try:
+            rag_future = executor.submit(self._timed, self.rag_pricer.price_batch, descriptions)
+            hf_futures = [
+                executor.submit(self._timed, self.hf_pricer.price, description)
+                for description in descriptions
+            ]
+            
+            rag_result = self._wait("rag", rag_future, start + self.TIMEOUTS["rag"])
+            hf_results = [self._wait("hf", future, start + self.TIMEOUTS["hf"]) for future in hf_futures]
+        finally:
+            # Don't block on timed-out branches; their threads exit when they return
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        rag_prices = rag_result[0] if rag_result else [None] * len(descriptions)
+        hf_prices = [result[0] if result else None for result in hf_results]
+        hf_latencies = [result[1] for result in hf_results if result]
+        self.last_latencies = {
+            "rag": rag_result[1] if rag_result else None,
+            "hf": max(hf_latencies) if hf_latencies else None,
+            "total": time.monotonic() - start,
+        }
+        
+        ensemble_prices = []
+        complete = []
+        for description, rag_price, hf_price in zip(descriptions, rag_prices, hf_prices):
+            ensemble_price = self._combine({"rag": rag_price, "hf": hf_price})
+            ensemble_prices.append(ensemble_price)
+            # Only cache estimates that every branch contributed to
+            if rag_price and rag_price > 0 and hf_price and hf_price > 0:
+                complete.append((description, ensemble_price))
+            self.log(
+                f"Ensemble complete - RAG: {self._format_price(rag_price)}, "
+                f"HF: {self._format_price(hf_price)}, Final: ${ensemble_price:.2f}"
+            )
         
-        return ensemble_price
+        latencies = ", ".join(
+            f"{branch.upper()}: {latency:.2f}s" if latency is not None else f"{branch.upper()}: n/a"
+            for branch, latency in self.last_latencies.items()
+        )
+        self.log(f"Ensemble batch latencies - {latencies}")
+        
+        if self.cache and complete:
+            self.cache.put_many(self.version, *map(list, zip(*complete)))
+        
+        return ensemble_prices
+    
+    @staticmethod
+    def _format_price(price: Optional[float]) -> str:
+        return f"${price:.2f}" if price is not None else "n/a"
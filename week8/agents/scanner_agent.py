@@ -1,11 +1,13 @@
 """
 Scanner Agent - Identifies promising deals from RSS feeds using LangChain
 """
-from typing import List, Optional
+from typing import Container, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_openai import ChatOpenAI
 from models import ScrapedDeal, DealSelection, Deal
+from http_fetcher import HttpFetcher
+from http_cache import HttpCache
 from utils import BaseAgent, CYAN
 
 
@@ -43,13 +45,20 @@ class ScannerAgent(BaseAgent):
     {format_instructions}
     """
     
-    def __init__(self, api_key: str, base_url: str = "https://openrouter.ai/api/v1"):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://openrouter.ai/api/v1",
+        known_urls: Optional[Container[str]] = None,
+    ):
         """
         Initialize the Scanner Agent with OpenRouter
         
         Args:
             api_key: OpenRouter API key
             base_url: OpenRouter base URL
+            known_urls: Persistent index of deal URLs already processed; when
+                omitted, URLs are tracked from the memory passed to each scan
         """
         self.log("Scanner Agent is initializing")
         
@@ -73,6 +82,13 @@ class ScannerAgent(BaseAgent):
         # Create chain
         self.chain = self.prompt | self.llm | self.parser
         
+        # Pooled HTTP session and on-disk cache reused across scans
+        self.fetcher = HttpFetcher(cache=HttpCache())
+        
+        # URLs of every deal seen in memory; kept after they leave the memory window
+        self.known_urls = known_urls
+        self.seen_urls = set()
+        
         self.log("Scanner Agent is ready")
     
     def fetch_deals(self, memory: List) -> List[ScrapedDeal]:
@@ -87,12 +103,27 @@ class ScannerAgent(BaseAgent):
             List of new ScrapedDeal objects
         """
         self.log("Scanner Agent is fetching deals from RSS feeds")
-        urls = [opp.deal.url for opp in memory]
-        scraped = ScrapedDeal.fetch()
-        result = [scrape for scrape in scraped if scrape.url not in urls]
+        if self.known_urls is not None:
+            skip_urls = self.known_urls
+        else:
+            self._update_seen_urls(memory)
+            skip_urls = self.seen_urls
+        result = ScrapedDeal.fetch(fetcher=self.fetcher, skip_urls=skip_urls)
         self.log(f"Scanner Agent received {len(result)} deals not already processed")
         return result
     
+    def _update_seen_urls(self, memory: List):
+        """
+        Add the URLs of the opportunities in memory to the seen set
+        
+        Tracked by URL rather than by position, since the memory window drops
+        old opportunities as new ones are appended.
+        
+        Args:
+            memory: List of Opportunity objects already processed
+        """
+        self.seen_urls.update(opp.deal.url for opp in memory)
+    
     def scan(self, memory: List = []) -> Optional[DealSelection]:
         """
         Call LLM to provide a high potential list of deals
@@ -0,0 +1,62 @@
+"""
+Benchmark request coalescing for the fine-tuned pricer: throughput and latency
+
+Fires concurrent price() calls through CoalescingPricer at increasing batch
+limits and reports requests per second with p50/p99 latency. Runs locally on
+CPU against MockPricerClient, whose simulated cost (a fixed overhead per call
+plus a small cost per product) stands in for the GPU forward pass.
+
+Usage:
+    python benchmark_pricer_batching.py --requests 256 --concurrency 32
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from modal_pricer_service import CoalescingPricer, MockPricerClient
+
+
+def run(pricer: CoalescingPricer, requests: int, concurrency: int):
+    """
+    Issue `requests` price() calls from `concurrency` threads
+
+    Returns:
+        Tuple of (throughput, per-request latencies in seconds)
+    """
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        pricer.price(f"Benchmark product number {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    return requests / (time.perf_counter() - start), np.array(latencies)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure pricer throughput and latency against batch size.")
+    parser.add_argument("--requests", type=int, default=256, help="Total price() calls per run.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent callers.")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Coalescing window in milliseconds.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated fixed cost per call.")
+    parser.add_argument("--per-item-ms", type=float, default=2.0, help="Simulated cost per product in a batch.")
+    args = parser.parse_args()
+
+    client = MockPricerClient(latency=args.latency_ms / 1000, per_item_latency=args.per_item_ms / 1000)
+
+    print(f"=== {args.requests} requests, {args.concurrency} concurrent, window={args.max_wait_ms}ms ===")
+    for max_batch in (1, 2, 4, 8, 16, 32):
+        pricer = CoalescingPricer(client, max_batch=max_batch, max_wait=args.max_wait_ms / 1000)
+        throughput, latencies = run(pricer, args.requests, args.concurrency)
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        mean_batch = np.mean(pricer.batch_sizes)
+        print(
+            f"max_batch={max_batch:<3} mean_batch={mean_batch:5.1f}  "
+            f"req/s={throughput:7.1f}  p50={p50:7.1f}ms  p99={p99:7.1f}ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
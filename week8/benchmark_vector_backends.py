@@ -0,0 +1,136 @@
+"""
+Benchmark the VectorStore backends: recall@k and queries per second
+
+Exports every vector from an existing Chroma product store, rebuilds it in the
+in-process NumPy backends (exact, IVF, int8 and product-quantized) and compares
+them on a held-out set of perturbed queries. Ground truth is exact float32
+inner-product search, so the recall column is the recall loss of each mode.
+
+Usage:
+    python benchmark_vector_backends.py --db-path products_vectorstore -k 5
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, List
+import numpy as np
+from vector_backends import ChromaBackend, NumpyBackend, QuantizedBackend
+from vector_store import VectorStore
+
+
+def export_backend(backend, page_size: int = 5000):
+    """
+    Read every item from a backend page by page
+
+    Returns:
+        Tuple of (ids, documents, embeddings, metadatas)
+    """
+    ids, documents, metadatas, chunks = [], [], [], []
+    offset = 0
+    while True:
+        page_ids, page_documents, page_embeddings, page_metadatas = backend.get(page_size, offset)
+        if not page_ids:
+            break
+        ids.extend(page_ids)
+        documents.extend(page_documents)
+        metadatas.extend(page_metadatas)
+        chunks.append(page_embeddings)
+        offset += len(page_ids)
+    return ids, documents, np.concatenate(chunks), metadatas
+
+
+def make_queries(embeddings: np.ndarray, n_queries: int, noise: float, seed: int = 0) -> np.ndarray:
+    """
+    Held-out queries: stored vectors with gaussian noise added, re-normalized
+    """
+    rng = np.random.default_rng(seed)
+    picked = embeddings[rng.choice(len(embeddings), size=n_queries, replace=False)]
+    queries = picked + rng.normal(scale=noise, size=picked.shape).astype(np.float32)
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def recall_at_k(results: List[List[str]], truth: List[List[str]]) -> float:
+    """
+    Mean fraction of the true top-k documents that were returned
+    """
+    hits = [len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth)]
+    return float(np.mean(hits))
+
+
+def run(
+    name: str,
+    search: Callable[[np.ndarray], List[List[str]]],
+    queries: np.ndarray,
+    truth,
+    index_bytes: int = 0,
+):
+    """
+    Time one-query-at-a-time search, as the pricer does, and report recall
+    """
+    search(queries[:1])  # Warm up
+    start = time.perf_counter()
+    results = [search(query[None, :])[0] for query in queries]
+    elapsed = time.perf_counter() - start
+    size = f"  index={index_bytes / 2**20:,.1f}MB" if index_bytes else ""
+    print(f"{name:<16} recall@k={recall_at_k(results, truth):.3f}  QPS={len(queries) / elapsed:,.0f}{size}")
+
+
+def build_quantized(path: str, quantizer: str, rerank: int, ids, documents, embeddings, metadatas):
+    """
+    Build a compressed backend whose re-rank vectors are memory-mapped from disk
+    """
+    # Train on the whole set when it is smaller than the default training sample
+    backend = QuantizedBackend(path, quantizer=quantizer, rerank=rerank, train_size=min(len(ids), 100000))
+    for start in range(0, len(ids), 50000):
+        end = start + 50000
+        backend.upsert(ids[start:end], embeddings[start:end], documents[start:end], metadatas[start:end])
+    backend.codes()
+    return backend
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare VectorStore backends on recall@k and QPS.")
+    parser.add_argument("--db-path", default=VectorStore.DB_PATH, help="Existing Chroma vector store.")
+    parser.add_argument("-k", type=int, default=5, help="Number of neighbours per query.")
+    parser.add_argument("--queries", type=int, default=500, help="Number of held-out queries.")
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to queries.")
+    parser.add_argument("--nlist", type=int, default=1024, help="IVF lists.")
+    parser.add_argument("--nprobe", type=int, default=16, help="IVF lists scanned per query.")
+    parser.add_argument("--rerank", type=int, default=4, help="Float re-rank depth multiplier for int8/pq.")
+    args = parser.parse_args()
+
+    chroma = ChromaBackend(args.db_path, VectorStore.COLLECTION_NAME)
+    print(f"Exporting {chroma.count()} vectors from Chroma...")
+    ids, documents, embeddings, metadatas = export_backend(chroma)
+
+    exact = NumpyBackend()
+    exact.upsert(ids, embeddings, documents, metadatas)
+    ivf = NumpyBackend(nlist=args.nlist, nprobe=args.nprobe)
+    ivf.upsert(ids, embeddings, documents, metadatas)
+    start = time.perf_counter()
+    ivf.build_ivf()
+    print(f"IVF trained in {time.perf_counter() - start:.1f}s")
+
+    queries = make_queries(embeddings, args.queries, args.noise)
+    truth = exact.query(queries, args.k)[0]
+
+    print(f"\n=== {len(ids)} vectors, {len(queries)} queries, k={args.k} ===")
+    run("chroma", lambda q: chroma.query(q, args.k)[0], queries, truth)
+    run("numpy exact", lambda q: exact.query(q, args.k)[0], queries, truth, exact.memory_bytes())
+    run(f"numpy ivf/{args.nprobe}", lambda q: ivf.query(q, args.k)[0], queries, truth, ivf.memory_bytes())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for quantizer in ("int8", "pq"):
+            for rerank in (0, args.rerank):
+                backend = build_quantized(
+                    os.path.join(tmp, f"{quantizer}_{rerank}"), quantizer, rerank,
+                    ids, documents, embeddings, metadatas,
+                )
+                label = f"{quantizer}+rerank{rerank}" if rerank else quantizer
+                run(label, lambda q: backend.query(q, args.k)[0], queries, truth, backend.memory_bytes())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""
+Near-duplicate deal detection in embedding space
+"""
+from typing import Dict, List
+import numpy as np
+from models import Deal, Opportunity
+from vector_backends import NumpyBackend
+from utils import BaseAgent, CYAN
+
+
+class DealDeduplicator(BaseAgent):
+    """
+    Drops scanned deals that describe a product already seen, before pricing.
+
+    Deal descriptions are embedded with the vector store's embedding model
+    (through its embedding cache) and compared by cosine similarity:
+
+    - against recent opportunities, held in a small in-memory NumPy index
+      keyed by URL that follows the memory window: a match means the product
+      was already priced, so the deal is dropped unless it is now cheaper
+    - against each other: copies of the same product from several feeds
+      are merged into one, keeping the cheapest
+    """
+    name = "Deduplicator"
+    color = CYAN
+    THRESHOLD = 0.92
+
+    def __init__(self, vector_store, threshold: float = THRESHOLD):
+        """
+        Args:
+            vector_store: VectorStore whose embedding model and cache are reused
+            threshold: Cosine similarity at or above which two deals are the same product
+        """
+        self.vector_store = vector_store
+        self.threshold = threshold
+        self.index = NumpyBackend()
+        self.remembered: Dict[str, Opportunity] = {}
+        self.dropped = 0
+
+    def _index_memory(self, memory: List[Opportunity]):
+        """
+        Make the index hold exactly the opportunities in memory
+
+        Opportunities that left the memory window are evicted by rebuilding
+        the (small) index from the vectors of those still in it; only new
+        opportunities are embedded.
+        """
+        self.remembered = {opp.deal.url: opp for opp in memory}
+        if set(self.remembered) == set(self.index.ids):
+            return
+
+        index = NumpyBackend()
+        kept = [row for row, url in enumerate(self.index.ids) if url in self.remembered]
+        if kept:
+            index.upsert(
+                [self.index.ids[row] for row in kept],
+                self.index.matrix()[kept],
+                [self.index.documents[row] for row in kept],
+                [{"price": float(self.index.prices[row])} for row in kept],
+            )
+        new = [opp for url, opp in self.remembered.items() if url not in index.existing_ids([url])]
+        if new:
+            descriptions = [opp.deal.product_description for opp in new]
+            index.upsert(
+                [opp.deal.url for opp in new],
+                self.vector_store.encode(descriptions),
+                descriptions,
+                [{"price": opp.deal.price} for opp in new],
+            )
+        self.index = index
+
+    def _memory_matches(self, vectors: np.ndarray) -> List[int]:
+        """
+        Row of the most similar remembered opportunity for each vector, or -1
+        """
+        if self.index.count() == 0:
+            return [-1] * len(vectors)
+        matrix = self.index.matrix()
+        matches = []
+        for vector, rows in zip(vectors, self.index.search(vectors, 1)):
+            row = int(rows[0])
+            matches.append(row if float(matrix[row] @ vector) >= self.threshold else -1)
+        return matches
+
+    def deduplicate(self, deals: List[Deal], memory: List[Opportunity]) -> List[Deal]:
+        """
+        Remove near-duplicates from a list of scanned deals
+
+        Args:
+            deals: Deals returned by the scanner
+            memory: Recent opportunities already priced
+
+        Returns:
+            Deals left to price, in their original order
+        """
+        if not deals:
+            return deals
+
+        self._index_memory(memory)
+        vectors = self.vector_store.encode([deal.product_description for deal in deals])
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        kept: List[int] = []
+        for i, match in enumerate(self._memory_matches(vectors)):
+            if match >= 0:
+                # Against the same estimate, a lower price is also a larger discount
+                remembered = self.remembered[self.index.ids[match]].deal
+                if deals[i].price >= remembered.price:
+                    self.log(f"Dropping {deals[i].url}: same product as {remembered.url}")
+                    continue
+                self.log(
+                    f"Keeping {deals[i].url}: same product as {remembered.url} "
+                    f"but cheaper (${deals[i].price:.2f} < ${remembered.price:.2f})"
+                )
+            similar = [j for j in kept if float(vectors[i] @ vectors[j]) >= self.threshold]
+            if not similar:
+                kept.append(i)
+                continue
+            j = similar[0]
+            if deals[i].price < deals[j].price:
+                kept[kept.index(j)] = i
+            self.log(f"Merged duplicate deals {deals[i].url} and {deals[j].url}")
+
+        self.dropped += len(deals) - len(kept)
+        self.log(f"{len(kept)} of {len(deals)} deals left after de-duplication")
+        return [deals[i] for i in sorted(kept)]
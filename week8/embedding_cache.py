@@ -0,0 +1,138 @@
+"""
+Persistent embedding cache shared by indexing and query paths
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Two-level cache of float32 embeddings keyed by a hash of model name and text.
+
+    Vectors live in a SQLite blob table on disk, with an in-memory LRU in front
+    of it. Hit and miss counters cover both levels.
+    """
+    TABLE = "embeddings"
+    LOOKUP_CHUNK = 500  # Stay well below SQLite's bound parameter limit
+
+    def __init__(self, path: str, model_name: str, max_memory_items: int = 50000):
+        """
+        Open (or create) the cache
+
+        Args:
+            path: SQLite file holding the cached vectors
+            model_name: Name of the embedding model, part of every cache key
+            max_memory_items: Size of the in-memory LRU
+        """
+        self.path = path
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        """
+        Cache key for a text under the current model
+        """
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """
+        Insert into the in-memory LRU, evicting the least recently used entries
+        """
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        Look up embeddings for a list of texts
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            Tuple of (cached vectors by position, positions that missed)
+        """
+        keys = [self.key(text) for text in texts]
+        found: Dict[int, np.ndarray] = {}
+
+        with self._lock:
+            pending: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            pending_keys = list(pending)
+            for start in range(0, len(pending_keys), self.LOOKUP_CHUNK):
+                chunk = pending_keys[start:start + self.LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM {self.TABLE} WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    for i in pending.pop(key):
+                        found[i] = vector
+
+            missing = sorted(i for positions in pending.values() for i in positions)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        return found, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """
+        Store embeddings for a list of texts
+
+        Args:
+            texts: Texts that were embedded
+            vectors: Matching embeddings, one row per text
+        """
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.ascontiguousarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes()))
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.TABLE} (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hits, misses, hit rate and in-memory size
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
@@ -1,28 +1,34 @@
 """
 Gradio UI for the Agentic AI Framework
 """
+from startup_profile import mark, phase_report, import_time_report  # First, to start the clock
+import argparse
+import asyncio
 import gradio as gr
 import logging
-import queue
 import threading
-import time
 import plotly.graph_objects as go
-import numpy as np
-from sklearn.manifold import TSNE
 from agent_framework import AgentFramework
+from projection_cache import ProjectionCache
 from utils import reformat_for_html
 
+mark("imports")
+
 
 class QueueHandler(logging.Handler):
     """
-    Custom logging handler that puts log messages in a queue
+    Custom logging handler that puts log messages on an asyncio queue
+    
+    Records may come from worker threads, so they are handed to the event
+    loop with call_soon_threadsafe.
     """
-    def __init__(self, log_queue):
+    def __init__(self, event_queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
         super().__init__()
-        self.log_queue = log_queue
+        self.event_queue = event_queue
+        self.loop = loop
     
     def emit(self, record):
-        self.log_queue.put(self.format(record))
+        self.loop.call_soon_threadsafe(self.event_queue.put_nowait, ("log", self.format(record)))
 
 
 def html_for_logs(log_data: list) -> str:
@@ -44,14 +50,17 @@ def html_for_logs(log_data: list) -> str:
     """
 
 
-def setup_logging(log_queue):
+def setup_logging(event_queue: asyncio.Queue) -> logging.Handler:
     """
     Setup logging to use the queue handler
     
     Args:
-        log_queue: Queue for log messages
+        event_queue: Queue receiving ("log", message) items
+        
+    Returns:
+        The installed handler, to be removed when the run ends
     """
-    handler = QueueHandler(log_queue)
+    handler = QueueHandler(event_queue, asyncio.get_running_loop())
     formatter = logging.Formatter(
         "[%(asctime)s] %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
@@ -60,18 +69,24 @@ def setup_logging(log_queue):
     logger = logging.getLogger()
     logger.addHandler(handler)
     logger.setLevel(logging.INFO)
+    return handler
 
 
 class GradioApp:
     """
     Gradio application for the Agentic AI Framework
     """
+    PROJECTION_FILE = "vector_projection.npz"
     
     def __init__(self):
         """
         Initialize the Gradio app
         """
         self.framework = None
+        self.projection = ProjectionCache(self.PROJECTION_FILE)
+        self._framework_lock = threading.Lock()
+        self._warm = threading.Event()
+        self._warm_thread = None
         self.categories = [
             "Electronics",
             "Computers",
@@ -94,13 +109,60 @@ class GradioApp:
         """
         # Don't cache - create fresh instance based on use_modal setting
         # This ensures the Modal setting is respected
-        if not self.framework or self.framework.use_modal != use_modal:
-            self.framework = AgentFramework(use_modal=use_modal, test_mode=False)
-            
-            # Load full dataset if vector store is empty
-            self.framework.vector_store.ensure_full_dataset_loaded()
+        with self._framework_lock:
+            if not self.framework or self.framework.use_modal != use_modal:
+                # Cheap: models, vector store and agents load on first use or in warm_up
+                self.framework = AgentFramework(use_modal=use_modal, test_mode=False)
+                self._warm.clear()
+            return self.framework
+    
+    def start_warm_up(self, use_modal: bool = True):
+        """
+        Load the vector store, embedding model and agents on a background thread
+        
+        Args:
+            use_modal: Whether to use Modal for HF pricer
+        """
+        if self._warm_thread and self._warm_thread.is_alive():
+            return
+        
+        def warm_up():
+            try:
+                self.get_framework(use_modal=use_modal).warm_up()
+                mark("models warm")
+                logging.info(phase_report())
+            except Exception as e:
+                logging.error(f"Error warming up framework: {e}")
+            finally:
+                self._warm.set()
         
-        return self.framework
+        self._warm_thread = threading.Thread(target=warm_up, daemon=True)
+        self._warm_thread.start()
+    
+    def initial_view(self, use_modal: bool = True):
+        """
+        Render the opportunities table and stats from memory only, and start
+        warming up the models in the background
+        
+        Args:
+            use_modal: Whether to use Modal for HF pricer
+            
+        Returns:
+            Tuple of (table, stats markdown)
+        """
+        framework = self.get_framework(use_modal=use_modal)
+        self.start_warm_up(use_modal)
+        table = self.opportunities_to_table(framework.memory)
+        stats = self.format_stats(framework.get_stats(include_vector_store=False))
+        mark("initial table rendered")
+        return table, stats
+    
+    async def get_vector_plot_when_ready(self, use_modal: bool = True) -> go.Figure:
+        """
+        Wait for the background warm-up, then build the vector plot
+        """
+        await asyncio.to_thread(self._warm.wait)
+        return await asyncio.to_thread(self.get_vector_plot, use_modal)
     
     def opportunities_to_table(self, opportunities: list) -> list:
         """
@@ -123,56 +185,63 @@ class GradioApp:
             for opp in opportunities
         ]
     
-    def run_framework(self, log_data: list, use_modal: bool):
+    async def run_framework(self, log_data: list, use_modal: bool):
         """
-        Run the framework and yield updates
+        Run the framework and yield updates as log lines and planning events arrive
         
         Args:
             log_data: Existing log data
             use_modal: Whether to use Modal
             
         Yields:
-            Tuple of (log_data, html, table)
+            Tuple of (log_data, html, table, spans)
         """
-        log_queue = queue.Queue()
-        result_queue = queue.Queue()
-        setup_logging(log_queue)
+        events: asyncio.Queue = asyncio.Queue()
+        handler = setup_logging(events)
         
-        def worker():
-            """Worker thread that runs the framework"""
+        async def produce():
+            """Run the framework, forwarding its events to the queue"""
             try:
-                framework = self.get_framework(use_modal=use_modal)
-                opportunities = framework.run()
-                result_queue.put(self.opportunities_to_table(opportunities))
+                framework = await asyncio.to_thread(self.get_framework, use_modal)
+                async for event in framework.arun_events():
+                    await events.put(("event", event))
             except Exception as e:
                 logging.error(f"Error in framework: {e}")
-                result_queue.put([])
-        
-        # Start worker thread
-        thread = threading.Thread(target=worker)
-        thread.start()
+            finally:
+                await events.put(("end", None))
         
-        # Initial table
-        framework = self.get_framework(use_modal=use_modal)
-        initial_table = self.opportunities_to_table(framework.memory)
-        final_result = None
+        task = asyncio.create_task(produce())
+        table = self.opportunities_to_table(self.framework.memory) if self.framework else []
+        spans = []
         
-        # Poll for updates
-        while True:
-            try:
-                message = log_queue.get_nowait()
-                log_data.append(reformat_for_html(message))
-                yield log_data, html_for_logs(log_data), final_result or initial_table
-            except queue.Empty:
-                try:
-                    final_result = result_queue.get_nowait()
-                    yield log_data, html_for_logs(log_data), final_result
-                except queue.Empty:
-                    if final_result is not None:
-                        break
-                    time.sleep(0.1)
+        try:
+            while True:
+                kind, payload = await events.get()
+                if kind == "end":
+                    break
+                if kind == "log":
+                    log_data.append(reformat_for_html(payload))
+                elif payload["type"] == "span":
+                    spans.append(payload["span"])
+                elif payload["type"] == "done":
+                    table = self.opportunities_to_table(payload["memory"])
+                yield log_data, html_for_logs(log_data), table, spans
+        finally:
+            logging.getLogger().removeHandler(handler)
+            await task
+    
+    def export_spans(self, use_modal: bool) -> str:
+        """
+        Export the node timings of the last run as a JSON file
         
-        thread.join()
+        Args:
+            use_modal: Whether to use Modal
+            
+        Returns:
+            Path of the JSON file
+        """
+        framework = self.get_framework(use_modal=use_modal)
+        return framework.export_spans()
     
     def get_initial_plot(self) -> go.Figure:
         """
@@ -203,16 +272,13 @@ class GradioApp:
         if framework.vector_store.count() == 0:
             return self.get_initial_plot()
         
-        # Get embeddings
-        documents, embeddings, categories = framework.vector_store.get_all_embeddings(max_items=800)
+        # Project only the products added since the last plot
+        self.projection.update(framework.vector_store)
+        reduced, documents, categories = self.projection.points()
         
-        if len(embeddings) == 0:
+        if len(reduced) == 0:
             return self.get_initial_plot()
         
-        # Reduce to 3D using t-SNE
-        tsne = TSNE(n_components=3, random_state=42, n_jobs=-1)
-        reduced = tsne.fit_transform(embeddings)
-        
         # Map categories to colors
         color_map = {cat: self.colors[i % len(self.colors)] for i, cat in enumerate(self.categories)}
         colors = [color_map.get(cat, "gray") for cat in categories]
@@ -225,7 +291,7 @@ class GradioApp:
                     y=reduced[:, 1],
                     z=reduced[:, 2],
                     mode="markers",
-                    marker=dict(size=3, color=colors, opacity=0.7),
+                    marker=dict(size=2, color=colors, opacity=0.7),
                     text=documents,
                     hovertemplate="<b>%{text}</b><extra></extra>",
                 )
@@ -243,7 +309,7 @@ class GradioApp:
             ),
             height=500,
             margin=dict(r=5, b=5, l=5, t=30),
-            title="Product Embeddings Visualization (t-SNE)",
+            title=f"Product Embeddings Visualization (PCA, {len(reduced):,} of {self.projection.seen:,} products)",
         )
         
         return fig
@@ -288,15 +354,28 @@ class GradioApp:
             Stats as markdown string
         """
         framework = self.get_framework(use_modal=use_modal)
-        stats = framework.get_stats()
+        return self.format_stats(framework.get_stats())
+    
+    def format_stats(self, stats: dict) -> str:
+        """
+        Render framework statistics as markdown
         
+        Args:
+            stats: Output of AgentFramework.get_stats
+            
+        Returns:
+            Stats as markdown string
+        """
+        vector_items = stats["vector_store_items"]
+        price_cache = stats["price_cache"]
         return f"""
 ### Framework Statistics
 
 - **Memory Items:** {stats['memory_items']}
-- **Vector Store Items:** {stats['vector_store_items']}
+- **Vector Store Items:** {vector_items if vector_items is not None else "loading..."}
 - **Best Discount:** ${stats['best_discount']:.2f}
 - **Total Savings:** ${stats['total_savings']:.2f}
+- **Price Cache:** {price_cache['items']} estimates, {price_cache['hit_rate']:.0%} hit rate
 """
     
     def create_app(self):
@@ -359,11 +438,26 @@ class GradioApp:
                     gr.Markdown("## 🎨 Vector Store Visualization")
                     plot = gr.Plot()
             
+            # Planning timings
+            with gr.Row():
+                with gr.Column(scale=2):
+                    gr.Markdown("## ⏱️ Planning Timings")
+                    spans_json = gr.JSON()
+                with gr.Column(scale=1):
+                    export_spans_btn = gr.Button("💾 Export Timings (JSON)", size="sm")
+                    spans_file = gr.File(label="Timings")
+            
             # Event handlers
             run_btn.click(
                 fn=self.run_framework,
                 inputs=[log_data, use_modal_checkbox],
-                outputs=[log_data, logs_html, opportunities_table],
+                outputs=[log_data, logs_html, opportunities_table, spans_json],
+            )
+            
+            export_spans_btn.click(
+                fn=self.export_spans,
+                inputs=[use_modal_checkbox],
+                outputs=[spans_file],
             )
             
             load_data_btn.click(
@@ -383,10 +477,13 @@ class GradioApp:
                 inputs=[use_modal_checkbox],
             )
             
-            # Load initial data (use Modal by default)
+            # Show memory immediately, then the plot once models are warm (use Modal by default)
             ui.load(
-                fn=lambda: (self.get_vector_plot(True), self.get_stats(True)),
-                outputs=[plot, stats_display],
+                fn=lambda: self.initial_view(True),
+                outputs=[opportunities_table, stats_display],
+            ).then(
+                fn=self.get_vector_plot_when_ready,
+                outputs=[plot],
             )
         
         return ui
@@ -399,11 +496,28 @@ class GradioApp:
             share: Whether to create a public link
         """
         ui = self.create_app()
+        mark("ui built")
         ui.launch()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agentic AI Deal Finder UI")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print an import-time breakdown and startup phase timings, then exit.",
+    )
+    args = parser.parse_args()
+    
     app = GradioApp()
-    app.launch()
+    if args.profile_startup:
+        app.create_app()
+        mark("ui built")
+        app.initial_view(True)
+        print(phase_report())
+        print()
+        print(import_time_report("gradio_app"))
+    else:
+        app.launch()
 else:
-    app = GradioApp()
\ No newline at end of file
+    app = GradioApp()
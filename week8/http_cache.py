@@ -0,0 +1,131 @@
+"""
+On-disk HTTP cache for deal feeds and parsed deal pages
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+
+class HttpCache:
+    """
+    SQLite-backed cache with two tables:
+
+    - responses: feed bodies with their ETag / Last-Modified validators, used
+      to issue conditional GETs
+    - extracts: the parsed details and features of deal pages, keyed by URL,
+      so unchanged pages are neither downloaded nor parsed again
+
+    Entries older than the TTL are evicted when the cache is opened and again
+    every `evict_every` writes, so a long-running process doesn't keep them.
+    """
+    DEFAULT_PATH = "http_cache.sqlite"
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = 24 * 3600, evict_every: int = 500):
+        """
+        Args:
+            path: SQLite file holding the cache
+            ttl: Seconds an entry stays valid
+            evict_every: Number of writes between purges of expired entries
+        """
+        self.path = path
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, stored_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracts ("
+            "url TEXT PRIMARY KEY, details TEXT, features TEXT, stored_at REAL)"
+        )
+        self._conn.commit()
+        self.evict_expired()
+
+    def evict_expired(self):
+        """
+        Drop every entry older than the TTL
+        """
+        with self._lock:
+            self._evict_expired()
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl
+        self._conn.execute("DELETE FROM responses WHERE stored_at < ?", (cutoff,))
+        self._conn.execute("DELETE FROM extracts WHERE stored_at < ?", (cutoff,))
+        self._conn.commit()
+        self._writes = 0
+
+    def _written(self):
+        """
+        Count a write and purge expired entries every `evict_every` writes; call with the lock held
+        """
+        self._writes += 1
+        if self._writes >= self.evict_every:
+            self._evict_expired()
+
+    def get_response(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], bytes]]:
+        """
+        Cached response for a URL
+
+        Returns:
+            Tuple of (etag, last_modified, body), or None if missing or expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or row[3] < time.time() - self.ttl:
+            return None
+        return row[0], row[1], row[2]
+
+    def put_response(self, url: str, etag: Optional[str], last_modified: Optional[str], body: bytes):
+        """
+        Store a response and its validators
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body, time.time()),
+            )
+            self._conn.commit()
+            self._written()
+
+    def touch_response(self, url: str):
+        """
+        Mark a cached response as revalidated (after a 304)
+        """
+        with self._lock:
+            self._conn.execute("UPDATE responses SET stored_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def get_extract(self, url: str) -> Optional[Tuple[str, str]]:
+        """
+        Cached (details, features) parsed from a deal page, if still fresh
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT details, features, stored_at FROM extracts WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or row[2] < time.time() - self.ttl:
+            return None
+        return row[0], row[1]
+
+    def put_extract(self, url: str, details: str, features: str):
+        """
+        Store the parsed content of a deal page
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracts VALUES (?, ?, ?, ?)",
+                (url, details, features, time.time()),
+            )
+            self._conn.commit()
+            self._written()
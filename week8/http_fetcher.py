@@ -0,0 +1,130 @@
+"""
+Concurrent HTTP fetching for deal feeds and pages
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from http_cache import HttpCache
+
+
+class HttpFetcher:
+    """
+    Bounded thread pool sharing one pooled requests.Session, with a cap on
+    concurrent requests per host and an optional on-disk HTTP cache
+    """
+    _default: Optional["HttpFetcher"] = None
+
+    def __init__(
+        self,
+        max_workers: int = 16,
+        per_host: int = 4,
+        timeout: float = 10,
+        cache: Optional[HttpCache] = None,
+    ):
+        """
+        Args:
+            max_workers: Threads used to fan out requests
+            per_host: Maximum concurrent requests to any single host
+            timeout: Request timeout in seconds
+            cache: HTTP cache for conditional GETs and parsed page extracts
+        """
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_limits: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def default(cls) -> "HttpFetcher":
+        """
+        Process-wide shared fetcher
+        """
+        if cls._default is None:
+            cls._default = cls(cache=HttpCache())
+        return cls._default
+
+    def _host_limit(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits[host]
+
+    def get(self, url: str) -> bytes:
+        """
+        Download a URL, respecting the per-host limit
+
+        Returns:
+            Response body
+        """
+        with self._host_limit(url):
+            response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def get_cached(self, url: str) -> bytes:
+        """
+        Download a URL with a conditional GET against the cached copy
+        
+        Sends If-None-Match / If-Modified-Since when a cached response exists
+        and returns the cached body on 304 Not Modified.
+
+        Returns:
+            Response body
+        """
+        if self.cache is None:
+            return self.get(url)
+
+        cached = self.cache.get_response(url)
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        with self._host_limit(url):
+            response = self.session.get(url, timeout=self.timeout, headers=headers)
+
+        if response.status_code == 304 and cached:
+            self.cache.touch_response(url)
+            return cached[2]
+
+        response.raise_for_status()
+        self.cache.put_response(
+            url,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            response.content,
+        )
+        return response.content
+
+    def map(self, fn: Callable, items: Iterable) -> List:
+        """
+        Apply fn to every item on the thread pool
+
+        Returns:
+            Results in input order, with None for items that raised
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [self._executor.submit(fn, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception:
+                results.append(None)
+        return results
@@ -0,0 +1,157 @@
+"""
+Append-only opportunity memory backed by SQLite
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import List
+from models import Opportunity
+
+
+class MemoryStore:
+    """
+    Persistent log of opportunities with indexes on URL and discount.
+
+    Aggregates used by the stats panel (count, best discount, total savings)
+    are maintained on every append, so they never require a scan, and only
+    the most recent opportunities are ever loaded into memory.
+    """
+
+    def __init__(self, path: str, legacy_json: str = None):
+        """
+        Open (or create) the store
+
+        Args:
+            path: SQLite file holding the opportunities
+            legacy_json: Previous agent_memory.json, imported once if the store is empty
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS opportunities (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                discount REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_opportunities_url ON opportunities (url);
+            CREATE INDEX IF NOT EXISTS idx_opportunities_discount ON opportunities (discount);
+            CREATE TABLE IF NOT EXISTS aggregates (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                count INTEGER NOT NULL,
+                best_discount REAL,
+                total_savings REAL NOT NULL
+            );
+            INSERT OR IGNORE INTO aggregates VALUES (1, 0, NULL, 0.0);
+            """
+        )
+        self._conn.commit()
+
+        if legacy_json and self.count() == 0 and os.path.exists(legacy_json):
+            self._import_json(legacy_json)
+
+    def _import_json(self, legacy_json: str):
+        """
+        One-off import of the previous JSON memory file
+        
+        An unreadable or invalid file is logged and skipped, leaving the store empty.
+        """
+        try:
+            with open(legacy_json, "r") as f:
+                data = json.load(f)
+            opportunities = [Opportunity(**item) for item in data]
+        except (OSError, ValueError, TypeError) as e:
+            # ValueError covers json.JSONDecodeError and pydantic validation errors
+            logging.error(f"Error importing legacy memory from {legacy_json}: {e}")
+            return
+        for opportunity in opportunities:
+            self.append(opportunity)
+
+    def append(self, opportunity: Opportunity):
+        """
+        Append an opportunity and update the aggregates in the same transaction
+        """
+        discount = opportunity.discount
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO opportunities (url, discount, data) VALUES (?, ?, ?)",
+                (opportunity.deal.url, discount, opportunity.model_dump_json()),
+            )
+            self._conn.execute(
+                """
+                UPDATE aggregates SET
+                    count = count + 1,
+                    best_discount = CASE
+                        WHEN best_discount IS NULL OR ? > best_discount THEN ? ELSE best_discount END,
+                    total_savings = total_savings + ?
+                WHERE id = 1
+                """,
+                (discount, discount, max(discount, 0.0)),
+            )
+
+    def recent(self, limit: int) -> List[Opportunity]:
+        """
+        The most recent opportunities, oldest first
+
+        Args:
+            limit: Maximum number of opportunities to load
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM opportunities ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [Opportunity.model_validate_json(data) for (data,) in reversed(rows)]
+
+    def __contains__(self, url: str) -> bool:
+        """
+        Whether a deal URL has already been recorded (uses the URL index)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM opportunities WHERE url = ? LIMIT 1", (url,)
+            ).fetchone()
+        return row is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count FROM aggregates WHERE id = 1").fetchone()[0]
+
+    def stats(self) -> dict:
+        """
+        Maintained aggregates
+
+        Returns:
+            Dictionary with count, best_discount and total_savings
+        """
+        with self._lock:
+            count, best, total = self._conn.execute(
+                "SELECT count, best_discount, total_savings FROM aggregates WHERE id = 1"
+            ).fetchone()
+        return {"count": count, "best_discount": best or 0.0, "total_savings": total}
+
+    def reset(self, keep: int = 2):
+        """
+        Keep only the first `keep` opportunities and recompute the aggregates
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM opportunities WHERE id NOT IN "
+                "(SELECT id FROM opportunities ORDER BY id LIMIT ?)",
+                (keep,),
+            )
+            self._conn.execute(
+                """
+                UPDATE aggregates SET
+                    count = (SELECT COUNT(*) FROM opportunities),
+                    best_discount = (SELECT MAX(discount) FROM opportunities),
+                    total_savings = (SELECT COALESCE(SUM(MAX(discount, 0)), 0.0) FROM opportunities)
+                WHERE id = 1
+                """
+            )
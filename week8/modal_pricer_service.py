@@ -1,6 +1,13 @@
 """
 Modal service for deploying Hugging Face pricer model (Modal 1.0 compatible)
 """
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List
 import modal
 
 # Setup - define our infrastructure with code!
@@ -30,18 +37,44 @@ REVISION = "b19c8bfea3b6ff62237fbb0a8da9779fc12cefbd"
 FINETUNED_MODEL = f"{HF_USER}/{PROJECT_RUN_NAME}"
 CACHE_DIR = "/cache"
 
+# Prefix cache and numeric decoding are shared with the week 7 evaluation scripts
+INFERENCE_MODULE = Path(__file__).resolve().parent.parent / "week7" / "inference.py"
+
 # Keep 1 container warm for faster responses
 MIN_CONTAINERS = 1
 
 PREFIX = "Price is $"
 QUESTION = "What does this cost to the nearest dollar?"
 
+# "free" generation parsed with a regex, or opt in to "constrained" (numeric
+# tokens only, early stop) or "expected" (probability-weighted price from the
+# next-token distribution, constrained decoding for prices of 1000 and above)
+DECODING = "free"
+
+# Identifies the deployed model and decoding, so cached prices follow redeploys
+MODEL_VERSION = f"{FINETUNED_MODEL}@{REVISION[:12]}:{DECODING}"
+
 # Volume for caching
 hf_cache_volume = modal.Volume.from_name("hf-hub-cache", create_if_missing=True)
 
 
+def parse_price(completion: str) -> float:
+    """
+    Extract the price from the text generated after PREFIX
+    
+    Args:
+        completion: Generated text
+        
+    Returns:
+        Price as a float, 0.0 if no number was generated
+    """
+    contents = completion.replace(",", "")
+    match = re.search(r"[-+]?\d*\.\d+|\d+", contents)
+    return float(match.group()) if match else 0.0
+
+
 @app.cls(
-    image=image.env({"HF_HUB_CACHE": CACHE_DIR}),
+    image=image.env({"HF_HUB_CACHE": CACHE_DIR}).add_local_file(INFERENCE_MODULE, "/root/inference.py"),
     secrets=secrets,
     gpu=GPU,
     timeout=1800,
@@ -61,6 +94,7 @@ class HuggingFacePricer:
         import torch
         from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
         from peft import PeftModel
+        from inference import PromptPrefixCache, NumericVocabulary
         
         print("Loading model and tokenizer...")
         
@@ -75,7 +109,7 @@ class HuggingFacePricer:
         # Load tokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
         self.tokenizer.pad_token = self.tokenizer.eos_token
-        self.tokenizer.padding_side = "right"
+        self.tokenizer.padding_side = "left"  # Left-pad so batched prompts end together
         
         # Load base model
         self.base_model = AutoModelForCausalLM.from_pretrained(
@@ -91,8 +125,52 @@ class HuggingFacePricer:
             revision=REVISION
         )
         
+        # Encode the shared question prefix once
+        self.prefix_cache = PromptPrefixCache(self.fine_tuned_model, self.tokenizer, f"{QUESTION}\n\n", "cuda")
+        self.vocabulary = NumericVocabulary(self.tokenizer)
+        
         print("Model loaded successfully!")
     
+    def _price_constrained(self, prompts: List[str]) -> List[float]:
+        """
+        Generate only well-formed numbers, stopping as soon as each is complete
+        """
+        generated = self.prefix_cache.generate(
+            prompts,
+            max_new_tokens=5,
+            logits_processor=self.vocabulary.processor(),
+            pad_token_id=self.tokenizer.eos_token_id,
+        )
+        return [self.vocabulary.parse(tokens) for tokens in generated]
+    
+    def _price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Price a batch of descriptions with one generate call, reusing the cached question prefix
+        """
+        from transformers import set_seed
+        
+        set_seed(42)
+        prompts = [f"{QUESTION}\n\n{description}\n\n{PREFIX}" for description in descriptions]
+        
+        if DECODING == "expected":
+            prices = self.vocabulary.expected_prices(
+                self.prefix_cache.next_token_logits, self._price_constrained, prompts
+            )
+            return [round(price, 2) for price in prices]
+        
+        if DECODING == "constrained":
+            return self._price_constrained(prompts)
+        
+        generated = self.prefix_cache.generate(
+            prompts,
+            max_new_tokens=5,
+            pad_token_id=self.tokenizer.eos_token_id,
+        )
+        return [
+            parse_price(self.tokenizer.decode(tokens, skip_special_tokens=True))
+            for tokens in generated
+        ]
+    
     @modal.method()
     def price(self, description: str) -> float:
         """
@@ -104,29 +182,20 @@ class HuggingFacePricer:
         Returns:
             Estimated price as a float
         """
-        import re
-        import torch
-        from transformers import set_seed
-        
-        set_seed(42)
-        prompt = f"{QUESTION}\n\n{description}\n\n{PREFIX}"
-        
-        # Tokenize and generate
-        inputs = self.tokenizer.encode(prompt, return_tensors="pt").to("cuda")
-        with torch.no_grad():
-            outputs = self.fine_tuned_model.generate(inputs, max_new_tokens=5)
-        
-        # Decode and extract price
-        result = self.tokenizer.decode(outputs[0])
-        
-        # Extract price from result
-        if "Price is $" in result:
-            contents = result.split("Price is $")[1]
-            contents = contents.replace(",", "")
-            match = re.search(r"[-+]?\d*\.\d+|\d+", contents)
-            return float(match.group()) if match else 0.0
+        return self._price_batch([description])[0]
+    
+    @modal.method()
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Estimate the prices of several products in one forward pass
         
-        return 0.0
+        Args:
+            descriptions: Product descriptions
+            
+        Returns:
+            Estimated prices, in input order
+        """
+        return self._price_batch(descriptions)
 
 
 # Client class for local use (Modal 1.0 compatible)
@@ -175,6 +244,97 @@ class PricerClient:
             print(f"   Error details: {type(e).__name__}: {str(e)}")
             print("   Falling back to 0.0")
             return 0.0
+    
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Get price estimates for several products in one Modal call
+        
+        Args:
+            descriptions: Product descriptions
+            
+        Returns:
+            Estimated prices, in input order
+        """
+        try:
+            print(f"📡 Calling Modal service for pricing {len(descriptions)} products...")
+            result = self.pricer_cls().price_batch.remote(descriptions)
+            print(f"✅ Modal returned {len(result)} prices")
+            return result
+        except Exception as e:
+            print(f"❌ Error calling Modal pricer: {e}")
+            print(f"   Error details: {type(e).__name__}: {str(e)}")
+            print("   Falling back to 0.0")
+            return [0.0] * len(descriptions)
+
+
+class CoalescingPricer:
+    """
+    Gathers concurrent price() calls for a few milliseconds and sends them to
+    the wrapped client as a single price_batch call
+    """
+    
+    def __init__(self, client, max_batch: int = 16, max_wait: float = 0.005, timeout: float = 120.0):
+        """
+        Args:
+            client: Pricer client with a price_batch method
+            max_batch: Largest batch sent in one call
+            max_wait: Seconds to wait for more requests after the first one arrives
+            timeout: Seconds a price() call waits for its batch before raising TimeoutError
+        """
+        self.client = client
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.batch_sizes: List[int] = []
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+    
+    def price(self, description: str) -> float:
+        """
+        Queue a description and wait for its price
+        """
+        future: Future = Future()
+        self._queue.put((description, future))
+        return future.result(timeout=self.timeout)
+    
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Price an explicit batch directly
+        """
+        return self.client.price_batch(descriptions)
+    
+    def _next_batch(self) -> list:
+        """
+        Block for one request, then collect more until the batch is full or max_wait expires
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self.batch_sizes.append(len(batch))
+            try:
+                prices = self.client.price_batch([description for description, _ in batch])
+                if len(prices) != len(batch):
+                    # Can't tell which prices belong to which request, so fail them all
+                    raise ValueError(f"price_batch returned {len(prices)} prices for {len(batch)} descriptions")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), price in zip(batch, prices):
+                future.set_result(price)
 
 
 # For local testing without Modal deployment
@@ -183,14 +343,34 @@ class MockPricerClient:
     Mock pricer for testing without Modal
     """
     
-    def price(self, description: str) -> float:
+    def __init__(self, latency: float = 0.0, per_item_latency: float = 0.0):
         """
-        Return a mock price estimate
+        Args:
+            latency: Simulated fixed cost of one call, in seconds
+            per_item_latency: Simulated extra cost per product in a batch, in seconds
         """
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+    
+    def _estimate(self, description: str) -> float:
         # Simple heuristic based on description length
         import random
         random.seed(hash(description) % 1000)
         return round(random.uniform(50, 800), 2)
+    
+    def price(self, description: str) -> float:
+        """
+        Return a mock price estimate
+        """
+        return self.price_batch([description])[0]
+    
+    def price_batch(self, descriptions: List[str]) -> List[float]:
+        """
+        Return mock price estimates for a batch
+        """
+        if self.latency or self.per_item_latency:
+            time.sleep(self.latency + self.per_item_latency * len(descriptions))
+        return [self._estimate(description) for description in descriptions]
 
 
 if __name__ == "__main__":
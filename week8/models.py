@@ -2,12 +2,9 @@
 Pydantic models for structured data in the Agentic AI Framework
 """
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
+from typing import Container, List, Dict, Optional
 import re
-import feedparser
-import requests
-import time
+from http_fetcher import HttpFetcher
 
 # RSS Feeds for deals
 FEEDS = [
@@ -21,6 +18,8 @@ def extract_text(html_snippet: str) -> str:
     """
     Use Beautiful Soup to clean up HTML snippet and extract useful text
     """
+    from bs4 import BeautifulSoup  # Imported on first use to keep startup light
+    
     soup = BeautifulSoup(html_snippet, "html.parser")
     snippet_div = soup.find("div", class_="snippet summary")
     
@@ -44,32 +43,47 @@ class ScrapedDeal:
     details: str
     features: str
 
-    def __init__(self, entry: Dict[str, str]):
+    def __init__(self, entry: Dict[str, str], fetcher: Optional[HttpFetcher] = None):
         """
         Populate this instance based on the provided dict
+        
+        Args:
+            entry: RSS feed entry
+            fetcher: HTTP fetcher used to download the deal page (shared default if omitted);
+                its cache, if any, supplies previously parsed page content
         """
+        from bs4 import BeautifulSoup
+        
         self.title = entry["title"]
         self.summary = extract_text(entry["summary"])
         self.url = entry["links"][0]["href"]
         
-        try:
-            stuff = requests.get(self.url, timeout=10).content
-            soup = BeautifulSoup(stuff, "html.parser")
-            content_div = soup.find("div", class_="content-section")
-            if content_div:
-                content = content_div.get_text()
-                content = content.replace("\nmore", "").replace("\n", " ")
-                if "Features" in content:
-                    self.details, self.features = content.split("Features", 1)
+        fetcher = fetcher or HttpFetcher.default()
+        cached = fetcher.cache.get_extract(self.url) if fetcher.cache else None
+        
+        if cached:
+            self.details, self.features = cached
+        else:
+            try:
+                stuff = fetcher.get(self.url)
+                soup = BeautifulSoup(stuff, "html.parser")
+                content_div = soup.find("div", class_="content-section")
+                if content_div:
+                    content = content_div.get_text()
+                    content = content.replace("\nmore", "").replace("\n", " ")
+                    if "Features" in content:
+                        self.details, self.features = content.split("Features", 1)
+                    else:
+                        self.details = content
+                        self.features = ""
                 else:
-                    self.details = content
+                    self.details = self.summary
                     self.features = ""
-            else:
+                if fetcher.cache:
+                    fetcher.cache.put_extract(self.url, self.details, self.features)
+            except Exception as e:
                 self.details = self.summary
                 self.features = ""
-        except Exception as e:
-            self.details = self.summary
-            self.features = ""
         
         self.truncate()
 
@@ -90,24 +104,47 @@ class ScrapedDeal:
         """
         return f"Title: {self.title}\nDetails: {self.details.strip()}\nFeatures: {self.features.strip()}\nURL: {self.url}"
 
+    @staticmethod
+    def _entry_url(entry: Dict) -> Optional[str]:
+        """
+        Deal URL of a feed entry, or None if the entry has no links
+        """
+        links = entry.get("links") or []
+        return links[0].get("href") if links else None
+
     @classmethod
-    def fetch(cls, show_progress: bool = False) -> List['ScrapedDeal']:
+    def fetch(
+        cls,
+        show_progress: bool = False,
+        fetcher: Optional[HttpFetcher] = None,
+        feeds: Optional[List[str]] = None,
+        skip_urls: Optional[Container[str]] = None,
+    ) -> List['ScrapedDeal']:
         """
         Retrieve all deals from the selected RSS feeds
+        
+        Feeds are downloaded in parallel with conditional GETs, then every
+        deal page not already in the fetcher's cache is fetched concurrently
+        through the same pooled session.
+        
+        Args:
+            show_progress: Unused, kept for compatibility
+            fetcher: HTTP fetcher to use (shared default if omitted)
+            feeds: Feed URLs to read (defaults to FEEDS)
+            skip_urls: Deal URLs already known; their pages are never fetched
         """
-        deals = []
-        for feed_url in FEEDS:
-            try:
-                feed = feedparser.parse(feed_url)
-                for entry in feed.entries[:10]:
-                    try:
-                        deals.append(cls(entry))
-                        time.sleep(0.05)
-                    except Exception as e:
-                        continue
-            except Exception as e:
+        import feedparser  # Imported on first use to keep startup light
+        
+        fetcher = fetcher or HttpFetcher.default()
+        entries = []
+        for content in fetcher.map(fetcher.get_cached, feeds or FEEDS):
+            if content is None:
                 continue
-        return deals
+            entries.extend(feedparser.parse(content).entries[:10])
+        if skip_urls:
+            entries = [entry for entry in entries if cls._entry_url(entry) not in skip_urls]
+        deals = fetcher.map(lambda entry: cls(entry, fetcher), entries)
+        return [deal for deal in deals if deal is not None]
 
 
 class Deal(BaseModel):
@@ -0,0 +1,165 @@
+"""
+Persistent cache of pricer outputs, so repeated deals cost no LLM or GPU calls
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+def normalize_description(description: str) -> str:
+    """
+    Case- and whitespace-insensitive form of a description used for cache keys
+    """
+    return re.sub(r"\s+", " ", description).strip().lower()
+
+
+class PriceCache:
+    """
+    SQLite cache of price estimates keyed by a hash of pricer version and
+    normalized description.
+
+    Each pricer passes a version string (e.g. its name and model), so changing
+    a model or prompt never serves stale prices. Entries expire after `ttl`
+    seconds, and once the table holds more than `max_items` the least recently
+    used entries are evicted. Hit and miss counters are kept per version.
+    """
+    TABLE = "prices"
+    LOOKUP_CHUNK = 500  # Stay well below SQLite's bound parameter limit
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_items: int = 100000):
+        """
+        Open (or create) the cache
+
+        Args:
+            path: SQLite file holding the cached prices
+            ttl: Seconds an estimate stays valid
+            max_items: Entries kept before least recently used ones are evicted
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_items = max_items
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            "key TEXT PRIMARY KEY, price REAL NOT NULL, created REAL NOT NULL, used REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_used ON {self.TABLE} (used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(version: str, description: str) -> str:
+        """
+        Cache key for a description under a pricer version
+        """
+        text = f"{version}\0{normalize_description(description)}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, version: str, descriptions: List[str]) -> Dict[int, float]:
+        """
+        Look up cached prices
+
+        Args:
+            version: Pricer version string
+            descriptions: Product descriptions
+
+        Returns:
+            Cached prices by position; positions that missed are absent
+        """
+        keys = [self.key(version, description) for description in descriptions]
+        now = time.time()
+        prices: Dict[str, float] = {}
+
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), self.LOOKUP_CHUNK):
+                chunk = unique[start:start + self.LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, price FROM {self.TABLE} WHERE key IN ({placeholders}) AND created > ?",
+                    [*chunk, now - self.ttl],
+                ).fetchall()
+                prices.update(rows)
+            if prices:
+                self._conn.executemany(
+                    f"UPDATE {self.TABLE} SET used = ? WHERE key = ?", [(now, key) for key in prices]
+                )
+                self._conn.commit()
+
+            found = {i: prices[key] for i, key in enumerate(keys) if key in prices}
+            self.hits[version] += len(found)
+            self.misses[version] += len(keys) - len(found)
+        return found
+
+    def get(self, version: str, description: str) -> Optional[float]:
+        return self.get_many(version, [description]).get(0)
+
+    def put_many(self, version: str, descriptions: List[str], prices: List[float]):
+        """
+        Store price estimates, then evict expired and least recently used entries
+
+        Args:
+            version: Pricer version string
+            descriptions: Product descriptions
+            prices: Matching estimates
+        """
+        now = time.time()
+        rows = [
+            (self.key(version, description), float(price), now, now)
+            for description, price in zip(descriptions, prices)
+        ]
+        with self._lock:
+            self._conn.executemany(f"INSERT OR REPLACE INTO {self.TABLE} VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute(f"DELETE FROM {self.TABLE} WHERE created <= ?", (now - self.ttl,))
+            excess = self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0] - self.max_items
+            if excess > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.TABLE} WHERE key IN "
+                    f"(SELECT key FROM {self.TABLE} ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+            self._conn.commit()
+
+    def put(self, version: str, description: str, price: float):
+        self.put_many(version, [description], [price])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with overall hits, misses, hit rate and size, plus the
+            same counters per pricer version
+        """
+        with self._lock:
+            versions = {
+                version: {
+                    "hits": self.hits[version],
+                    "misses": self.misses[version],
+                    "hit_rate": self.hits[version] / max(self.hits[version] + self.misses[version], 1),
+                }
+                for version in sorted(set(self.hits) | set(self.misses))
+            }
+        hits = sum(entry["hits"] for entry in versions.values())
+        misses = sum(entry["misses"] for entry in versions.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "items": self.count(),
+            "versions": versions,
+        }
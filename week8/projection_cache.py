@@ -0,0 +1,152 @@
+"""
+Persistent 3D projection of the product vectors for the Gradio plot
+"""
+import os
+from typing import List, Tuple
+import numpy as np
+from utils import BaseAgent, GREEN
+
+
+class ProjectionCache(BaseAgent):
+    """
+    PCA projection of the vector store, fitted once and kept on disk.
+
+    The reducer is fitted on the first `fit_size` vectors. Every later update
+    only projects the items added since the last one (the backends append in
+    insertion order), and a reservoir sample of at most `max_points` projected
+    items is kept for display, so the plot stays light enough for WebGL no
+    matter how large the store grows. The cache is rebuilt when the store is
+    a different one or has shrunk.
+    """
+    name = "Projection"
+    color = GREEN
+    HOVER_CHARS = 200  # Description length kept for the hover text
+
+    def __init__(
+        self,
+        path: str,
+        dimensions: int = 3,
+        fit_size: int = 20000,
+        max_points: int = 10000,
+        seed: int = 42,
+    ):
+        """
+        Args:
+            path: .npz file holding the fitted reducer and projected sample
+            dimensions: Output dimensions
+            fit_size: Vectors used to fit the PCA
+            max_points: Size of the reservoir sample kept for display
+            seed: Random seed for the reservoir sample
+        """
+        self.path = path
+        self.dimensions = dimensions
+        self.fit_size = fit_size
+        self.max_points = max_points
+        self.seed = seed
+        self._reset()
+        self._load()
+
+    def _reset(self, source: str = ""):
+        self.source = source
+        self.seen = 0
+        self.mean = None
+        self.components = None
+        self.coords = np.empty((0, self.dimensions), dtype=np.float32)
+        self.documents: List[str] = []
+        self.categories: List[str] = []
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            self.source = str(data["source"])
+            self.seen = int(data["seen"])
+            self.mean = data["mean"]
+            self.components = data["components"]
+            self.coords = data["coords"]
+            self.documents = data["documents"].tolist()
+            self.categories = data["categories"].tolist()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            source=np.array(self.source),
+            seen=np.array(self.seen),
+            mean=self.mean,
+            components=self.components,
+            coords=self.coords,
+            documents=np.array(self.documents, dtype=str),
+            categories=np.array(self.categories, dtype=str),
+        )
+        os.replace(tmp_path, self.path)
+
+    def _fit(self, sample: np.ndarray):
+        """
+        Fit PCA on a sample of vectors
+        """
+        self.mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+        self.components = vt[:self.dimensions].astype(np.float32)
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        return ((vectors - self.mean) @ self.components.T).astype(np.float32)
+
+    def _add(self, coords: np.ndarray, documents: List[str], categories: List[str]):
+        """
+        Reservoir-sample newly projected items into the display set
+        """
+        documents = [document[:self.HOVER_CHARS] for document in documents]
+        fill = min(max(self.max_points - len(self.documents), 0), len(coords))
+        if fill:
+            self.coords = np.concatenate([self.coords, coords[:fill]])
+            self.documents.extend(documents[:fill])
+            self.categories.extend(categories[:fill])
+
+        # Item i of the stream replaces a random slot with probability max_points / (i + 1)
+        rng = np.random.default_rng(self.seed + self.seen)
+        rest = np.arange(fill, len(coords))
+        slots = rng.integers(0, self.seen + rest + 1)
+        for i, slot in zip(rest[slots < self.max_points], slots[slots < self.max_points]):
+            self.coords[slot] = coords[i]
+            self.documents[slot] = documents[i]
+            self.categories[slot] = categories[i]
+        self.seen += len(coords)
+
+    def update(self, vector_store) -> int:
+        """
+        Bring the projection up to date with the vector store
+
+        Args:
+            vector_store: VectorStore to project
+
+        Returns:
+            Number of items newly projected
+        """
+        source = f"{vector_store.backend.name}:{os.path.abspath(vector_store.db_path)}"
+        count = vector_store.count()
+        if source != self.source or count < self.seen:
+            self._reset(source)
+        if count == self.seen:
+            return 0
+
+        if self.components is None:
+            _, sample, _ = vector_store.get_all_embeddings(max_items=self.fit_size)
+            self.log(f"Fitting PCA on {len(sample)} vectors")
+            self._fit(sample)
+
+        start = self.seen
+        for documents, embeddings, categories in vector_store.iter_embeddings(offset=self.seen):
+            self._add(self.project(embeddings), documents, categories)
+        self._save()
+        self.log(f"Projected {self.seen - start} new items ({self.seen} total, {len(self.documents)} plotted)")
+        return self.seen - start
+
+    def points(self) -> Tuple[np.ndarray, List[str], List[str]]:
+        """
+        The projected display sample
+
+        Returns:
+            Tuple of (coords, documents, categories)
+        """
+        return self.coords, self.documents, self.categories
@@ -0,0 +1,171 @@
+"""
+Vector quantizers for the compressed NumPy product index
+"""
+from typing import Dict
+import numpy as np
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Plain L2 k-means
+
+    Args:
+        vectors: (n, d) training vectors
+        k: Number of centroids
+        iterations: Lloyd iterations
+        rng: Random generator used for the initial centroids
+
+    Returns:
+        (k, d) centroids
+    """
+    vectors = vectors.astype(np.float32)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=len(vectors) < k)].copy()
+    for _ in range(iterations):
+        assignment = nearest_centroid(vectors, centroids)
+        for c in range(k):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+
+def nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """
+    Index of the closest centroid (L2) for every vector
+    """
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for i in range(0, len(vectors), chunk):
+        block = vectors[i:i + chunk].astype(np.float32)
+        assignment[i:i + chunk] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignment
+
+
+class ScalarQuantizer:
+    """
+    8-bit scalar quantization: each dimension mapped linearly onto 0..255.
+
+    Codes take d bytes per vector, 4x smaller than float32.
+    """
+    name = "int8"
+
+    def __init__(self):
+        self.low = None
+        self.scale = None
+
+    @property
+    def trained(self) -> bool:
+        return self.low is not None
+
+    def train(self, vectors: np.ndarray):
+        """
+        Fit the per-dimension range
+        """
+        self.low = vectors.min(axis=0).astype(np.float32)
+        scale = (vectors.max(axis=0) - self.low).astype(np.float32) / 255.0
+        scale[scale == 0] = 1.0
+        self.scale = scale
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors.astype(np.float32) - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.low
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        """
+        Asymmetric inner products between float queries and coded vectors
+
+        q . (c * scale + low) = (q * scale) . c + q . low, so the codes are
+        never decoded, only widened chunk by chunk.
+
+        Returns:
+            (n_queries, n_codes) approximate scores
+        """
+        scaled = queries * self.scale
+        bias = queries @ self.low
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for i in range(0, len(codes), chunk):
+            scores[:, i:i + chunk] = scaled @ codes[i:i + chunk].T.astype(np.float32)
+        return scores + bias[:, None]
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"low": self.low, "scale": self.scale}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.low = state["low"]
+        self.scale = state["scale"]
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the vector is split into subspaces, each coded by the
+    index of its nearest of 256 sub-centroids.
+
+    Codes take one byte per subspace (e.g. 48 bytes for 384-dim vectors with
+    48 subspaces, 32x smaller than float32).
+    """
+    name = "pq"
+    CENTROIDS = 256
+
+    def __init__(self, subspaces: int = 48, iterations: int = 15, seed: int = 42):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None  # (subspaces, 256, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray):
+        dim = vectors.shape[1]
+        if dim % self.subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible by {self.subspaces} subspaces")
+        return vectors.reshape(len(vectors), self.subspaces, dim // self.subspaces)
+
+    def train(self, vectors: np.ndarray):
+        """
+        Fit one k-means codebook per subspace
+        """
+        rng = np.random.default_rng(self.seed)
+        parts = self._split(vectors.astype(np.float32))
+        self.codebooks = np.stack([
+            kmeans(parts[:, j], self.CENTROIDS, self.iterations, rng)
+            for j in range(self.subspaces)
+        ])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(vectors.astype(np.float32))
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = nearest_centroid(parts[:, j], self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.subspaces)]
+        return np.concatenate(parts, axis=1)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        """
+        Asymmetric distance computation via per-query lookup tables
+
+        Returns:
+            (n_queries, n_codes) approximate inner products
+        """
+        tables = np.einsum("qjd,jcd->qjc", self._split(queries.astype(np.float32)), self.codebooks)
+        subspace = np.arange(self.subspaces)
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for q, table in enumerate(tables):
+            for i in range(0, len(codes), chunk):
+                scores[q, i:i + chunk] = table[subspace, codes[i:i + chunk]].sum(axis=1)
+        return scores
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.codebooks = state["codebooks"]
+        self.subspaces = len(self.codebooks)
+
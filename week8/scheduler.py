@@ -0,0 +1,297 @@
+"""
+Continuous scan scheduler for the Agent Framework
+
+Keeps one AgentFramework (agents, embedding model, vector store) resident and
+runs a planning cycle on an interval with jitter, backing off while the feeds
+return nothing new. Counters and latency histograms are served over HTTP:
+
+    GET /metrics       Prometheus text format
+    GET /metrics.json  The same values as JSON
+
+Usage:
+    python scheduler.py --interval 300 --jitter 0.1 --port 9100
+"""
+import argparse
+import asyncio
+import json
+import random
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from agent_framework import AgentFramework
+from utils import BaseAgent, YELLOW
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed upper bounds, in seconds
+    """
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "buckets": {str(bound): n for bound, n in zip(self.BUCKETS, self.counts)},
+        }
+
+
+class SchedulerMetrics:
+    """
+    Thread-safe counters and histograms for the scheduler
+    """
+
+    COUNTERS = ("cycles", "cycle_errors", "deals_seen", "deals_priced", "opportunities")
+
+    def __init__(self, price_cache=None):
+        """
+        Args:
+            price_cache: Optional PriceCache whose hit rates are reported too
+        """
+        self._lock = threading.Lock()
+        self.price_cache = price_cache
+        self.counters: Dict[str, int] = {name: 0 for name in self.COUNTERS}
+        self.cycle_latency = Histogram()
+        self.node_latency: Dict[str, Histogram] = {}
+        self.next_delay = 0.0
+        self.started = time.time()
+
+    def record_cycle(self, seconds: float, result: Optional[dict], spans: List[dict]):
+        """
+        Record one finished cycle
+
+        Args:
+            seconds: Wall time of the whole cycle
+            result: The planner's result event, or None if the cycle failed
+            spans: Per-node spans of the cycle
+        """
+        with self._lock:
+            self.counters["cycles"] += 1
+            self.cycle_latency.observe(seconds)
+            if result is None:
+                self.counters["cycle_errors"] += 1
+            else:
+                self.counters["deals_seen"] += result["deals_scanned"]
+                self.counters["deals_priced"] += result["deals_priced"]
+                self.counters["opportunities"] += result["opportunity"] is not None
+            for span in spans:
+                histogram = self.node_latency.setdefault(span["node"], Histogram())
+                histogram.observe(span["duration_ms"] / 1000)
+
+    def to_dict(self) -> dict:
+        price_cache = self.price_cache.stats() if self.price_cache else None
+        with self._lock:
+            return {
+                **self.counters,
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "next_delay_seconds": round(self.next_delay, 1),
+                "cycle_latency_seconds": self.cycle_latency.to_dict(),
+                "node_latency_seconds": {
+                    node: histogram.to_dict() for node, histogram in self.node_latency.items()
+                },
+                "price_cache": price_cache,
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format
+        """
+        data = self.to_dict()
+        lines = []
+        for name in self.COUNTERS:
+            lines.append(f"# TYPE deal_scheduler_{name}_total counter")
+            lines.append(f"deal_scheduler_{name}_total {data[name]}")
+        lines.append("# TYPE deal_scheduler_next_delay_seconds gauge")
+        lines.append(f"deal_scheduler_next_delay_seconds {data['next_delay_seconds']}")
+
+        if data["price_cache"]:
+            lines.append("# TYPE deal_price_cache_items gauge")
+            lines.append(f"deal_price_cache_items {data['price_cache']['items']}")
+            for outcome in ("hits", "misses"):
+                lines.append(f"# TYPE deal_price_cache_{outcome}_total counter")
+                for version, entry in data["price_cache"]["versions"].items():
+                    lines.append(f'deal_price_cache_{outcome}_total{{pricer="{version}"}} {entry[outcome]}')
+
+        histograms = [("deal_scheduler_cycle_seconds", "", data["cycle_latency_seconds"])]
+        histograms += [
+            ("deal_scheduler_node_seconds", f'node="{node}",', histogram)
+            for node, histogram in data["node_latency_seconds"].items()
+        ]
+        declared = set()
+        for metric, labels, histogram in histograms:
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} histogram")
+                declared.add(metric)
+            for bound, n in histogram["buckets"].items():
+                lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {n}')
+            lines.append(f'{metric}_bucket{{{labels}le="+Inf"}} {histogram["count"]}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{metric}_sum{suffix} {histogram['sum']}")
+            lines.append(f"{metric}_count{suffix} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(metrics: SchedulerMetrics, port: int) -> ThreadingHTTPServer:
+    """
+    Serve the metrics on a background thread
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.to_dict(), indent=2), "application/json"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the agent logs
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ScanScheduler(BaseAgent):
+    """
+    Runs planning cycles forever against a warm AgentFramework
+    """
+    name = "Scheduler"
+    color = YELLOW
+
+    def __init__(
+        self,
+        framework: AgentFramework,
+        interval: float = 300,
+        jitter: float = 0.1,
+        max_interval: float = 3600,
+    ):
+        """
+        Args:
+            framework: Framework kept resident between cycles
+            interval: Seconds between cycles while deals keep arriving
+            jitter: Random +/- fraction applied to every delay
+            max_interval: Ceiling for the backoff when feeds return nothing new
+        """
+        self.framework = framework
+        self.interval = interval
+        self.jitter = jitter
+        self.max_interval = max_interval
+        self.metrics = SchedulerMetrics(price_cache=framework.price_cache)
+        self._delay = interval
+        self._stop = asyncio.Event()
+
+    def warm_up(self):
+        """
+        Load the vector store, embedding model and agents once, up front
+        """
+        self.log("Warming up agents and vector store")
+        self.framework.warm_up()
+
+    def stop(self):
+        self._stop.set()
+
+    def _next_delay(self, result: Optional[dict]) -> float:
+        """
+        Reset to the base interval after new deals, double (up to max_interval) otherwise
+        """
+        if result and result["deals_scanned"] > 0:
+            self._delay = self.interval
+        else:
+            self._delay = min(self._delay * 2, self.max_interval)
+        return self._delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def run_cycle(self) -> Optional[dict]:
+        """
+        Run one planning cycle and record it in the metrics
+
+        Returns:
+            The planner's result event, or None if the cycle failed
+        """
+        start = time.perf_counter()
+        result = None
+        try:
+            async for event in self.framework.arun_events():
+                if event["type"] == "result":
+                    result = event
+        except Exception as e:
+            self.log(f"Cycle failed: {e}")
+        seconds = time.perf_counter() - start
+        self.metrics.record_cycle(seconds, result, result["spans"] if result else [])
+        self.log(f"Cycle finished in {seconds:.1f}s")
+        return result
+
+    async def run_forever(self):
+        """
+        Run cycles until stop() is called
+        """
+        while not self._stop.is_set():
+            result = await self.run_cycle()
+            delay = self._next_delay(result)
+            self.metrics.next_delay = delay
+            self.log(f"Next scan in {delay:.0f}s")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        self.log("Scheduler stopped")
+
+
+async def main_async(args) -> int:
+    framework = AgentFramework(use_modal=not args.mock, test_mode=False)
+    scheduler = ScanScheduler(
+        framework,
+        interval=args.interval,
+        jitter=args.jitter,
+        max_interval=args.max_interval,
+    )
+    await asyncio.to_thread(scheduler.warm_up)
+
+    server = serve_metrics(scheduler.metrics, args.port)
+    scheduler.log(f"Metrics on http://localhost:{args.port}/metrics")
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, scheduler.stop)
+
+    try:
+        await scheduler.run_forever()
+    finally:
+        server.shutdown()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the deal finder continuously.")
+    parser.add_argument("--interval", type=float, default=300, help="Seconds between scans.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- fraction applied to the interval.")
+    parser.add_argument("--max-interval", type=float, default=3600, help="Backoff ceiling when nothing is new.")
+    parser.add_argument("--port", type=int, default=9100, help="Port for the metrics endpoint.")
+    parser.add_argument("--mock", action="store_true", help="Use the mock HF pricer instead of Modal.")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+"""
+Startup profiling: phase timings and a `-X importtime` breakdown
+
+Import this module first so its clock starts as close to process start as
+possible, then call mark() at each startup phase.
+"""
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import List, Tuple
+
+STARTED = time.perf_counter()
+_phases: List[Tuple[str, float]] = []
+
+
+def mark(phase: str):
+    """
+    Record the time elapsed since startup at the end of a phase
+    """
+    _phases.append((phase, time.perf_counter() - STARTED))
+
+
+def phase_report() -> str:
+    """
+    Phase timings recorded with mark()
+    """
+    lines = ["Startup phases (seconds since start):"]
+    previous = 0.0
+    for phase, elapsed in _phases:
+        lines.append(f"  {phase:<32} {elapsed:7.3f}  (+{elapsed - previous:.3f})")
+        previous = elapsed
+    return "\n".join(lines)
+
+
+def import_time_report(module: str, top: int = 15) -> str:
+    """
+    Import a module in a fresh interpreter with `-X importtime` and summarize
+    the time spent per top-level package
+
+    Args:
+        module: Module to import, e.g. "gradio_app"
+        top: Number of packages to list
+
+    Returns:
+        Table of the slowest top-level packages by self time
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    self_time = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        microseconds = int(fields[0])
+        package = fields[2].strip().split(".")[0]
+        self_time[package] += microseconds
+        total += microseconds
+
+    lines = [f"Import time for '{module}': {total / 1e6:.3f}s total"]
+    for package, microseconds in sorted(self_time.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {package:<32} {microseconds / 1e6:7.3f}s  {100 * microseconds / max(total, 1):5.1f}%")
+    return "\n".join(lines)
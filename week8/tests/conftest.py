@@ -0,0 +1,7 @@
+"""
+Shared fixtures; the week8 modules use flat imports, so put week8 on the path
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
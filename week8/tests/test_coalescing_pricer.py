@@ -0,0 +1,59 @@
+"""
+Tests for the request-coalescing wrapper around the pricer client
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modal_pricer_service import CoalescingPricer, MockPricerClient
+
+
+class ShortBatchClient(MockPricerClient):
+    """
+    Drops the last price of every batch
+    """
+
+    def price_batch(self, descriptions):
+        return super().price_batch(descriptions)[:-1]
+
+
+class BlockingClient(MockPricerClient):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def price_batch(self, descriptions):
+        self.release.wait()
+        return super().price_batch(descriptions)
+
+
+def test_concurrent_calls_are_batched():
+    pricer = CoalescingPricer(MockPricerClient(latency=0.05), max_batch=8, max_wait=0.05)
+    descriptions = [f"Product {i}" for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        prices = list(executor.map(pricer.price, descriptions))
+
+    assert prices == [MockPricerClient().price(description) for description in descriptions]
+    assert max(pricer.batch_sizes) > 1
+
+
+def test_short_batch_fails_every_request():
+    pricer = CoalescingPricer(ShortBatchClient(), max_batch=4, max_wait=0.05)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(pricer.price, f"Product {i}") for i in range(4)]
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(timeout=5)
+
+
+def test_price_times_out():
+    client = BlockingClient()
+    pricer = CoalescingPricer(client, timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            pricer.price("Slow product")
+    finally:
+        client.release.set()
@@ -0,0 +1,67 @@
+"""
+Tests for near-duplicate deal detection
+"""
+import numpy as np
+
+from deal_deduplicator import DealDeduplicator
+from models import Deal, Opportunity
+
+PRODUCTS = ["laptop", "headphones", "television", "camera"]
+
+
+class FakeVectorStore:
+    """
+    Embeds a description as the one-hot vector of the product it mentions
+    """
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, descriptions):
+        self.encoded += len(descriptions)
+        vectors = np.zeros((len(descriptions), len(PRODUCTS)), dtype=np.float32)
+        for row, description in enumerate(descriptions):
+            vectors[row, next(i for i, product in enumerate(PRODUCTS) if product in description)] = 1.0
+        return vectors
+
+
+def deal(product, price, url=None):
+    return Deal(product_description=f"A {product}", price=price, url=url or f"https://deals/{product}/{price}")
+
+
+def opportunity(product, price):
+    return Opportunity(deal=deal(product, price), estimate=price * 1.5, discount=price * 0.5)
+
+
+def test_drops_remembered_products_unless_cheaper():
+    deduplicator = DealDeduplicator(FakeVectorStore())
+    memory = [opportunity("laptop", 500), opportunity("headphones", 100)]
+
+    kept = deduplicator.deduplicate([deal("laptop", 500), deal("headphones", 80), deal("camera", 300)], memory)
+
+    assert [d.url for d in kept] == ["https://deals/headphones/80", "https://deals/camera/300"]
+
+
+def test_merges_batch_duplicates_keeping_the_cheapest():
+    deduplicator = DealDeduplicator(FakeVectorStore())
+
+    kept = deduplicator.deduplicate([deal("camera", 300), deal("camera", 250), deal("laptop", 900)], [])
+
+    assert [d.url for d in kept] == ["https://deals/camera/250", "https://deals/laptop/900"]
+
+
+def test_index_follows_the_memory_window():
+    store = FakeVectorStore()
+    deduplicator = DealDeduplicator(store)
+    memory = [opportunity("laptop", 500), opportunity("headphones", 100)]
+    deduplicator.deduplicate([deal("camera", 300)], memory)
+
+    # The laptop leaves the window and a television enters it
+    memory = memory[1:] + [opportunity("television", 400)]
+    encoded = store.encoded
+    kept = deduplicator.deduplicate([deal("laptop", 500), deal("television", 400)], memory)
+
+    assert sorted(deduplicator.index.ids) == sorted(opp.deal.url for opp in memory)
+    assert [d.url for d in kept] == ["https://deals/laptop/500"]
+    # Only the new opportunity and the two deals were embedded
+    assert store.encoded - encoded == 3
@@ -0,0 +1,142 @@
+"""
+Tests for the concurrent ensemble pricer with a fake LLM and MockPricerClient
+"""
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from agents.rag_pricer_agent import EnsemblePricerAgent, HuggingFacePricerAgent, RAGPricerAgent
+from modal_pricer_service import MockPricerClient
+
+RAG_PRICE = 100.0
+SIMILAR_PRICES = [90.0, 110.0]
+
+
+class FakeVectorStore:
+    """
+    Returns the same two similar products for every description
+    """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+
+    def search_similar(self, description, n_results=5):
+        return self.search_similar_batch([description], n_results)[0]
+
+    def search_similar_batch(self, descriptions, n_results=5):
+        if self.fail:
+            raise RuntimeError("vector store unavailable")
+        return [(["similar one", "similar two"], list(SIMILAR_PRICES)) for _ in descriptions]
+
+
+class FakeLLM:
+    """
+    Stands in for the chat model: answers RAG_PRICE after `delay` seconds, and
+    blocks on descriptions containing "stuck" until released
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.release = threading.Event()
+
+    def __call__(self, prompt):
+        if "stuck" in prompt.to_string():
+            self.release.wait()
+        time.sleep(self.delay)
+        return AIMessage(content=f"{RAG_PRICE:.2f}")
+
+
+class BlockingPricerClient(MockPricerClient):
+    """
+    MockPricerClient that blocks on descriptions containing "stuck" until released
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency=latency)
+        self.release = threading.Event()
+
+    def price_batch(self, descriptions):
+        if any("stuck" in description for description in descriptions):
+            self.release.wait()
+        return super().price_batch(descriptions)
+
+
+def make_ensemble(llm=None, client=None, vector_store=None, timeouts=None, max_workers=8):
+    rag = RAGPricerAgent(vector_store or FakeVectorStore(), api_key="test-key")
+    rag.chain = rag.prompt | RunnableLambda(llm or FakeLLM())
+    hf = HuggingFacePricerAgent(use_modal=False)
+    hf.client = client or MockPricerClient()
+    ensemble = EnsemblePricerAgent(rag, hf, max_workers=max_workers)
+    if timeouts:
+        ensemble.TIMEOUTS = timeouts
+    return ensemble
+
+
+def test_combines_both_branches():
+    ensemble = make_ensemble()
+    descriptions = ["Laptop with 16GB RAM", "Noise cancelling headphones"]
+
+    prices = ensemble.price_batch(descriptions)
+
+    mock = MockPricerClient()
+    expected = [0.8 * RAG_PRICE + 0.2 * mock.price(description) for description in descriptions]
+    assert prices == pytest.approx(expected)
+    assert ensemble.last_latencies["rag"] is not None
+    assert ensemble.last_latencies["hf"] is not None
+    assert ensemble.last_latencies["total"] >= max(ensemble.last_latencies["rag"], ensemble.last_latencies["hf"])
+
+
+def test_branches_run_concurrently():
+    ensemble = make_ensemble(llm=FakeLLM(delay=0.3), client=MockPricerClient(latency=0.3))
+
+    start = time.perf_counter()
+    prices = ensemble.price_batch([f"Product {i}" for i in range(5)])
+    elapsed = time.perf_counter() - start
+
+    assert all(price > 0 for price in prices)
+    # Serially this would take 5 LLM calls plus 5 HF calls, 3 seconds
+    assert elapsed < 1.0
+
+
+def test_slow_branch_falls_back_to_partial_ensemble():
+    client = MockPricerClient(latency=2.0)
+    ensemble = make_ensemble(client=client, timeouts={"rag": 5.0, "hf": 0.2})
+
+    start = time.perf_counter()
+    prices = ensemble.price_batch(["Smart speaker"])
+    elapsed = time.perf_counter() - start
+
+    assert prices == [pytest.approx(RAG_PRICE)]
+    assert ensemble.last_latencies["hf"] is None
+    assert elapsed < 1.0
+
+
+def test_failed_branch_falls_back_to_partial_ensemble():
+    ensemble = make_ensemble(vector_store=FakeVectorStore(fail=True))
+
+    prices = ensemble.price_batch(["Robot vacuum"])
+
+    assert prices == [pytest.approx(MockPricerClient().price("Robot vacuum"))]
+    assert ensemble.last_latencies["rag"] is None
+
+
+def test_timed_out_branches_do_not_starve_later_batches():
+    llm = FakeLLM()
+    client = BlockingPricerClient()
+    ensemble = make_ensemble(llm=llm, client=client, timeouts={"rag": 0.2, "hf": 0.2}, max_workers=2)
+    try:
+        assert ensemble.price_batch(["stuck product"]) == [0.0]
+
+        # Both branches of the first batch are still blocked in their threads
+        start = time.perf_counter()
+        prices = ensemble.price_batch(["Tablet"])
+        elapsed = time.perf_counter() - start
+
+        assert prices == [pytest.approx(0.8 * RAG_PRICE + 0.2 * MockPricerClient().price("Tablet"))]
+        assert elapsed < 0.2
+    finally:
+        llm.release.set()
+        client.release.set()
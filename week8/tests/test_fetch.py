@@ -0,0 +1,172 @@
+"""
+Tests for the concurrent deal fetcher against a local HTTP stand-in
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_cache import HttpCache
+from http_fetcher import HttpFetcher
+from models import ScrapedDeal
+
+PAGE_DELAY = 0.2
+
+
+def feed_xml(base: str, name: str, count: int, without_link: bool = False) -> str:
+    items = "".join(
+        f"<item><title>{name} deal {i}</title>"
+        f"<link>{base}/deal/{name}-{i}</link>"
+        f"<description>Summary of {name} deal {i}</description></item>"
+        for i in range(count)
+    )
+    if without_link:
+        items += f"<item><title>{name} deal without link</title><description>No link</description></item>"
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>{name}</title>{items}</channel></rss>'
+
+
+def deal_page(path: str) -> str:
+    return (
+        f'<html><body><div class="content-section">Details of {path}'
+        f"\nmore Features Feature list of {path}</div></body></html>"
+    )
+
+
+class StandIn:
+    """
+    Local server serving canned feeds and deal pages; records every request path
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.not_modified = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stand_in.requests.append(self.path)
+                if self.path.startswith("/feed/"):
+                    name = self.path.rsplit("/", 1)[-1]
+                    etag = f'"{name}-v1"'
+                    if self.headers.get("If-None-Match") == etag:
+                        stand_in.not_modified += 1
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    body = feed_xml(stand_in.base, name, 3, without_link=name == "broken").encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/rss+xml")
+                    self.send_header("ETag", etag)
+                elif self.path.startswith("/deal/"):
+                    time.sleep(PAGE_DELAY)
+                    body = deal_page(self.path).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                else:
+                    body = b"not found"
+                    self.send_response(404)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def feeds(self, *names):
+        return [f"{self.base}/feed/{name}" for name in names]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in():
+    server = StandIn()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    return HttpFetcher(max_workers=8, per_host=8, timeout=5, cache=HttpCache(str(tmp_path / "http_cache.sqlite")))
+
+
+def test_fetch_parses_feeds_and_pages(stand_in, fetcher):
+    deals = ScrapedDeal.fetch(fetcher=fetcher, feeds=stand_in.feeds("a", "b"))
+
+    assert sorted(deal.title for deal in deals) == [f"{name} deal {i}" for name in "ab" for i in range(3)]
+    deal = next(deal for deal in deals if deal.title == "a deal 0")
+    assert deal.url == f"{stand_in.base}/deal/a-0"
+    assert "Details of /deal/a-0" in deal.details
+    assert "Feature list of /deal/a-0" in deal.features
+
+
+def test_pages_are_fetched_concurrently(stand_in, fetcher):
+    start = time.perf_counter()
+    deals = ScrapedDeal.fetch(fetcher=fetcher, feeds=stand_in.feeds("a", "b"))
+    elapsed = time.perf_counter() - start
+
+    assert len(deals) == 6
+    assert elapsed < 6 * PAGE_DELAY / 2
+
+
+def test_per_host_limit_bounds_concurrency(stand_in, tmp_path):
+    fetcher = HttpFetcher(max_workers=8, per_host=1, timeout=5)
+    start = time.perf_counter()
+    deals = ScrapedDeal.fetch(fetcher=fetcher, feeds=stand_in.feeds("a", "b"))
+    elapsed = time.perf_counter() - start
+
+    assert len(deals) == 6
+    assert elapsed >= 6 * PAGE_DELAY
+
+
+def test_skip_urls_are_not_downloaded(stand_in, fetcher):
+    skip = {f"{stand_in.base}/deal/a-{i}" for i in range(3)}
+    deals = ScrapedDeal.fetch(fetcher=fetcher, feeds=stand_in.feeds("a", "b"), skip_urls=skip)
+
+    assert sorted(deal.title for deal in deals) == [f"b deal {i}" for i in range(3)]
+    assert not any(path.startswith("/deal/a-") for path in stand_in.requests)
+
+
+def test_entries_without_links_are_dropped(stand_in, fetcher):
+    skip = {f"{stand_in.base}/deal/broken-0"}
+    deals = ScrapedDeal.fetch(fetcher=fetcher, feeds=stand_in.feeds("broken"), skip_urls=skip)
+
+    assert sorted(deal.title for deal in deals) == ["broken deal 1", "broken deal 2"]
+
+
+def test_failed_feed_does_not_abort_fetch(stand_in, fetcher):
+    deals = ScrapedDeal.fetch(fetcher=fetcher, feeds=[f"{stand_in.base}/missing"] + stand_in.feeds("a"))
+
+    assert len(deals) == 3
+
+
+def test_second_fetch_uses_conditional_gets_and_cached_pages(stand_in, fetcher):
+    feeds = stand_in.feeds("a", "b")
+    first = ScrapedDeal.fetch(fetcher=fetcher, feeds=feeds)
+    stand_in.requests.clear()
+    second = ScrapedDeal.fetch(fetcher=fetcher, feeds=feeds)
+
+    assert stand_in.not_modified == 2
+    assert not any(path.startswith("/deal/") for path in stand_in.requests)
+    assert sorted((d.title, d.details, d.features) for d in first) == sorted(
+        (d.title, d.details, d.features) for d in second
+    )
+
+
+def test_expired_entries_are_purged_while_writing(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite"), ttl=0.05, evict_every=2)
+    cache.put_response("http://a/feed", None, None, b"old")
+    time.sleep(0.1)
+    cache.put_extract("http://a/deal/1", "details", "features")
+
+    count = cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    assert count == 0
+    assert cache.get_extract("http://a/deal/1") == ("details", "features")
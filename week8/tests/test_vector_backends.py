@@ -0,0 +1,64 @@
+"""
+Tests for the in-process vector backends
+"""
+import numpy as np
+import pytest
+
+from vector_backends import NumpyBackend, QuantizedBackend
+
+
+def random_vectors(n, d=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, d)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def fill(backend, vectors):
+    ids = [f"i{i}" for i in range(len(vectors))]
+    backend.upsert(ids, vectors, ids, [{"price": float(i)} for i in range(len(vectors))])
+    return ids
+
+
+def nearest_ids(backend, query, k):
+    return [backend.ids[row] for row in backend.search(query, k)[0]]
+
+
+@pytest.mark.parametrize("make_backend", [
+    lambda: NumpyBackend(nlist=8, nprobe=1),
+    lambda: QuantizedBackend(quantizer="int8", train_size=100, nlist=8, nprobe=1),
+])
+def test_replaced_vector_moves_to_its_new_ivf_list(make_backend):
+    vectors = random_vectors(400)
+    backend = make_backend()
+    fill(backend, vectors)
+    nearest_ids(backend, vectors[:1], 1)  # Trains the IVF quantizer
+    assert backend.ivf.centroids is not None
+
+    # Replace i0 with a copy of a vector that lives in another posting list
+    lists = backend.ivf._assign(vectors)
+    j = int(np.flatnonzero(lists != lists[0])[0])
+    backend.upsert(["i0"], vectors[j:j + 1], ["i0"], [{"price": 0.0}])
+
+    assert sorted(nearest_ids(backend, vectors[j:j + 1], 2)) == sorted(["i0", f"i{j}"])
+    assert [int(np.sum(posting == 0)) for posting in backend.ivf.lists][lists[j]] == 1
+    assert sum(int(np.sum(posting == 0)) for posting in backend.ivf.lists) == 1
+
+
+@pytest.mark.parametrize("quantizer", ["int8", "pq"])
+def test_quantizer_is_not_trained_before_train_size(quantizer):
+    vectors = random_vectors(300)
+    backend = QuantizedBackend(quantizer=quantizer, rerank=0, train_size=200, pq_subspaces=8)
+    fill(backend, vectors[:50])
+
+    # Queries and replacements below train_size use the exact float vectors
+    assert nearest_ids(backend, vectors[3:4], 1) == ["i3"]
+    backend.upsert(["i0"], vectors[7:8], ["i0"], [{"price": 0.0}])
+    assert sorted(nearest_ids(backend, vectors[7:8], 2)) == ["i0", "i7"]
+    assert not backend.quantizer.trained
+    assert backend.memory_bytes() == vectors[:50].nbytes
+
+    backend.upsert(
+        [f"i{i}" for i in range(50, 300)], vectors[50:], [""] * 250, [{"price": 0.0}] * 250
+    )
+    assert backend.quantizer.trained
+    assert backend.codes().shape[0] == 300
+    assert nearest_ids(backend, vectors[123:124], 1) == ["i123"]
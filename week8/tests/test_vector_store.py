@@ -0,0 +1,28 @@
+"""
+Tests for VectorStore's full-dataset load guard
+"""
+import threading
+import time
+
+from vector_store import VectorStore
+
+
+def test_concurrent_callers_load_the_dataset_once(tmp_path, monkeypatch):
+    store = VectorStore(db_path=str(tmp_path), backend="numpy")
+    loads = []
+
+    def load_full_dataset():
+        loads.append(threading.get_ident())
+        time.sleep(0.1)
+        store._loaded = True
+
+    monkeypatch.setattr(store, "count", lambda: 1 if getattr(store, "_loaded", False) else 0)
+    monkeypatch.setattr(store, "load_full_dataset", load_full_dataset)
+
+    threads = [threading.Thread(target=store.ensure_full_dataset_loaded) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
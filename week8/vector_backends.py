@@ -0,0 +1,648 @@
+"""
+Storage backends for the product VectorStore: ChromaDB or an in-process NumPy index
+(float, or compressed to int8 / product-quantized codes)
+"""
+import glob
+import json
+import os
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+
+class VectorBackend:
+    """
+    Interface every VectorStore backend implements
+    """
+    name = "base"
+
+    def count(self) -> int:
+        """
+        Number of stored vectors
+        """
+        raise NotImplementedError
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        """
+        Subset of the given IDs that are already stored
+        """
+        raise NotImplementedError
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        documents: List[str],
+        metadatas: List[dict],
+    ):
+        """
+        Insert or replace vectors with their documents and metadata
+        """
+        raise NotImplementedError
+
+    def query(
+        self, embeddings: np.ndarray, n_results: int
+    ) -> Tuple[List[List[str]], List[List[dict]]]:
+        """
+        Nearest neighbours for each query embedding
+
+        Returns:
+            Tuple of (documents, metadatas), one list per query
+        """
+        raise NotImplementedError
+
+    def get(
+        self, limit: int, offset: int = 0
+    ) -> Tuple[List[str], List[str], np.ndarray, List[dict]]:
+        """
+        Page through stored items
+
+        Returns:
+            Tuple of (ids, documents, embeddings, metadatas)
+        """
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    """
+    Backend storing vectors in a persistent ChromaDB collection
+    """
+    name = "chroma"
+
+    def __init__(self, db_path: str, collection_name: str):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=db_path)
+        self.collection = self.client.get_or_create_collection(collection_name)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        return set(self.collection.get(ids=ids, include=[])["ids"])
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids,
+        )
+
+    def query(self, embeddings, n_results):
+        results = self.collection.query(
+            query_embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            n_results=n_results,
+        )
+        documents = results["documents"] or [[] for _ in embeddings]
+        metadatas = results["metadatas"] or [[] for _ in embeddings]
+        return documents, metadatas
+
+    def get(self, limit, offset=0):
+        result = self.collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=limit,
+            offset=offset,
+        )
+        return (
+            result["ids"],
+            result["documents"],
+            np.array(result["embeddings"], dtype=np.float32),
+            result["metadatas"],
+        )
+
+
+class IVFIndex:
+    """
+    Inverted-file coarse quantizer: k-means centroids with one posting list each
+    """
+
+    def __init__(self, nlist: int, nprobe: int, iterations: int = 10, seed: int = 42):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        self.trained_size = 0
+
+    def train(self, sample: np.ndarray):
+        """
+        Fit spherical k-means on a sample and empty every posting list
+        """
+        rng = np.random.default_rng(self.seed)
+        sample = sample.astype(np.float32)
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        self.centroids = centroids
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+
+    def add(self, vectors: np.ndarray, first_row: int):
+        """
+        Assign new rows (numbered from first_row) to their nearest list
+        """
+        self._insert(np.arange(first_row, first_row + len(vectors)), vectors)
+
+    def reassign(self, rows: np.ndarray, vectors: np.ndarray):
+        """
+        Move existing rows whose vectors were replaced to their new nearest list
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        self.lists = [posting[~np.isin(posting, rows)] for posting in self.lists]
+        self._insert(rows, vectors)
+
+    def _insert(self, rows: np.ndarray, vectors: np.ndarray):
+        assignment = self._assign(vectors)
+        for c in np.unique(assignment):
+            self.lists[c] = np.concatenate([self.lists[c], rows[assignment == c]])
+
+    def _assign(self, vectors: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        """
+        Nearest centroid of every vector, computed in chunks to bound memory
+        """
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for i in range(0, len(vectors), chunk):
+            block = vectors[i:i + chunk].astype(np.float32)
+            assignment[i:i + chunk] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignment
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """
+        Rows in the nprobe lists closest to the query
+        """
+        scores = self.centroids @ query
+        probe = np.argpartition(-scores, min(self.nprobe, self.nlist) - 1)[:self.nprobe]
+        return np.concatenate([self.lists[c] for c in probe])
+
+
+class NumpyBackend(VectorBackend):
+    """
+    In-process exact (or IVF) search over a contiguous matrix of normalized vectors.
+
+    Metadata lives in parallel arrays. When a path is given, every upsert is
+    appended to disk as a segment so the index survives restarts without
+    rewriting what was already stored.
+    """
+    name = "numpy"
+    IVF_SAMPLE_SIZE = 50000
+    rerank = 0  # Exact scores need no re-ranking
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        nlist: int = 0,
+        nprobe: int = 8,
+    ):
+        """
+        Args:
+            path: Directory for persisted segments (None keeps the index in memory)
+            dtype: Storage dtype of the matrix, "float32" or "float16"
+            nlist: Number of IVF lists (0 for exact search)
+            nprobe: Number of IVF lists scanned per query
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.ivf = IVFIndex(nlist, nprobe) if nlist else None
+
+        self._matrix: Optional[np.ndarray] = None
+        self._pending: List[np.ndarray] = []
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.prices = np.empty(0, dtype=np.float64)
+        self.categories: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._segments = 0
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load_state()
+            self._load_segments()
+
+    def _load_state(self):
+        """
+        Hook for subclasses to restore extra state before segments are replayed
+        """
+
+    def _load_segments(self):
+        """
+        Replay persisted segments in order
+        """
+        for vectors_file in sorted(glob.glob(os.path.join(self.path, "segment_*.npy"))):
+            with open(vectors_file[:-4] + ".json", "r") as f:
+                meta = json.load(f)
+            vectors = np.load(vectors_file).astype(np.float32)
+            metadatas = [
+                {"price": price, "category": category}
+                for price, category in zip(meta["prices"], meta["categories"])
+            ]
+            self._apply(meta["ids"], vectors, meta["documents"], metadatas, self._segments)
+            self._segments += 1
+
+    def _segment_file(self, segment: int) -> str:
+        return os.path.join(self.path, f"segment_{segment:06d}.npy")
+
+    def _write_segment(self, ids, vectors, documents, metadatas):
+        """
+        Append one upsert batch to disk
+        """
+        vectors_file = self._segment_file(self._segments)
+        with open(vectors_file[:-4] + ".json", "w") as f:
+            json.dump({
+                "ids": ids,
+                "documents": documents,
+                "prices": [float(m.get("price", 0.0)) for m in metadatas],
+                "categories": [m.get("category", "Unknown") for m in metadatas],
+            }, f)
+        # The vectors file is what marks a segment as complete, so write it last
+        with open(vectors_file + ".tmp", "wb") as f:
+            np.save(f, vectors.astype(self.dtype))
+        os.replace(vectors_file + ".tmp", vectors_file)
+        self._segments += 1
+
+    def matrix(self) -> np.ndarray:
+        """
+        The consolidated (N, d) matrix of stored vectors
+        """
+        if self._pending:
+            parts = ([self._matrix] if self._matrix is not None else []) + self._pending
+            self._matrix = np.ascontiguousarray(np.concatenate(parts))
+            self._pending = []
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._matrix
+
+    def _normalize(self, embeddings: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _apply(self, ids, vectors, documents, metadatas, segment: Optional[int] = None):
+        """
+        Apply an upsert to the in-memory arrays
+
+        Args:
+            segment: Number of the on-disk segment holding these vectors, if any
+        """
+        new_rows = []
+        replaced_rows, replaced = [], []
+        for i, product_id in enumerate(ids):
+            row = self._rows.get(product_id)
+            if row is None:
+                new_rows.append(i)
+                continue
+            self._replace_vector(row, vectors[i], (segment, i))
+            self.documents[row] = documents[i]
+            self.prices[row] = float(metadatas[i].get("price", 0.0))
+            self.categories[row] = metadatas[i].get("category", "Unknown")
+            replaced_rows.append(row)
+            replaced.append(i)
+
+        if replaced and self.ivf and self.ivf.centroids is not None:
+            self.ivf.reassign(np.array(replaced_rows), vectors[replaced])
+
+        if not new_rows:
+            return
+
+        first_row = len(self.ids)
+        for offset, i in enumerate(new_rows):
+            self._rows[ids[i]] = first_row + offset
+            self.ids.append(ids[i])
+            self.documents.append(documents[i])
+            self.categories.append(metadatas[i].get("category", "Unknown"))
+        self.prices = np.concatenate([
+            self.prices,
+            np.array([float(metadatas[i].get("price", 0.0)) for i in new_rows]),
+        ])
+        self._append_vectors(vectors[new_rows], segment, np.array(new_rows))
+
+        if self.ivf and self.ivf.centroids is not None:
+            self.ivf.add(vectors[new_rows], first_row)
+
+    def _append_vectors(self, vectors: np.ndarray, segment: Optional[int], offsets: np.ndarray):
+        """
+        Store vectors for newly added rows
+        """
+        self._pending.append(vectors.astype(self.dtype))
+
+    def _replace_vector(self, row: int, vector: np.ndarray, location: Tuple[Optional[int], int]):
+        """
+        Overwrite the stored vector of an existing row
+        """
+        self.matrix()[row] = vector
+
+    def _vectors(self, rows: np.ndarray) -> np.ndarray:
+        """
+        float32 vectors for the given rows
+        """
+        return self.matrix()[rows].astype(np.float32)
+
+    def _iter_vectors(self, chunk: int = 65536):
+        """
+        Yield (first_row, float32 block) over every stored vector
+        """
+        for first_row in range(0, self.count(), chunk):
+            yield first_row, self._vectors(np.arange(first_row, min(first_row + chunk, self.count())))
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Inner products between queries and all (or the given) stored vectors
+        """
+        matrix = self.matrix() if rows is None else self.matrix()[rows]
+        return queries @ matrix.T
+
+    def memory_bytes(self) -> int:
+        """
+        Resident size of the vector index
+        """
+        return int(self.matrix().nbytes)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def existing_ids(self, ids):
+        return {product_id for product_id in ids if product_id in self._rows}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = self._normalize(embeddings)
+        segment = None
+        if self.path:
+            segment = self._segments
+            self._write_segment(ids, vectors, documents, metadatas)
+        self._apply(ids, vectors, documents, metadatas, segment)
+
+    def build_ivf(self):
+        """
+        (Re)train the IVF quantizer on the current vectors
+        """
+        if not self.ivf or self.count() < self.ivf.nlist * 4:
+            return
+        rng = np.random.default_rng(self.ivf.seed)
+        sample_rows = np.sort(rng.choice(
+            self.count(), size=min(self.count(), self.IVF_SAMPLE_SIZE), replace=False
+        ))
+        self.ivf.train(self._vectors(sample_rows))
+        for first_row, block in self._iter_vectors():
+            self.ivf.add(block, first_row)
+        self.ivf.trained_size = self.count()
+
+    def _ivf_ready(self) -> bool:
+        if not self.ivf:
+            return False
+        # Retrain once the index has doubled since the quantizer was fitted
+        if self.ivf.centroids is None or self.count() > 2 * self.ivf.trained_size:
+            self.build_ivf()
+        return self.ivf.centroids is not None
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indices of the k highest scores, best first
+        """
+        if k >= len(scores):
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, embeddings: np.ndarray, n_results: int) -> List[np.ndarray]:
+        """
+        Row indices of the nearest neighbours of each query, best first
+
+        When `rerank` is set, the top n_results * rerank candidates by
+        (approximate) score are re-scored against their float vectors.
+        """
+        if self.count() == 0:
+            return [np.empty(0, dtype=np.int64) for _ in embeddings]
+
+        queries = self._normalize(embeddings)
+        depth = n_results * self.rerank if self.rerank else n_results
+
+        if self._ivf_ready():
+            shortlists = []
+            for query in queries:
+                candidates = self.ivf.candidates(query)
+                scores = self._scores(query[None, :], candidates)[0]
+                shortlists.append(candidates[self._top_k(scores, depth)])
+        else:
+            shortlists = [self._top_k(row, depth) for row in self._scores(queries)]
+
+        if not self.rerank:
+            return shortlists
+        return [
+            rows[self._top_k(self._vectors(rows) @ query, n_results)]
+            for query, rows in zip(queries, shortlists)
+        ]
+
+    def query(self, embeddings, n_results):
+        documents, metadatas = [], []
+        for rows in self.search(embeddings, n_results):
+            documents.append([self.documents[r] for r in rows])
+            metadatas.append([
+                {"price": float(self.prices[r]), "category": self.categories[r]} for r in rows
+            ])
+        return documents, metadatas
+
+    def get(self, limit, offset=0):
+        rows = np.arange(offset, min(offset + limit, self.count()))
+        return (
+            [self.ids[r] for r in rows],
+            [self.documents[r] for r in rows],
+            self._vectors(rows),
+            [{"price": float(self.prices[r]), "category": self.categories[r]} for r in rows],
+        )
+
+
+class QuantizedBackend(NumpyBackend):
+    """
+    NumPy backend whose resident index holds int8 or PQ codes instead of floats.
+
+    Queries are scored with asymmetric distance computation (float query
+    against coded vectors). With `rerank`, the best candidates are re-scored
+    with their float vectors, read from the memory-mapped segments on disk
+    (or kept in memory when the backend has no path).
+    """
+    name = "quantized"
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        quantizer: str = "int8",
+        rerank: int = 4,
+        train_size: int = 100000,
+        pq_subspaces: int = 48,
+        nlist: int = 0,
+        nprobe: int = 8,
+    ):
+        """
+        Args:
+            path: Directory for persisted segments (None keeps the index in memory)
+            quantizer: "int8" (scalar, 4x smaller) or "pq" (product, 32x at 48 subspaces)
+            rerank: Re-score the top n_results * rerank candidates with float vectors (0 disables)
+            train_size: Vectors buffered before the quantizer is trained; until then
+                the buffered float vectors are searched exactly
+            pq_subspaces: Number of PQ subspaces
+            nlist: Number of IVF lists (0 for exhaustive ADC search)
+            nprobe: Number of IVF lists scanned per query
+        """
+        from quantizers import ProductQuantizer, ScalarQuantizer
+
+        self.quantizer = ProductQuantizer(pq_subspaces) if quantizer == "pq" else ScalarQuantizer()
+        self.rerank = rerank
+        self.train_size = train_size
+        self._codes: Optional[np.ndarray] = None
+        self._code_chunks: List[np.ndarray] = []
+        self._buffer: List[np.ndarray] = []
+        self._float_chunks: List[np.ndarray] = []
+        self._floats: Optional[np.ndarray] = None
+        self._locations = np.empty((0, 2), dtype=np.int32)
+        self._segment_maps: Dict[int, np.ndarray] = {}
+        super().__init__(path, nlist=nlist, nprobe=nprobe)
+
+    def _state_file(self) -> str:
+        return os.path.join(self.path, f"quantizer_{self.quantizer.name}.npz")
+
+    def _load_state(self):
+        if os.path.exists(self._state_file()):
+            self.quantizer.load_state(dict(np.load(self._state_file())))
+
+    def _buffered(self) -> np.ndarray:
+        """
+        The buffered float vectors as one array; until the quantizer is
+        trained these are every stored vector, in row order
+        """
+        if len(self._buffer) > 1:
+            self._buffer = [np.concatenate(self._buffer)]
+        return self._buffer[0] if self._buffer else np.empty((0, 0), dtype=np.float32)
+
+    def _encode_buffer(self):
+        """
+        Encode buffered float vectors, training the quantizer first if needed
+        """
+        if not self._buffer:
+            return
+        vectors = np.concatenate(self._buffer)
+        self._buffer = []
+        if not self.quantizer.trained:
+            self.quantizer.train(vectors)
+            if self.path:
+                np.savez(self._state_file(), **self.quantizer.state())
+        self._code_chunks.append(self.quantizer.encode(vectors))
+
+    def codes(self) -> np.ndarray:
+        """
+        The consolidated (N, code_size) array of codes; None until the
+        quantizer is trained
+        """
+        if self.quantizer.trained:
+            self._encode_buffer()
+        if self._code_chunks:
+            parts = ([self._codes] if self._codes is not None else []) + self._code_chunks
+            self._codes = np.ascontiguousarray(np.concatenate(parts))
+            self._code_chunks = []
+        return self._codes
+
+    def _append_vectors(self, vectors, segment, offsets):
+        if segment is not None:
+            locations = np.stack([np.full(len(offsets), segment), offsets], axis=1).astype(np.int32)
+            self._locations = np.concatenate([self._locations, locations])
+        elif self.rerank:
+            self._float_chunks.append(vectors.astype(np.float32))
+
+        self._buffer.append(vectors)
+        if self.quantizer.trained or sum(len(b) for b in self._buffer) >= self.train_size:
+            self._encode_buffer()
+
+    def _replace_vector(self, row, vector, location):
+        if self.quantizer.trained:
+            self.codes()[row] = self.quantizer.encode(vector[None, :])[0]
+        else:
+            self._buffered()[row] = vector
+        segment, offset = location
+        if segment is not None:
+            self._locations[row] = (segment, offset)
+        elif self.rerank:
+            self._float_matrix()[row] = vector
+
+    def _float_matrix(self) -> np.ndarray:
+        if self._float_chunks:
+            parts = ([self._floats] if self._floats is not None else []) + self._float_chunks
+            self._floats = np.concatenate(parts)
+            self._float_chunks = []
+        return self._floats
+
+    def _segment_vectors(self, segment: int) -> np.ndarray:
+        if segment not in self._segment_maps:
+            self._segment_maps[segment] = np.load(self._segment_file(segment), mmap_mode="r")
+        return self._segment_maps[segment]
+
+    def _vectors(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.path:
+            vectors = [
+                self._segment_vectors(segment)[offset] for segment, offset in self._locations[rows]
+            ]
+            return np.array(vectors, dtype=np.float32).reshape(len(rows), -1)
+        if self.rerank:
+            return self._float_matrix()[rows]
+        if not self.quantizer.trained:
+            return self._buffered()[rows]
+        return self.quantizer.decode(self.codes()[rows])
+
+    def _iter_vectors(self, chunk=65536):
+        if not self.quantizer.trained:
+            yield from super()._iter_vectors(chunk)
+            return
+        # Decoded codes are close enough to train and fill the IVF lists
+        codes = self.codes()
+        for first_row in range(0, len(codes), chunk):
+            yield first_row, self.quantizer.decode(codes[first_row:first_row + chunk])
+
+    def _scores(self, queries, rows=None):
+        if not self.quantizer.trained:
+            # Too few vectors to train on yet: score the float vectors exactly
+            vectors = self._buffered() if rows is None else self._buffered()[rows]
+            return queries @ vectors.T
+        codes = self.codes() if rows is None else self.codes()[rows]
+        return self.quantizer.scores(queries, codes)
+
+    def memory_bytes(self) -> int:
+        codes = self.codes()
+        resident = (codes.nbytes if codes is not None else self._buffered().nbytes) + self._locations.nbytes
+        if not self.path and self.rerank:
+            resident += self._float_matrix().nbytes
+        return int(resident)
+
+
+def create_backend(name: str, db_path: str, collection_name: str) -> VectorBackend:
+    """
+    Build a backend by name
+
+    Args:
+        name: "chroma", "numpy" (exact search), "ivf" (NumPy with IVF quantizer),
+            "int8" or "pq" (compressed codes with float re-ranking)
+        db_path: Root directory of the vector store
+        collection_name: Collection holding the products; the NumPy backends
+            each persist to their own "<collection_name>_<name>" sub-directory
+
+    Returns:
+        VectorBackend instance
+    """
+    if name == "chroma":
+        return ChromaBackend(db_path, collection_name)
+    path = os.path.join(db_path, f"{collection_name}_{name}")
+    if name == "numpy":
+        return NumpyBackend(path)
+    if name == "ivf":
+        return NumpyBackend(path, nlist=1024, nprobe=16)
+    if name in ("int8", "pq"):
+        return QuantizedBackend(path, quantizer=name)
+    raise ValueError(f"Unknown vector backend: {name}")
@@ -1,37 +1,117 @@
 """
-Vector store setup using ChromaDB for storing and retrieving product embeddings
+Vector store setup for storing and retrieving product embeddings
 """
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Tuple, Optional
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple, Optional
 import numpy as np
-from datasets import load_dataset
+from embedding_cache import EmbeddingCache
+from vector_backends import create_backend
 from utils import BaseAgent, GREEN
 
 
 class VectorStore(BaseAgent):
     """
-    Manages the ChromaDB vector store for product embeddings
+    Manages the vector store for product embeddings
+    
+    Vectors are kept in a pluggable backend: ChromaDB by default, or an
+    in-process NumPy matrix ("numpy") with an optional IVF quantizer ("ivf").
+    
+    The backend and the embedding model are loaded on first use, so creating
+    a VectorStore is cheap and never imports chromadb or sentence_transformers.
     """
     name = "VectorStore"
     color = GREEN
     DB_PATH = "products_vectorstore"
     COLLECTION_NAME = "products"
+    CHECKPOINT_FILE = "ingest_checkpoint.json"
+    EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+    EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
     
     DEFAULT_DATASET = "ed-donner/items_lite"
+    DEFAULT_BACKEND = "chroma"
 
-    def __init__(self, db_path: str = None, dataset_name: Optional[str] = None):
+    def __init__(
+        self,
+        db_path: str = None,
+        dataset_name: Optional[str] = None,
+        backend: Optional[str] = None,
+    ):
         """
-        Initialize the vector store with ChromaDB and embedding model
+        Initialize the vector store with its storage backend and embedding model
+        
+        Args:
+            db_path: Directory holding the vector store
+            dataset_name: Hugging Face dataset used to populate the store
+            backend: "chroma", "numpy" or "ivf" (default from VECTOR_BACKEND env)
         """
         self.log("Initializing VectorStore")
         self.db_path = db_path or self.DB_PATH
         self.dataset_name = dataset_name or os.getenv("RAG_DATASET_NAME", self.DEFAULT_DATASET)
-        self.client = chromadb.PersistentClient(path=self.db_path)
-        self.collection = self.client.get_or_create_collection(self.COLLECTION_NAME)
-        self.embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        self.log(f"VectorStore initialized with {self.collection.count()} items")
+        self.backend_name = backend or os.getenv("VECTOR_BACKEND", self.DEFAULT_BACKEND)
+        self.embedding_cache = EmbeddingCache(
+            os.path.join(self.db_path, self.EMBEDDING_CACHE_FILE), self.EMBEDDING_MODEL
+        )
+        self._backend = None
+        self._embedding_model = None
+        self._load_lock = threading.Lock()
+        self._dataset_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        """
+        Storage backend, opened on first access
+        """
+        if self._backend is None:
+            with self._load_lock:
+                if self._backend is None:
+                    self._backend = create_backend(self.backend_name, self.db_path, self.COLLECTION_NAME)
+                    self.log(f"VectorStore opened with {self._backend.count()} items ({self._backend.name} backend)")
+        return self._backend
+
+    @property
+    def embedding_model(self):
+        """
+        SentenceTransformer model, loaded on first access
+        """
+        if self._embedding_model is None:
+            with self._load_lock:
+                if self._embedding_model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self.log(f"Loading embedding model {self.EMBEDDING_MODEL}")
+                    self._embedding_model = SentenceTransformer(self.EMBEDDING_MODEL)
+        return self._embedding_model
+
+    def warm_up(self):
+        """
+        Open the backend and load the embedding model now rather than on first query
+        """
+        self.backend
+        self.embedding_model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, only running the model for texts missing from the cache
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            float32 array with one embedding per text
+        """
+        cached, missing = self.embedding_cache.get_many(texts)
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = self.embedding_model.encode(unique)
+            self.embedding_cache.put_many(unique, computed)
+            by_text = dict(zip(unique, computed))
+            cached.update((i, by_text[texts[i]]) for i in missing)
+        if not texts:
+            return np.empty((0, self.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.stack([cached[i] for i in range(len(texts))]).astype(np.float32, copy=False)
     
     def add_products(
         self,
@@ -43,6 +123,10 @@ class VectorStore(BaseAgent):
         """
         Add products to the vector store
         
+        Products are keyed by a content hash of their description and price,
+        so re-adding the same data is idempotent: rows already present in the
+        collection are skipped before embedding and the rest are upserted.
+        
         Args:
             descriptions: List of product descriptions
             prices: List of product prices
@@ -60,35 +144,93 @@ class VectorStore(BaseAgent):
             batch_prices = prices[start:end]
             batch_categories = categories[start:end] if categories else None
 
-            # Generate embeddings for batch
-            embeddings = self.embedding_model.encode(batch_descriptions)
-
-            # Prepare metadata
-            metadatas = [{"price": float(price)} for price in batch_prices]
-            if batch_categories:
-                for i, category in enumerate(batch_categories):
-                    metadatas[i]["category"] = category
-
-            # Generate IDs
-            ids = [
-                f"product_{start + i}_{hash(desc)}"
-                for i, desc in enumerate(batch_descriptions)
-            ]
-
-            # Add to collection
-            self.collection.add(
-                embeddings=embeddings.astype(float).tolist(),
-                documents=batch_descriptions,
-                metadatas=metadatas,
-                ids=ids,
+            ids, batch_descriptions, batch_prices, batch_categories = self._filter_new(
+                batch_descriptions, batch_prices, batch_categories
             )
+            if not ids:
+                self.log(f"Batch {start + 1}-{end} of {total} already indexed, skipping")
+                continue
+
+            # Generate embeddings for batch
+            embeddings = self.encode(batch_descriptions)
+
+            self._write_batch(ids, batch_descriptions, batch_prices, batch_categories, embeddings)
 
             self.log(
-                f"Added batch {start + 1}-{end} of {total} "
-                f"(collection size: {self.collection.count()})"
+                f"Added {len(ids)} new products from batch {start + 1}-{end} of {total} "
+                f"(collection size: {self.count()})"
             )
 
-        self.log(f"Successfully added products. Total count: {self.collection.count()}")
+        self.log(f"Successfully added products. Total count: {self.count()}")
+        self.log(f"Embedding cache: {self.embedding_cache.stats()}")
+
+    @staticmethod
+    def product_id(description: str, price: float) -> str:
+        """
+        Build a stable, content-addressed ID for a product
+        
+        Args:
+            description: Product description
+            price: Product price
+            
+        Returns:
+            ID derived from the normalized description and the rounded price
+        """
+        normalized = " ".join(description.lower().split())
+        digest = hashlib.sha256(f"{normalized}|{float(price):.2f}".encode("utf-8"))
+        return f"product_{digest.hexdigest()[:32]}"
+
+    def _filter_new(
+        self,
+        descriptions: List[str],
+        prices: List[float],
+        categories: Optional[List[str]],
+    ) -> Tuple[List[str], List[str], List[float], Optional[List[str]]]:
+        """
+        Drop products that are duplicated within the batch or already stored
+        
+        Existing IDs are looked up with a single bulk `get`, so nothing that is
+        already indexed gets re-embedded.
+        
+        Returns:
+            Tuple of (ids, descriptions, prices, categories) for the new products
+        """
+        seen = set()
+        keep = []
+        for i, (description, price) in enumerate(zip(descriptions, prices)):
+            product_id = self.product_id(description, price)
+            if product_id not in seen:
+                seen.add(product_id)
+                keep.append((i, product_id))
+
+        existing = self.backend.existing_ids([pid for _, pid in keep])
+        keep = [(i, pid) for i, pid in keep if pid not in existing]
+
+        ids = [pid for _, pid in keep]
+        new_descriptions = [descriptions[i] for i, _ in keep]
+        new_prices = [prices[i] for i, _ in keep]
+        new_categories = [categories[i] for i, _ in keep] if categories else None
+        return ids, new_descriptions, new_prices, new_categories
+
+    def _write_batch(
+        self,
+        ids: List[str],
+        descriptions: List[str],
+        prices: List[float],
+        categories: Optional[List[str]],
+        embeddings: np.ndarray,
+    ):
+        """
+        Write one batch of already-embedded products to the collection
+        """
+        # Prepare metadata
+        metadatas = [{"price": float(price)} for price in prices]
+        if categories:
+            for i, category in enumerate(categories):
+                metadatas[i]["category"] = category
+
+        # Upsert so that a retried batch never creates duplicates
+        self.backend.upsert(ids, embeddings, descriptions, metadatas)
 
     def _build_description(self, item: dict) -> str:
         """
@@ -106,37 +248,186 @@ class VectorStore(BaseAgent):
             return f"{title}. {base}"
         return base or title or "Unknown product"
 
-    def load_full_dataset(self):
+    def _checkpoint_path(self) -> str:
         """
-        Load the full dataset from Hugging Face and index it in the vector store.
+        Path of the ingestion checkpoint, stored next to the vector data
         """
-        self.log(f"Loading full dataset: {self.dataset_name}")
+        return os.path.join(self.db_path, self.CHECKPOINT_FILE)
 
-        dataset = load_dataset(self.dataset_name)
+    def _load_checkpoint(self) -> dict:
+        """
+        Load the ingestion checkpoint for the current dataset
+        
+        Returns:
+            Dict with the committed offset of each split and a completed flag
+        """
+        empty = {"dataset": self.dataset_name, "splits": {}, "completed": False}
+        path = self._checkpoint_path()
+        if not os.path.exists(path):
+            return empty
+        try:
+            with open(path, "r") as f:
+                checkpoint = json.load(f)
+        except Exception as e:
+            self.log(f"Ignoring unreadable checkpoint: {e}")
+            return empty
+        if checkpoint.get("dataset") != self.dataset_name:
+            return empty
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: dict):
+        """
+        Atomically persist the ingestion checkpoint
+        """
+        path = self._checkpoint_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+    def _iter_windows(
+        self, split, window_size: int
+    ) -> Iterator[Tuple[List[str], List[float], List[str], int]]:
+        """
+        Read a dataset split in bounded windows
+        
+        Args:
+            split: Iterable dataset split
+            window_size: Number of raw rows per window
+            
+        Yields:
+            Tuple of (descriptions, prices, categories, rows consumed)
+        """
         descriptions: List[str] = []
         prices: List[float] = []
         categories: List[str] = []
+        consumed = 0
+
+        for item in split:
+            consumed += 1
+            description = self._build_description(item)
+            price = float(item.get("price", 0.0) or 0.0)
+            category = (item.get("category") or "Unknown").strip()
+            if description and price > 0:
+                descriptions.append(description)
+                prices.append(price)
+                categories.append(category)
+
+            if consumed == window_size:
+                yield descriptions, prices, categories, consumed
+                descriptions, prices, categories, consumed = [], [], [], 0
+
+        if consumed:
+            yield descriptions, prices, categories, consumed
+
+    def load_full_dataset(self, window_size: int = 5000):
+        """
+        Stream the full dataset from Hugging Face and index it in the vector store.
+        
+        The dataset is read in windows of `window_size` rows, so at most two
+        windows are held in memory at once: the one being embedded and the one
+        being written to the backend in the background. The offset of every split is
+        checkpointed after each committed write, and an interrupted load resumes
+        from the last committed offset.
+        
+        Args:
+            window_size: Number of dataset rows per window
+        """
+        checkpoint = self._load_checkpoint()
+        if checkpoint["completed"] and self.count() > 0:
+            self.log(f"Dataset {self.dataset_name} already fully indexed")
+            return
+        if checkpoint["completed"]:
+            checkpoint = {"dataset": self.dataset_name, "splits": {}, "completed": False}
+
+        self.log(f"Streaming full dataset: {self.dataset_name}")
+        from datasets import load_dataset
+        
+        dataset = load_dataset(self.dataset_name, streaming=True)
+        added = 0
+
+        def commit(pending) -> int:
+            future, split_name, offset = pending
+            count = future.result()
+            checkpoint["splits"][split_name] = offset
+            self._save_checkpoint(checkpoint)
+            return count
+
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending = None
+            for split_name, split in dataset.items():
+                offset = checkpoint["splits"].get(split_name, 0)
+                if offset:
+                    self.log(f"Resuming split '{split_name}' from row {offset}")
+                    split = split.skip(offset)
+                else:
+                    self.log(f"Processing split '{split_name}'")
+
+                for descriptions, prices, categories, consumed in self._iter_windows(split, window_size):
+                    ids, descriptions, prices, categories = self._filter_new(
+                        descriptions, prices, categories
+                    )
+                    # Embed this window while the previous one is being written
+                    embeddings = (
+                        self.encode(descriptions) if descriptions else None
+                    )
+                    if pending:
+                        added += commit(pending)
 
-        for split_name, split in dataset.items():
-            self.log(f"Processing split '{split_name}' with {len(split)} items")
-            for item in split:
-                description = self._build_description(item)
-                price = float(item.get("price", 0.0) or 0.0)
-                category = (item.get("category") or "Unknown").strip()
-                if description and price > 0:
-                    descriptions.append(description)
-                    prices.append(price)
-                    categories.append(category)
+                    offset += consumed
+                    future = writer.submit(
+                        self._write_window, ids, descriptions, prices, categories, embeddings
+                    )
+                    pending = (future, split_name, offset)
+                    self.log(f"Split '{split_name}': indexed up to row {offset}")
+
+            if pending:
+                added += commit(pending)
+
+        checkpoint["completed"] = True
+        self._save_checkpoint(checkpoint)
+        self.log(
+            f"Full dataset loaded into vector store: {added} items added "
+            f"(collection size: {self.count()})"
+        )
+        self.log(f"Embedding cache: {self.embedding_cache.stats()}")
 
-        self.add_products(descriptions, prices, categories)
-        self.log(f"Full dataset loaded into vector store: {len(descriptions)} items")
+    def _write_window(
+        self,
+        ids: List[str],
+        descriptions: List[str],
+        prices: List[float],
+        categories: List[str],
+        embeddings: Optional[np.ndarray],
+    ) -> int:
+        """
+        Write a streamed window to the collection (runs on the writer thread)
+        
+        Returns:
+            Number of products written
+        """
+        if not descriptions:
+            return 0
+        self._write_batch(ids, descriptions, prices, categories, embeddings)
+        return len(descriptions)
 
     def ensure_full_dataset_loaded(self):
         """
-        Ensure the vector store is populated with the full dataset.
+        Ensure the vector store is populated with the full dataset,
+        resuming an interrupted streaming load if one was checkpointed.
+        Concurrent callers wait for the one load rather than starting another.
+        """
+        with self._dataset_lock:
+            if self.count() == 0 or self._ingestion_incomplete():
+                self.load_full_dataset()
+
+    def _ingestion_incomplete(self) -> bool:
+        """
+        Whether a streaming load was started but never finished
         """
-        if self.count() == 0:
-            self.load_full_dataset()
+        checkpoint = self._load_checkpoint()
+        return bool(checkpoint["splits"]) and not checkpoint["completed"]
     
     def search_similar(self, query: str, n_results: int = 5) -> Tuple[List[str], List[float]]:
         """
@@ -149,22 +440,41 @@ class VectorStore(BaseAgent):
         Returns:
             Tuple of (descriptions, prices)
         """
-        self.log(f"Searching for {n_results} similar products")
+        return self.search_similar_batch([query], n_results=n_results)[0]
+
+    def search_similar_batch(
+        self, queries: List[str], n_results: int = 5
+    ) -> List[Tuple[List[str], List[float]]]:
+        """
+        Search for similar products for several queries in one round trip
         
-        # Generate embedding for query
-        query_embedding = self.embedding_model.encode([query])
+        All queries are embedded in a single forward pass and sent to the
+        collection as one multi-embedding query.
         
-        # Search in collection
-        results = self.collection.query(
-            query_embeddings=query_embedding.astype(float).tolist(),
-            n_results=n_results
-        )
+        Args:
+            queries: Product descriptions to search for
+            n_results: Number of results to return per query
+            
+        Returns:
+            List of (descriptions, prices) tuples, one per query
+        """
+        if not queries:
+            return []
+
+        self.log(f"Searching for {n_results} similar products for {len(queries)} queries")
+        
+        # Generate embeddings for all queries at once
+        query_embeddings = self.encode(queries)
         
-        documents = results["documents"][0] if results["documents"] else []
-        prices = [m["price"] for m in results["metadatas"][0]] if results["metadatas"] else []
+        # Search in backend
+        all_documents, all_metadatas = self.backend.query(query_embeddings, n_results)
+        matches = [
+            (documents, [m["price"] for m in metadatas])
+            for documents, metadatas in zip(all_documents, all_metadatas)
+        ]
         
-        self.log(f"Found {len(documents)} similar products")
-        return documents, prices
+        self.log(f"Found {sum(len(documents) for documents, _ in matches)} similar products")
+        return matches
     
     def get_all_embeddings(self, max_items: int = 2000) -> Tuple[List[str], np.ndarray, List[str]]:
         """
@@ -178,20 +488,34 @@ class VectorStore(BaseAgent):
         """
         self.log(f"Retrieving up to {max_items} embeddings for visualization")
         
-        result = self.collection.get(
-            include=["embeddings", "documents", "metadatas"],
-            limit=max_items
-        )
-        
-        documents = result["documents"]
-        embeddings = np.array(result["embeddings"])
-        categories = [m.get("category", "Unknown") for m in result["metadatas"]]
+        _, documents, embeddings, metadatas = self.backend.get(limit=max_items)
+        categories = [m.get("category", "Unknown") for m in metadatas]
         
         self.log(f"Retrieved {len(documents)} embeddings")
         return documents, embeddings, categories
     
+    def iter_embeddings(
+        self, offset: int = 0, page_size: int = 5000
+    ) -> Iterator[Tuple[List[str], np.ndarray, List[str]]]:
+        """
+        Page through stored items in insertion order
+        
+        Args:
+            offset: Index of the first item to return
+            page_size: Items per page
+            
+        Yields:
+            Tuple of (documents, embeddings, categories) per page
+        """
+        while True:
+            ids, documents, embeddings, metadatas = self.backend.get(limit=page_size, offset=offset)
+            if not ids:
+                return
+            yield documents, embeddings, [m.get("category", "Unknown") for m in metadatas]
+            offset += len(ids)
+    
     def count(self) -> int:
         """
         Get the number of items in the collection
         """
-        return self.collection.count()
+        return self.backend.count()